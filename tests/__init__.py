@@ -167,6 +167,45 @@ async def positions(request):
     return r.raw(pickle.dumps(position))
 
 
+@app.get("/bills")
+async def bills(request):
+    # a year of daily records, big enough to make decoding measurable
+    days = np.arange("2022-01-01", "2023-01-01", dtype="datetime64[D]")
+    trades = {
+        uuid.uuid4().hex: {
+            "tid": uuid.uuid4().hex,
+            "eid": uuid.uuid4().hex,
+            "security": "002537.XSHE",
+            "order_side": "买入",
+            "price": 9.42,
+            "filled": 500,
+            "time": f"{day} 10:04:00",
+            "trade_fees": 0.47,
+        }
+        for day in days.astype(str)
+    }
+    positions = np.array(
+        [(day.item(), "002537.XSHE", 500, 500, 9.42) for day in days],
+        dtype=[
+            ("date", "O"),
+            ("security", "O"),
+            ("shares", "<f8"),
+            ("sellable", "<f8"),
+            ("price", "<f8"),
+        ],
+    )
+    assets = np.array(
+        [(day.item(), 1_000_000.0) for day in days],
+        dtype=[("date", "O"), ("assets", "<f8")],
+    )
+
+    return r.raw(
+        pickle.dumps(
+            {"trades": trades, "tx": [], "positions": positions, "assets": assets}
+        )
+    )
+
+
 @app.get("/echo")
 async def echo(request):
     status = request.args.get("status")
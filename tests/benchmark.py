@@ -0,0 +1,230 @@
+"""reproducible benchmarks against the mock trade server in `tests/__init__.py`
+
+The mock server is started on a free local port, so the numbers measure the
+client (connection handling, encoding and decoding) rather than the backtest
+engine. Every case reports ops/sec and latency percentiles, in three modes:
+
+- oneshot: module-level `get`/`post_json`, a new connection per call
+- pooled: `TraderClient` over a keep-alive `Session`
+- async: `AsyncTraderClient` with `--concurrency` coroutines in flight
+
+usage:
+
+    python -m tests.benchmark
+    python -m tests.benchmark --save baseline.json
+    python -m tests.benchmark --compare baseline.json --tolerance 0.2
+
+With `--compare`, the process exits with 1 if any case is slower than the
+baseline by more than `tolerance`, so CI can flag regressions.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from tests import MockServer, get_free_port
+from traderclient.async_client import AsyncTraderClient
+from traderclient.client import TraderClient
+from traderclient.datatypes import OrderSide
+from traderclient.transport import get, post_json
+
+ORDER = {"security": "002537.XSHE", "price": 10.0, "volume": 500}
+BATCH = 50
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """ops/sec and latency percentiles (in milliseconds) of one case"""
+    samples = np.array(latencies) * 1000
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {
+        "n": len(samples),
+        "ops": len(samples) / elapsed,
+        "p50": float(p50),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": float(samples.max()),
+    }
+
+
+def measure(func: Callable, n: int, warmup: int = 10) -> Dict[str, float]:
+    """call `func` n times in a row"""
+    for _ in range(warmup):
+        func()
+
+    latencies = []
+    t0 = time.perf_counter()
+    for _ in range(n):
+        t1 = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - t1)
+
+    return summarize(latencies, time.perf_counter() - t0)
+
+
+async def ameasure(
+    func: Callable[[], Awaitable], n: int, concurrency: int, warmup: int = 10
+) -> Dict[str, float]:
+    """call `func` n times, with up to `concurrency` calls in flight"""
+    for _ in range(warmup):
+        await func()
+
+    latencies = []
+    remaining = n
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            t1 = time.perf_counter()
+            await func()
+            latencies.append(time.perf_counter() - t1)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, time.perf_counter() - t0)
+
+
+def _batch() -> List[Dict]:
+    return [{**ORDER, "side": OrderSide.BUY} for _ in range(BATCH)]
+
+
+def run_sync(url: str, n: int) -> Dict[str, Dict]:
+    results = {}
+    headers = {"Account": "bench", "Authorization": "bench"}
+
+    results["oneshot.buy"] = measure(lambda: post_json(f"{url}/buy", ORDER, headers), n)
+    results["oneshot.positions"] = measure(
+        lambda: get(f"{url}/positions", headers=headers), n
+    )
+    results["oneshot.info"] = measure(lambda: get(f"{url}/info", headers=headers), n)
+
+    with TraderClient(url, "bench", "bench", snapshot_ttl=0) as client:
+        results["pooled.buy"] = measure(lambda: client.buy(**ORDER), n)
+        results["pooled.positions"] = measure(lambda: client.positions(), n)
+        results["pooled.info"] = measure(lambda: client.info(), n)
+        results["pooled.bills"] = measure(lambda: client.bills(), max(n // 10, 1))
+        results["pooled.submit_many"] = measure(
+            lambda: client.submit_many(_batch()), max(n // BATCH, 1), warmup=1
+        )
+
+    return results
+
+
+async def run_async(url: str, n: int, concurrency: int) -> Dict[str, Dict]:
+    results = {}
+    async with AsyncTraderClient(url, "bench", "bench", snapshot_ttl=0) as client:
+        results["async.buy"] = await ameasure(
+            lambda: client.buy(**ORDER), n, concurrency
+        )
+        results["async.positions"] = await ameasure(client.positions, n, concurrency)
+        results["async.info"] = await ameasure(client.info, n, concurrency)
+        results["async.bills"] = await ameasure(
+            client.bills, max(n // 10, 1), concurrency
+        )
+        results["async.submit_many"] = await ameasure(
+            lambda: client.submit_many(_batch()), max(n // BATCH, 1), 1, warmup=1
+        )
+
+    return results
+
+
+def run(n: int = 1000, concurrency: int = 10, url: Optional[str] = None) -> Dict:
+    """run all cases, against `url` or a freshly started mock server"""
+    server = None
+    if url is None:
+        port = get_free_port()
+        server = MockServer("localhost", port)
+        server.run()
+        url = f"http://localhost:{port}"
+
+    try:
+        results = run_sync(url, n)
+        results.update(asyncio.run(run_async(url, n, concurrency)))
+    finally:
+        if server is not None:
+            server.stop()
+
+    return {
+        "meta": {
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "httpx": httpx.__version__,
+            "n": n,
+            "concurrency": concurrency,
+        },
+        "results": results,
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """cases whose ops/sec dropped more than `tolerance` below the baseline"""
+    regressions = []
+    for case, stats in report["results"].items():
+        base = baseline["results"].get(case)
+        if base is None:
+            continue
+
+        ratio = stats["ops"] / base["ops"]
+        if ratio < 1 - tolerance:
+            regressions.append(
+                f"{case}: {stats['ops']:,.0f} ops/s vs {base['ops']:,.0f} ({ratio - 1:+.0%})"
+            )
+
+    return regressions
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None):
+    print(
+        f"{'case':22s} {'ops/s':>10s} {'p50 ms':>8s} {'p90 ms':>8s} {'p99 ms':>8s} {'max ms':>8s} {'vs base':>8s}"
+    )
+    for case, stats in report["results"].items():
+        delta = ""
+        if baseline is not None and case in baseline["results"]:
+            delta = f"{stats['ops'] / baseline['results'][case]['ops'] - 1:+.0%}"
+        print(
+            f"{case:22s} {stats['ops']:10,.0f} {stats['p50']:8.2f} {stats['p90']:8.2f}"
+            f" {stats['p99']:8.2f} {stats['max']:8.2f} {delta:>8s}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=1000, help="calls per case")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--url", help="benchmark this server instead of the mock")
+    parser.add_argument("--save", help="write the report to this json file")
+    parser.add_argument("--compare", help="baseline json file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    report = run(args.n, args.concurrency, args.url)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_report(report, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
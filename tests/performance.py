@@ -1,9 +1,13 @@
 """for performance and demo testing
+
+the functions here talk to servers on the LAN. For reproducible numbers, use
+`python -m tests.benchmark`, which runs against the local mock server.
 """
 import datetime
 import uuid
 
 from traderclient.client import TraderClient
+from traderclient.datatypes import OrderSide
 
 
 def demo():
@@ -50,11 +54,17 @@ def benchmark():
     import time
 
     t0 = time.time()
-    for code in [f"{i:06d}.XSHE" for i in range(1, 150)]:
-        try:
-            client.market_buy(code, 100, order_time="2015-01-05 09:31:00")
-        except Exception:
-            pass
+    orders = [
+        {
+            "security": f"{i:06d}.XSHE",
+            "side": OrderSide.BUY,
+            "price": None,
+            "volume": 100,
+            "order_time": datetime.datetime(2015, 1, 5, 9, 31),
+        }
+        for i in range(1, 150)
+    ]
+    client.submit_many(orders)
 
     print(client.positions())
     client.market_sell(
@@ -139,8 +149,53 @@ def debug_issue_26():
     )
 
 
+def codec_benchmark(n: int = 20_000):
+    """compare available json codecs on typical order and response payloads"""
+    import json
+    import timeit
+
+    from traderclient.transport import JsonCodec, MsgspecCodec, OrjsonCodec
+
+    order = {
+        "security": "002537.XSHE",
+        "price": 10.45,
+        "volume": 500,
+        "timeout": 0.5,
+        "order_time": "2022-03-01 10:04:00",
+    }
+    fills = [
+        {
+            "tid": uuid.uuid4().hex,
+            "eid": uuid.uuid4().hex,
+            "security": "002537.XSHE",
+            "order_side": -1,
+            "price": 10.45,
+            "filled": 100,
+            "time": "2022-03-02T10:04:00",
+            "trade_fees": 1.05,
+        }
+        for _ in range(50)
+    ]
+    raw = json.dumps(fills).encode("utf-8")
+
+    for factory in (JsonCodec, OrjsonCodec, MsgspecCodec):
+        try:
+            codec = factory()
+        except ImportError:
+            print(f"{factory.name:8s} not installed")
+            continue
+
+        dumps = timeit.timeit(lambda: codec.dumps(order), number=n)
+        loads = timeit.timeit(lambda: codec.loads(raw), number=n // 10)
+        print(
+            f"{codec.name:8s} dumps(order): {n / dumps:12,.0f} ops/s"
+            f"    loads(50 fills): {n // 10 / loads:10,.0f} ops/s"
+        )
+
+
 if __name__ == "__main__":
     # benchmark()
     # debug_bills()
     demo()
     # debug_issue_26()
+    # codec_benchmark()
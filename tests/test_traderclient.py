@@ -2,7 +2,17 @@
 """Tests for `traderclient` package."""
 # pylint: disable=redefined-outer-name
 
+import argparse
+import asyncio
 import datetime
+import gzip
+import io
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
 import unittest
 import uuid
 from unittest import mock
@@ -12,9 +22,38 @@ import httpx
 import numpy as np
 from coretypes.errors.trade import BuylimitError, SellLimitError, TradeError
 
-from tests import assert_deep_almost_equal
-from traderclient.client import TraderClient
-from traderclient.utils import enable_logging
+from tests import app, assert_deep_almost_equal
+from traderclient.assets import AssetSeries
+from traderclient.async_client import AsyncTraderClient
+from traderclient.bills import BillsMirror
+from traderclient.cli import Account, Stats, _worker, order_times, parse_mix
+from traderclient.client import TraderClient, _lot_volumes
+from traderclient.datatypes import OrderSide, order_dtype, trade_dtype
+from traderclient.instrument import Instrument, parse_server_timing
+from traderclient.limits import PriceLimitCache
+from traderclient.local import bars_dtype
+from traderclient.multi import MultiAccountClient
+from traderclient.sweep import Sweep, param_grid
+from traderclient.transport import (
+    NPY_CONTENT_TYPE,
+    NPZ_CONTENT_TYPE,
+    Coalescer,
+    DeadlineExceeded,
+    Hedger,
+    JsonCodec,
+    MsgspecCodec,
+    OrjsonCodec,
+    Session,
+    Timeouts,
+    _json_body,
+    deadline,
+    get_codec,
+    process_response_result,
+    set_codec,
+    split_unix_url,
+    supported_encodings,
+)
+from traderclient.utils import enable_logging, to_datetimes
 
 rsp = httpx.get("http://localhost:3180/")
 endpoint = rsp.json()["endpoint"]
@@ -77,8 +116,12 @@ class TraderClientWithBacktestServerTest(unittest.IsolatedAsyncioTestCase):
         r = self.client.buy("002537.XSHE", 10, 500, order_time=date)
 
         with self.assertRaises(BuylimitError) as cm:
-            self.client.buy("002537.XSHE", 10.5, 500, order_time=datetime.datetime(2022, 3, 2, 14, 55))
-        
+            self.client.buy(
+                "002537.XSHE",
+                10.5,
+                500,
+                order_time=datetime.datetime(2022, 3, 2, 14, 55),
+            )
 
     def test_info(self):
         # this also test available_money, balance
@@ -183,7 +226,7 @@ class TraderClientWithBacktestServerTest(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(tx["security"], "002537.XSHE")
         self.assertEqual(tx["filled"], 300)
         self.assertAlmostEqual(tx["price"], 10.45, 2)
-        self.assertEqual("2022-03-02T10:04:00", tx["time"])
+        self.assertEqual(datetime.datetime(2022, 3, 2, 10, 4), tx["time"])
 
     def test_metrics(self):
         # this also test bills, get_assets
@@ -254,9 +297,990 @@ class TraderClientWithBacktestServerTest(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(assets[0]["date"], datetime.date(2022, 3, 1))
         self.assertEqual(assets[-1]["date"], datetime.date(2022, 3, 14))
 
+    def test_submit_many(self):
+        orders = np.array(
+            [
+                ("002537.XSHE", OrderSide.BUY, 10, 500, "2022-03-01T10:04:00"),
+                ("002537.XSHE", OrderSide.BUY, 10.5, 500, "2022-03-02T14:55:00"),
+                ("002537.XSHE", OrderSide.BUY, np.nan, 500, "2022-03-03T10:04:00"),
+            ],
+            dtype=order_dtype,
+        )
+
+        r = self.client.submit_many(orders)
+        self.assertEqual(3, len(r))
+        self.assertEqual(r[0]["filled"], 500)
+        self.assertEqual(r[0]["time"], datetime.datetime(2022, 3, 1, 10, 4))
+        self.assertIsInstance(r[1], BuylimitError)
+        self.assertEqual(r[2]["time"], datetime.datetime(2022, 3, 3, 10, 4))
+
+    def test_binary_wire_format(self):
+        assets = np.array(
+            [
+                (datetime.date(2022, 3, 1), 1_000_000.0),
+                (datetime.date(2022, 3, 2), 1e6),
+            ],
+            dtype=[("date", "datetime64[D]"), ("assets", "f8")],
+        )
+        request = httpx.Request("GET", f"{url}assets")
+
+        buf = io.BytesIO()
+        np.save(buf, assets)
+        rsp = httpx.Response(
+            200,
+            headers={"Content-Type": NPY_CONTENT_TYPE},
+            content=buf.getvalue(),
+            request=request,
+        )
+        actual = process_response_result(rsp)
+        np.testing.assert_array_equal(assets, actual)
+        # a view over the response body, not a copy
+        self.assertFalse(actual.flags.owndata)
+
+        buf = io.BytesIO()
+        np.savez(buf, assets=assets, tx=np.arange(3))
+        rsp = httpx.Response(
+            200,
+            headers={"Content-Type": NPZ_CONTENT_TYPE},
+            content=buf.getvalue(),
+            request=request,
+        )
+        actual = process_response_result(rsp)
+        np.testing.assert_array_equal(assets, actual["assets"])
+        np.testing.assert_array_equal(np.arange(3), actual["tx"])
+
+    def test_compression(self):
+        with Session() as session:
+            self.assertIn("gzip", session._client.headers["Accept-Encoding"])
+
+        with Session(compression=[]) as session:
+            self.assertEqual("identity", session._client.headers["Accept-Encoding"])
+
+        with mock.patch("traderclient.transport._importable", lambda m: m == "brotli"):
+            self.assertListEqual(["br", "gzip", "deflate"], supported_encodings())
+
+        headers = {}
+        body = _json_body({"security": "002537.XSHE"}, headers, compress_threshold=1024)
+        self.assertNotIn("Content-Encoding", headers)
+
+        orders = [{"security": f"{i:06d}.XSHE", "volume": 100} for i in range(100)]
+        body = _json_body(orders, headers, compress_threshold=1024)
+        self.assertEqual("gzip", headers["Content-Encoding"])
+        self.assertEqual(orders, json.loads(gzip.decompress(body)))
+
+    def test_hedger(self):
+        hedger = Hedger(min_samples=5)
+        calls = []
+
+        def send(hedge=False):
+            calls.append(hedge)
+            # the 6th call stalls, its hedge should win
+            if len(calls) == 6:
+                time.sleep(1)
+            return len(calls)
+
+        for _ in range(5):
+            hedger.run("info", send)
+        self.assertEqual(0, hedger.hedged)
+
+        t0 = time.time()
+        self.assertEqual(7, hedger.run("info", send))
+        self.assertLess(time.time() - t0, 0.5)
+        self.assertEqual(1, hedger.hedged)
+        self.assertEqual(1, hedger.hedge_wins)
+        self.assertListEqual([False] * 6 + [True], calls)
+        hedger.close()
+
+        # the hedge is sent with its own Request-ID, pointing to the original
+        seen = []
+
+        def handler(request):
+            seen.append(dict(request.headers))
+            if len(seen) == 4:
+                time.sleep(1)
+            return httpx.Response(
+                200,
+                content=pickle.dumps({"available": 1}),
+                headers={"Content-Type": "application/octet-stream"},
+            )
+
+        hedger = Hedger(min_samples=3)
+        with Session(hedger=hedger) as session:
+            session._client = httpx.Client(transport=httpx.MockTransport(handler))
+            for _ in range(4):
+                session.get("http://mock/info")
+        hedger.close()
+
+        self.assertEqual(5, len(seen))
+        self.assertNotEqual(seen[3]["request-id"], seen[4]["request-id"])
+        self.assertEqual(seen[3]["request-id"], seen[4]["hedge-of"])
+        self.assertNotIn("hedge-of", seen[3])
+
+        client = TraderClient(
+            url, self.client.account, self.client._token, hedge=Hedger(min_samples=1)
+        )
+        for _ in range(3):
+            self.assertEqual(client.info()["available"], 1_000_000)
+        client.close()
+
+    def test_instrument(self):
+        self.assertEqual(
+            {"db": 0.053, "app": 0.0472},
+            parse_server_timing('db;dur=53, app;desc="handler";dur=47.2, miss'),
+        )
+
+        instrument = Instrument()
+        client = TraderClient(
+            url, self.client.account, self.client._token, instrument=instrument
+        )
+        for _ in range(3):
+            client.info()
+        client.close()
+
+        stats = instrument.snapshot()["info"]
+        self.assertEqual(3, stats["count"])
+        self.assertEqual({200: 3}, stats["status"])
+        for phase in ("connect", "send", "wait", "download", "decode", "total"):
+            self.assertEqual(3, stats["latency"][phase]["count"])
+        self.assertGreater(stats["size"]["body"]["p50"], 0)
+
+    def test_snapshot_during_order(self):
+        state = {"available": 1_000_000}
+        posting, release = threading.Event(), threading.Event()
+
+        def handler(request):
+            if request.url.path.endswith("/buy"):
+                posting.set()
+                release.wait(5)
+                state["available"] = 900_000
+                body = {"security": "002537.XSHE", "filled": 100}
+            else:
+                body = dict(state)
+            return httpx.Response(
+                200,
+                content=pickle.dumps(body),
+                headers={"Content-Type": "application/octet-stream"},
+            )
+
+        client = TraderClient("http://mock", "acct", "token", snapshot_ttl=None)
+        client._session._client = httpx.Client(transport=httpx.MockTransport(handler))
+
+        order = threading.Thread(target=client.buy, args=("002537.XSHE", 10, 100))
+        order.start()
+        posting.wait(5)
+
+        # a read while the order is in flight sees the state before the trade
+        self.assertEqual(1_000_000, client.available_money)
+        release.set()
+        order.join()
+
+        self.assertEqual(900_000, client.available_money)
+        client.close()
+
+    def test_account_snapshot(self):
+        session = self.client._session
+        with mock.patch.object(session, "get", wraps=session.get) as spy:
+            self.client.info()
+            self.client.balance()
+            self.client.available_money
+            self.assertEqual(1, spy.call_count)
+
+            # trades invalidate the snapshot
+            self.client.buy(
+                "002537.XSHE", 10, 500, order_time=datetime.datetime(2022, 3, 1, 10, 4)
+            )
+            self.assertAlmostEqual(self.client.available_money, 995289.528, 2)
+            self.assertEqual(2, spy.call_count)
+
+            self.client._snapshot_ttl = 0
+            self.client.balance()
+            self.assertEqual(3, spy.call_count)
+
+        self.client.start_refresher(0.05)
+        time.sleep(0.2)
+        self.assertIsNotNone(self.client._snapshot)
+        self.client.close()
+        self.assertIsNone(self.client._refresher)
+
+    def test_available_shares_many(self):
+        dt = datetime.date(2022, 3, 1)
+        self.client.buy(
+            "002537.XSHE", 10, 500, order_time=datetime.datetime(2022, 3, 1, 10, 4)
+        )
+
+        session = self.client._session
+        with mock.patch.object(session, "get", wraps=session.get) as spy:
+            shares = self.client.available_shares_many(
+                ["600000.XSHG", "002537.XSHE"], dt
+            )
+            np.testing.assert_array_equal(shares, [0, 0])
+
+            # positions of the same date are served from cache
+            self.client.positions(dt)
+            self.client.available_shares("002537.XSHE", dt)
+            self.assertEqual(1, spy.call_count)
+
+            shares = self.client.available_shares_many(
+                ["002537.XSHE"], datetime.date(2022, 3, 7)
+            )
+            np.testing.assert_array_equal(shares, [500])
+            self.assertEqual(2, spy.call_count)
+
+            # trades invalidate the cache
+            self.client.sell(
+                "002537.XSHE", 10, 200, order_time=datetime.datetime(2022, 3, 7, 10, 4)
+            )
+            self.client.available_shares("002537.XSHE", datetime.date(2022, 3, 7))
+            self.assertEqual(3, spy.call_count)
+
+    def test_coalescer(self):
+        coalescer = Coalescer()
+        release = threading.Event()
+        results = []
+
+        def call():
+            release.wait()
+            return object()
+
+        threads = [
+            threading.Thread(target=lambda: results.append(coalescer.run("k", call)))
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        while coalescer.coalesced < 3:
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(1, coalescer.calls)
+        self.assertEqual(1, len({id(r) for r in results}))
+
+        client = TraderClient(
+            url, self.client.account, self.client._token, coalesce=True
+        )
+        threads = [threading.Thread(target=client.info) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        coalescer = client._session._coalescer
+        self.assertEqual(8, coalescer.calls + coalescer.coalesced)
+        client.close()
+
+    def test_normalize_times(self):
+        self.assertListEqual(
+            [
+                datetime.datetime(2022, 3, 1, 10, 4),
+                datetime.datetime(2022, 3, 23, 14, 55, 0, 100000),
+                None,
+            ],
+            to_datetimes(["2022-03-01T10:04:00", "2022-03-23 14:55:00.1000", None]),
+        )
+
+        # timezone is dropped, as arrow.get(x).naive does
+        self.assertListEqual(
+            [datetime.datetime(2022, 3, 1, 10, 4)] * 2,
+            to_datetimes(["2022-03-01T10:04:00+08:00"] * 2),
+        )
+
+        # None must not send aware strings through numpy, which converts to UTC
+        self.assertListEqual(
+            [datetime.datetime(2022, 3, 1, 10, 4), None],
+            to_datetimes(["2022-03-01T10:04:00+08:00", None]),
+        )
+        self.assertListEqual([None, None], to_datetimes([None, None]))
+
+        client = TraderClient(
+            url,
+            f"test-{uuid.uuid4().hex}",
+            f"{uuid.uuid4().hex}",
+            is_backtest=True,
+            start=datetime.date(2022, 3, 1),
+            end=datetime.date(2022, 3, 14),
+            fills_as_array=True,
+        )
+        client.buy(
+            "002537.XSHE", 10, 500, order_time=datetime.datetime(2022, 3, 1, 10, 4)
+        )
+        fills = client.sell(
+            "002537.XSHE", 9, 500, order_time=datetime.datetime(2022, 3, 7, 10, 4)
+        )
+        self.assertEqual(trade_dtype, fills.dtype)
+        self.assertEqual(np.datetime64("2022-03-07T10:04"), fills["time"][0])
+        client.close()
+
+    def test_codec(self):
+        order = {"security": "002537.XSHE", "volume": np.int64(500), "side": 1}
+        for factory in (JsonCodec, OrjsonCodec, MsgspecCodec):
+            try:
+                codec = factory()
+            except ImportError:
+                continue
+
+            if factory is not JsonCodec:
+                self.assertEqual(500, codec.loads(codec.dumps(order))["volume"])
+
+            # non-standard json from server falls back to stdlib
+            self.assertTrue(np.isnan(codec.loads(b'{"sharpe": NaN}')["sharpe"]))
+
+        try:
+            set_codec(JsonCodec())
+            self.assertEqual("json", get_codec().name)
+            info = self.client.info()
+            self.assertEqual(info["available"], 1_000_000)
+
+            with self.assertRaises(BuylimitError):
+                self.client.buy(
+                    "002537.XSHE",
+                    10.5,
+                    500,
+                    order_time=datetime.datetime(2022, 3, 2, 14, 55),
+                )
+        finally:
+            set_codec()
+
+    def test_timeouts(self):
+        timeouts = Timeouts(adaptive=True, min_samples=3)
+        self.assertEqual(5, timeouts.timeout(f"{url}buy").read)
+        self.assertEqual(60, timeouts.timeout(f"{url}bills").read)
+        # server waits `timeout` seconds for the broker
+        self.assertEqual(31, timeouts.timeout(f"{url}buy", {"timeout": 30}).read)
+
+        for _ in range(3):
+            timeouts.record("info", 0.01)
+        self.assertEqual(0.5, timeouts.timeout(f"{url}info").read)
+
+        at = time.monotonic() + 0.2
+        self.assertLessEqual(timeouts.timeout(f"{url}bills", at=at).connect, 0.2)
+
+        with mock.patch.dict("os.environ", {"TRADER_CLIENT_TIMEOUT": "7"}):
+            self.assertEqual(7, Timeouts().timeout(f"{url}info").read)
+
+        with deadline(1):
+            self.client.info()
+            time.sleep(1)
+            with self.assertRaises(DeadlineExceeded):
+                self.client.positions(datetime.date(2022, 3, 1))
+
+    def test_submit_schedule(self):
+        orders = np.array(
+            [
+                ("002537.XSHE", OrderSide.BUY, 10, 500, "2022-03-01T10:04:00"),
+                ("002537.XSHE", OrderSide.BUY, 10.5, 500, "2022-03-02T14:55:00"),
+                ("002537.XSHE", OrderSide.SELL, np.nan, 500, "2022-03-03T10:04:00"),
+            ],
+            dtype=order_dtype,
+        )
+
+        # problems are caught before upload
+        with self.assertRaises(ValueError):
+            self.client.submit_schedule(orders[::-1])
+
+        r = self.client.submit_schedule(orders, chunk_size=2)
+        self.assertEqual(3, len(r))
+        self.assertEqual(r[0]["time"], datetime.datetime(2022, 3, 1, 10, 4))
+        self.assertIsInstance(r[1], BuylimitError)
+        self.assertEqual(r[2][0]["filled"], 500)
+
+        with self.assertRaises(ValueError):
+            self.client.submit_schedule(orders[:1])
+
+    def test_schedule_fallback(self):
+        sent = []
+
+        def handler(request):
+            cmd = request.url.path.split("/")[-1]
+            if cmd == "schedule":
+                return httpx.Response(404)
+
+            body = {}
+            if cmd in ("buy", "sell", "market_sell"):
+                sent.append((cmd, json.loads(request.content)))
+                body = {"filled": 500, "time": "2022-03-01 10:04:00"}
+            elif cmd == "info":
+                body = {"last_trade": None}
+            return httpx.Response(
+                200,
+                content=pickle.dumps(body),
+                headers={"Content-Type": "application/octet-stream"},
+            )
+
+        session = Session()
+        session._client = httpx.Client(transport=httpx.MockTransport(handler))
+        client = TraderClient(
+            "http://mock",
+            "acct",
+            "token",
+            is_backtest=True,
+            start=datetime.date(2022, 3, 1),
+            end=datetime.date(2022, 3, 3),
+            session=session,
+        )
+
+        # order_time given as strings passes validation, and the fallback too
+        orders = [
+            {
+                "security": "002537.XSHE",
+                "side": OrderSide.BUY,
+                "price": 10,
+                "volume": 500,
+                "order_time": "2022-03-01 10:04:00",
+            },
+            {
+                "security": "002537.XSHE",
+                "side": OrderSide.SELL,
+                "price": None,
+                "volume": 500,
+                "order_time": "2022-03-02T10:04:00",
+            },
+        ]
+        r = client.submit_schedule(orders)
+        self.assertEqual([500, 500], [x["filled"] for x in r])
+        self.assertFalse(client._schedule_supported)
+        self.assertListEqual(["buy", "market_sell"], [cmd for cmd, _ in sent])
+        self.assertEqual("2022-03-02 10:04:00", sent[1][1]["order_time"])
+        session.close()
+
+    def test_local_engine(self):
+        days = np.array(
+            ["2022-03-01", "2022-03-02", "2022-03-03"], dtype="datetime64[D]"
+        )
+        minutes = np.arange(240).astype("timedelta64[m]") + np.timedelta64(570, "m")
+        frames = (days[:, None] + minutes).ravel()
+        bars = np.zeros(len(frames), dtype=bars_dtype)
+        bars["frame"] = frames
+        bars["close"] = np.repeat([9.4, 9.5, 9.6], 240)
+        bars["volume"] = 1000
+
+        client = TraderClient(
+            "local://",
+            "local",
+            "token",
+            is_backtest=True,
+            start=datetime.date(2022, 3, 1),
+            end=datetime.date(2022, 3, 3),
+            bars={"002537.XSHE": bars},
+        )
+
+        r = client.buy(
+            "002537.XSHE", 10, 500, order_time=datetime.datetime(2022, 3, 1, 10, 4)
+        )
+        self.assertAlmostEqual(r["price"], 9.4, 5)
+        self.assertEqual(r["time"], datetime.datetime(2022, 3, 1, 10, 4))
+        self.assertEqual(
+            0, client.available_shares("002537.XSHE", datetime.date(2022, 3, 1))
+        )
+
+        with self.assertRaises(TradeError):
+            client.sell(
+                "002537.XSHE", 9, 500, order_time=datetime.datetime(2022, 3, 1, 14, 0)
+            )
+
+        r = client.sell(
+            "002537.XSHE", 9, 500, order_time=datetime.datetime(2022, 3, 2, 10, 4)
+        )
+        self.assertAlmostEqual(r[0]["price"], 9.5, 5)
+        self.assertEqual(datetime.date(2022, 3, 2), client.info()["last_trade"])
+
+        client.stop_backtest()
+        assets = client.get_assets()
+        self.assertEqual(3, len(assets))
+        self.assertAlmostEqual(assets[-1]["assets"], 1_000_000 + 50 - 0.945, 2)
+        self.assertEqual(1, client.metrics()["total_tx"])
+
+    async def test_transports(self):
+        self.assertEqual(
+            ("http://localhost/trade/api/v1", "/run/trader.sock"),
+            split_unix_url("http+unix://%2Frun%2Ftrader.sock/trade/api/v1"),
+        )
+        self.assertEqual((url, None), split_unix_url(url))
+
+        # the mock app is served in process, without a listening port
+        async with AsyncTraderClient("http://mock", "acct", "token", app=app) as client:
+            info = await client.info()
+            self.assertEqual("aaron", info["name"])
+            self.assertEqual(2, len(info["positions"]))
+
+    def test_bench_cli(self):
+        self.assertEqual({"buy": 3.0, "info": 1.0}, parse_mix("buy=3,info"))
+        with self.assertRaises(ValueError):
+            parse_mix("buy=3,transfer=1")
+
+        times = order_times(datetime.date(2022, 3, 4), step=60 * 60)
+        first = [next(times) for _ in range(7)]
+        self.assertEqual(datetime.datetime(2022, 3, 4, 9, 31), first[0])
+        # rolls over the weekend
+        self.assertEqual(datetime.datetime(2022, 3, 7, 9, 31), first[6])
+
+        # bounded by the end of the backtest window
+        times = list(order_times(datetime.date(2022, 3, 4), datetime.date(2022, 3, 7)))
+        self.assertEqual(datetime.datetime(2022, 3, 7, 14, 56), times[-1])
+
+        stats = Stats()
+        stats.record("buy", 0.003)
+        stats.record("buy", 0.030, TradeError("rejected"))
+        report = stats.report(1.0)["buy"]
+        self.assertEqual(0.5, report["error_rate"])
+        self.assertEqual({"TradeError": 1}, report["error_types"])
+        self.assertEqual(2, sum(report["histogram"]))
+
+    async def test_bench_window(self):
+        calls = []
+
+        class Client:
+            async def buy(self, security, price, volume, order_time):
+                calls.append(("buy", order_time))
+
+            async def positions(self, dt):
+                calls.append(("positions", dt))
+
+        args = argparse.Namespace(
+            backtest=True,
+            start=datetime.date(2022, 3, 4),
+            end=datetime.date(2022, 3, 7),
+            security="000001.XSHE",
+            price=10.0,
+            volume=100,
+        )
+        account = Account(Client(), args)
+        stats = Stats()
+
+        # the workers stop once the window is used up, long before the deadline
+        stop = time.perf_counter() + 60
+        await asyncio.gather(
+            *[
+                _worker(account, ["buy", "positions"], [9, 1], stats, stop)
+                for _ in range(2)
+            ]
+        )
+        self.assertTrue(account.exhausted)
+        self.assertEqual({}, dict(stats.errors))
+
+        buys = [t for op, t in calls if op == "buy"]
+        self.assertEqual(len(list(order_times(args.start, args.end))), len(buys))
+        self.assertEqual(datetime.datetime(2022, 3, 7, 14, 56), buys[-1])
+
+        # positions follow the simulated day, not the start of the window
+        await account.call("positions")
+        self.assertEqual(("positions", datetime.date(2022, 3, 7)), calls[-1])
+
+    def test_multi_account(self):
+        def handler(request: httpx.Request):
+            acct = request.headers["Account"]
+            if acct == "broken":
+                return httpx.Response(500)
+
+            if request.url.path.endswith("/info"):
+                body = {"name": acct, "principal": 1_000_000, "assets": 1_100_000}
+            else:
+                body = np.array(
+                    [("000001.XSHE", 100, 100, 9.2)],
+                    dtype=[
+                        ("security", "O"),
+                        ("shares", "f8"),
+                        ("sellable", "f8"),
+                        ("price", "f8"),
+                    ],
+                )
+            return httpx.Response(
+                200,
+                content=pickle.dumps(body),
+                headers={"Content-Type": "application/octet-stream"},
+            )
+
+        accounts = {"a": "ta", "b": "tb", "broken": "tc"}
+        with MultiAccountClient("http://mock", accounts) as multi:
+            multi._session._client = httpx.Client(
+                transport=httpx.MockTransport(handler)
+            )
+
+            r = multi.info()
+            self.assertListEqual(["a", "b"], r.data["account"].tolist())
+            self.assertEqual(1_100_000, r.data["assets"][0])
+            self.assertTrue(np.isnan(r.data["pnl"][0]))
+            self.assertIsInstance(r.errors["broken"], httpx.HTTPStatusError)
+
+            r = multi.positions()
+            self.assertListEqual(["a", "b"], r.data["account"].tolist())
+            self.assertListEqual([100, 100], r.data["shares"].tolist())
+
+    def test_sweep(self):
+        self.assertEqual(
+            [{"volume": 100, "hold": 1}, {"volume": 200, "hold": 1}],
+            param_grid({"volume": [100, 200], "hold": [1]}),
+        )
+
+        days = np.array(["2022-03-01", "2022-03-02"], dtype="datetime64[D]")
+        frames = (days[:, None] + np.timedelta64(600, "m")).ravel()
+        bars = np.zeros(len(frames), dtype=bars_dtype)
+        bars["frame"] = frames
+        bars["close"] = [9.4, 9.5]
+        bars["volume"] = 1e6
+
+        def strategy(client, volume):
+            if volume > 1000:
+                raise ValueError("too many")
+            order_time = datetime.datetime(2022, 3, 1, 10)
+            client.buy("002537.XSHE", 10, volume, order_time=order_time)
+
+        sweep = Sweep(
+            strategy,
+            {"volume": [100, 200, 2000]},
+            "local://",
+            datetime.date(2022, 3, 1),
+            datetime.date(2022, 3, 2),
+            bars={"002537.XSHE": bars},
+        )
+        r = sweep.run()
+        self.assertListEqual([100, 200], r.data["volume"].tolist())
+        self.assertAlmostEqual(r.data["total_profit"][1], 200 * 0.1 - 0.188, 2)
+        self.assertEqual(1, len(r.errors))
+
+    async def test_price_limits(self):
+        calls = []
+
+        async def loader(securities, date):
+            calls.append(list(securities))
+            return {sec: (11.0, 9.0) for sec in securities if sec != "000002.XSHE"}
+
+        cache = PriceLimitCache(maxsize=3, loader=loader)
+        today = datetime.date.today()
+        self.assertEqual(2, await cache.prefetch(["000001.XSHE", "600000.XSHG"], today))
+        self.assertEqual(0, await cache.prefetch(["000001.XSHE"], today))
+        self.assertEqual((11.0, 9.0), await cache.get("600000.XSHG", today))
+        self.assertIsNone(await cache.get("000002.XSHE", today))
+        self.assertEqual(2, len(calls))
+
+        # least recently used is evicted
+        await cache.prefetch(["600001.XSHG", "600002.XSHG"], today)
+        self.assertNotIn(("000001.XSHE", today), cache)
+        self.assertIn(("600000.XSHG", today), cache)
+
+        # entries of the previous day are dropped
+        cache._day = today - datetime.timedelta(days=1)
+        self.assertNotIn(("600000.XSHG", today), cache)
+        self.assertEqual(0, len(cache))
+
+        client = AsyncTraderClient(url, "acct", "token", price_limits=cache)
+        await client.prefetch_limits(["000001.XSHE"])
+        self.assertEqual(11.0, await client._get_market_buy_price("000001.XSHE"))
+        self.assertEqual(9.0, await client._get_market_sell_price("000001.XSHE"))
+        await client.close()
+
+    async def test_buy_by_weights(self):
+        volumes = _lot_volumes(
+            np.array([50_000, 30_000, 20_000, 0]),
+            np.array([10.1, 9.9, 33.0, 5.0]),
+            100_000,
+        )
+        self.assertListEqual([5000, 3000, 600, 0], volumes.tolist())
+        self.assertLessEqual(np.sum(volumes * [10.1, 9.9, 33.0, 5.0]), 100_000)
+
+        # the residue is bounded by the budgets, not by the whole cash
+        volumes = _lot_volumes(np.array([150.0, 150.0]), np.array([1.0, 1.0]), 1000)
+        self.assertListEqual([200, 100], volumes.tolist())
+        self.assertLessEqual(np.sum(volumes), 300)
+
+        # a lot that does not fit does not stop the cheaper ones after it
+        volumes = _lot_volumes(np.array([1900, 1000]), np.array([20.0, 10.0]), 10_000)
+        self.assertListEqual([0, 200], volumes.tolist())
+
+        orders = []
+
+        def handler(request):
+            order = json.loads(request.content)
+            orders.append((request.url.path.split("/")[-1], order))
+            return httpx.Response(
+                200,
+                content=pickle.dumps({**order, "filled": order["volume"]}),
+                headers={"Content-Type": "application/octet-stream"},
+            )
+
+        async def loader(securities, date):
+            return {sec: (11.0, 9.0) for sec in securities}
+
+        client = TraderClient(
+            "http://mock", "acct", "token", price_limits=PriceLimitCache(loader=loader)
+        )
+        client._session._client = httpx.Client(transport=httpx.MockTransport(handler))
+
+        r = await client.buy_by_weights(
+            ["000001.XSHE", "600000.XSHG", "000002.XSHE"],
+            [0.5, 0.5, 0.0],
+            22_000,
+            prices=[10.0, None, 10.0],
+        )
+        self.assertIsNone(r[2])
+        self.assertEqual(1100, r[0]["volume"])
+        self.assertEqual(1000, r[1]["volume"])
+        self.assertListEqual(["buy", "market_buy"], sorted(cmd for cmd, _ in orders))
+
+        # weights summing to less than 1 leave the rest of the money unspent
+        orders.clear()
+        r = await client.buy_by_weights(
+            ["000001.XSHE", "000002.XSHE"], [0.3, 0.2], 10_000, prices=[10.0, 10.0]
+        )
+        self.assertListEqual([300, 200], [x["volume"] for x in r])
+        spent = sum(order["price"] * order["volume"] for _, order in orders)
+        self.assertLessEqual(spent, 10_000 * 0.5)
+
+        with self.assertRaises(ValueError):
+            await client.buy_by_weights(["000001.XSHE"], [1.2], 10_000, [10.0])
+
+        # the orders are sent from a worker thread, the event loop keeps running
+        release = threading.Event()
+
+        def blocking(request):
+            release.wait(5)
+            return handler(request)
+
+        client._session._client = httpx.Client(transport=httpx.MockTransport(blocking))
+
+        async def release_later():
+            await asyncio.sleep(0.01)
+            release.set()
+
+        t0 = time.perf_counter()
+        r, _ = await asyncio.gather(
+            client.buy_by_weights(["000001.XSHE"], [1.0], 10_000, [10.0]),
+            release_later(),
+        )
+        self.assertLess(time.perf_counter() - t0, 2)
+        self.assertEqual(1000, r[0]["volume"])
+        client.close()
+
+    async def test_rebalance(self):
+        days = np.array(["2022-03-01", "2022-03-02"], dtype="datetime64[D]")
+        minutes = np.arange(240).astype("timedelta64[m]") + np.timedelta64(570, "m")
+        frames = (days[:, None] + minutes).ravel()
+        bars = {}
+        for sec, close in (("002537.XSHE", 9.5), ("600000.XSHG", 19.5)):
+            bars[sec] = np.zeros(len(frames), dtype=bars_dtype)
+            bars[sec]["frame"] = frames
+            bars[sec]["close"] = close
+            bars[sec]["volume"] = 1e8
+
+        client = TraderClient(
+            "local://",
+            "local",
+            "token",
+            is_backtest=True,
+            start=datetime.date(2022, 3, 1),
+            end=datetime.date(2022, 3, 2),
+            bars=bars,
+        )
+
+        day1 = datetime.datetime(2022, 3, 1, 10)
+        r = await client.rebalance(
+            {"002537.XSHE": 0.5}, prices={"002537.XSHE": 10}, order_time=day1
+        )
+        self.assertListEqual(["002537.XSHE"], r["security"].tolist())
+        self.assertListEqual([50000], r["filled"].tolist())
+
+        # shares bought today are not sellable (T+1), only the buy side is sent
+        r = await client.rebalance(
+            {"002537.XSHE": 0.2, "600000.XSHG": 0.3},
+            prices={"002537.XSHE": 9, "600000.XSHG": 20},
+            total_assets=1_000_000,
+            order_time=day1 + datetime.timedelta(minutes=1),
+        )
+        self.assertListEqual([OrderSide.BUY], r["side"].tolist())
+        self.assertListEqual([15000], r["volume"].tolist())
+
+        # sells go first, positions missing from targets are cleared
+        r = await client.rebalance(
+            {"002537.XSHE": 0.2},
+            prices={"002537.XSHE": 9, "600000.XSHG": 19},
+            order_time=datetime.datetime(2022, 3, 2, 10),
+        )
+        self.assertListEqual([OrderSide.SELL, OrderSide.SELL], r["side"].tolist())
+        self.assertListEqual([15000, 50000], r["current"][::-1].tolist())
+        self.assertEqual(0, r["target"][r["security"] == "600000.XSHG"][0])
+        self.assertTrue(np.all(r["filled"] == r["volume"]))
+        self.assertTrue(all(e is None for e in r["error"]))
+
+        # nothing to do when positions already match the targets
+        r = await client.rebalance(
+            {"002537.XSHE": 0.2},
+            prices={"002537.XSHE": 9},
+            total_assets=r["target"][0] * 9 / 0.2 + 1,
+            order_time=datetime.datetime(2022, 3, 2, 10, 1),
+        )
+        self.assertEqual(0, len(r))
+
+        with self.assertRaises(ValueError):
+            await client.rebalance({"002537.XSHE": 1.1}, order_time=day1)
+
+    def test_sync_assets(self):
+        series = AssetSeries(capacity=2)
+        dtype = [("date", "O"), ("assets", "f8")]
+        days = [datetime.date(2022, 3, i) for i in range(1, 6)]
+        self.assertEqual(3, series.merge(np.array([(d, 1.0) for d in days[:3]], dtype)))
+        view = series.window(days[1], days[2])
+        self.assertListEqual(days[1:3], view["date"].tolist())
+
+        # the last day is replaced, older records are ignored
+        self.assertEqual(2, series.merge(np.array([(d, 2.0) for d in days[1:]], dtype)))
+        self.assertListEqual(days, series.data["date"].tolist())
+        self.assertListEqual([1, 1, 2, 2, 2], series.data["assets"].tolist())
+        self.assertEqual(0, len(series.window(datetime.date(2022, 3, 6))))
+        self.assertEqual(days[-1], series.last_date)
+
+        bars = np.zeros(720, dtype=bars_dtype)
+        frames = np.array(
+            ["2022-03-01", "2022-03-02", "2022-03-03"], dtype="datetime64[D]"
+        )
+        minutes = np.arange(240).astype("timedelta64[m]") + np.timedelta64(570, "m")
+        bars["frame"] = (frames[:, None] + minutes).ravel()
+        bars["close"] = 10
+        bars["volume"] = 1e8
+
+        client = TraderClient(
+            "local://",
+            "local",
+            "token",
+            is_backtest=True,
+            start=datetime.date(2022, 3, 1),
+            end=datetime.date(2022, 3, 3),
+            bars={"002537.XSHE": bars},
+        )
+        client.buy("002537.XSHE", 10, 500, order_time=datetime.datetime(2022, 3, 1, 10))
+        client.buy("002537.XSHE", 10, 500, order_time=datetime.datetime(2022, 3, 2, 10))
+
+        with mock.patch.object(
+            client, "get_assets", wraps=client.get_assets
+        ) as get_assets:
+            series = client.sync_assets()
+            self.assertEqual(2, len(series))
+            client.stop_backtest()
+            series = client.sync_assets()
+            self.assertEqual(3, len(series))
+            self.assertEqual(
+                datetime.date(2022, 3, 2), get_assets.call_args_list[1].args[0]
+            )
+
+        assert_deep_almost_equal(
+            self, client.get_assets().tolist(), series.data.tolist(), places=2
+        )
+
+    def test_sync_bills(self):
+        days = np.array(
+            ["2022-03-01", "2022-03-02", "2022-03-03"], dtype="datetime64[D]"
+        )
+        minutes = np.arange(240).astype("timedelta64[m]") + np.timedelta64(570, "m")
+        bars = {}
+        for sec in ("002537.XSHE", "600000.XSHG"):
+            bars[sec] = np.zeros(720, dtype=bars_dtype)
+            bars[sec]["frame"] = (days[:, None] + minutes).ravel()
+            bars[sec]["close"] = 10
+            bars[sec]["volume"] = 1e8
+
+        client = TraderClient(
+            "local://",
+            "local",
+            "token",
+            is_backtest=True,
+            start=datetime.date(2022, 3, 1),
+            end=datetime.date(2022, 3, 3),
+            bars=bars,
+        )
+        t0 = datetime.datetime(2022, 3, 1, 10)
+        client.buy("002537.XSHE", 10, 500, order_time=t0)
+        client.buy("600000.XSHG", 10, 500, order_time=t0)
+
+        with tempfile.TemporaryDirectory() as path:
+            mirror = client.sync_bills(path)
+            self.assertEqual(datetime.date(2022, 3, 1), mirror.since)
+            self.assertIsInstance(mirror["trades"], np.memmap)
+            inode = os.stat(os.path.join(path, "trades.npy")).st_ino
+
+            client.sell("002537.XSHE", 10, 500, order_time=t0 + datetime.timedelta(1))
+            client.stop_backtest()
+            with mock.patch.object(
+                client._session, "get", wraps=client._session.get
+            ) as get:
+                mirror = client.sync_bills(path)
+                self.assertEqual(
+                    {"start": "2022-03-01"}, get.call_args.kwargs["params"]
+                )
+
+            # new trades are appended in place
+            self.assertEqual(inode, os.stat(os.path.join(path, "trades.npy")).st_ino)
+
+            bills = client.bills()
+            for section in ("trades", "tx", "positions", "assets"):
+                self.assertEqual(len(bills[section]), len(mirror[section]))
+
+            trades = mirror.select("trades", security="002537.XSHE")
+            self.assertListEqual([1, -1], trades["order_side"].tolist())
+            positions = mirror.select(
+                "positions", start=datetime.date(2022, 3, 2), security="600000.XSHG"
+            )
+            self.assertEqual(2, len(positions))
+            self.assertEqual(
+                0, len(mirror.select("assets", end=datetime.date(2022, 2, 28)))
+            )
+
+            # reopening needs no request
+            mirror = BillsMirror(path)
+            self.assertEqual(3, len(mirror["trades"]))
+            with self.assertRaises(ValueError):
+                BillsMirror(path, "another")
+
     def test_stop_backtest(self):
         self.client.stop_backtest()
 
+    def test_session(self):
+        with Session() as session:
+            with TraderClient(
+                url,
+                f"test-{uuid.uuid4().hex}",
+                f"{uuid.uuid4().hex}",
+                is_backtest=True,
+                start=datetime.date(2022, 3, 1),
+                end=datetime.date(2022, 3, 14),
+                session=session,
+            ) as client:
+                info = client.info()
+                self.assertEqual(info["available"], 1_000_000)
+
+            # shared session is not closed by client
+            self.assertFalse(session.closed)
+
+        self.assertTrue(session.closed)
+
+        with self.client:
+            self.client.info()
+
+        self.assertTrue(self.client._session.closed)
+
+    async def test_async_client(self):
+        async with AsyncTraderClient(
+            url,
+            f"test-{uuid.uuid4().hex}",
+            f"{uuid.uuid4().hex}",
+            is_backtest=True,
+            start=datetime.date(2022, 3, 1),
+            end=datetime.date(2022, 3, 14),
+        ) as client:
+            date = datetime.datetime(2022, 3, 1, 10, 4)
+            r = await client.buy("002537.XSHE", 10, 500, order_time=date)
+            self.assertEqual(r["security"], "002537.XSHE")
+            self.assertEqual(r["filled"], 500)
+            self.assertEqual(r["time"], date)
+
+            info, positions = await asyncio.gather(
+                client.info(), client.positions(datetime.date(2022, 3, 1))
+            )
+            self.assertAlmostEqual(info["available"], 995289.528, 2)
+            self.assertListEqual(positions["security"].tolist(), ["002537.XSHE"])
+            self.assertAlmostEqual(await client.available_money(), 995289.528, 2)
+
+        self.assertTrue(client._session.closed)
+
     async def test_buy_by_money(self):
         await self._setup_omicron()
 
@@ -297,7 +1321,7 @@ class TraderClientWithBacktestServerTest(unittest.IsolatedAsyncioTestCase):
             "msg": "不能在跌停板上卖出000001, 2019-03-18",
             "stack": "line1\nlin2",
         }
-        with mock.patch("httpx.post", return_value=rsp):
+        with mock.patch("httpx.Client.post", return_value=rsp):
             with self.assertRaises(SellLimitError) as cm:
                 await self.client.sell_percent(
                     "000001",
@@ -311,7 +1335,7 @@ class TraderClientWithBacktestServerTest(unittest.IsolatedAsyncioTestCase):
 
         rsp.headers.get.return_value = "plain text/html"
         rsp.text = "不能在跌停板上卖出000001, 2019-03-18"
-        with mock.patch("httpx.post", return_value=rsp):
+        with mock.patch("httpx.Client.post", return_value=rsp):
             with self.assertRaises(TradeError) as cm:
                 await self.client.sell_percent(
                     "000001",
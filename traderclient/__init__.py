@@ -1,4 +1,13 @@
+from traderclient.async_client import AsyncTraderClient
 from traderclient.client import TraderClient
 from traderclient.datatypes import OrderSide, OrderStatus, OrderType
+from traderclient.multi import MultiAccountClient
 
-__all__ = ["TraderClient", "OrderStatus", "OrderSide", "OrderType"]
+__all__ = [
+    "TraderClient",
+    "AsyncTraderClient",
+    "MultiAccountClient",
+    "OrderStatus",
+    "OrderSide",
+    "OrderType",
+]
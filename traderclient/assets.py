@@ -0,0 +1,122 @@
+"""资产序列的本地缓存
+
+`get_assets`每次都返回从账户开始以来的全部资产记录，记录数随交易日增长。[AssetSeries][traderclient.assets.AssetSeries]在本地保存已取得的记录，[sync_assets][traderclient.client.TraderClient.sync_assets]只向服务器请求缓存中最后一天及以后的记录，并追加到预先分配的数组中；之后任意区间的数据都可以通过`window`以视图方式取得，不再访问服务器。
+
+```python
+series = client.sync_assets()
+week = series.window(datetime.date(2022, 3, 1), datetime.date(2022, 3, 7))
+```
+
+缓存中最后一天的记录可能是盘中估算值（实盘当日，或者回测中尚未收盘的交易日），因此每次同步都会重新请求这一天，并以新的记录替换它。
+"""
+import datetime
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+class AssetSeries:
+    """一个账户按日期递增的资产记录
+
+    记录保存在按倍数扩容的数组中，追加的均摊开销为O(1)；按日期查找使用`searchsorted`。此类是线程安全的。
+    """
+
+    def __init__(self, capacity: int = 256):
+        """
+        Args:
+            capacity: 初始容量（记录数）
+        """
+        self._capacity = capacity
+        self._records: Optional[np.ndarray] = None
+        self._dates = np.empty(0, dtype="datetime64[D]")
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def data(self) -> np.ndarray:
+        """全部已缓存的记录（视图）"""
+        if self._records is None:
+            return np.empty(0, dtype=[("date", "O"), ("assets", "f8")])
+        return self._records[: self._size]
+
+    @property
+    def last_date(self) -> Optional[datetime.date]:
+        """缓存中最后一条记录的日期，无记录时为None"""
+        if self._size == 0:
+            return None
+        return self._dates[self._size - 1].item()
+
+    def _reserve(self, size: int, dtype: np.dtype):
+        """保证数组至少能容纳`size`条记录。容量不足时，扩大为原来的两倍"""
+        if self._records is None:
+            capacity = max(self._capacity, size)
+            self._records = np.empty(capacity, dtype=dtype)
+            self._dates = np.empty(capacity, dtype="datetime64[D]")
+            return
+
+        if size <= len(self._records):
+            return
+
+        capacity = max(size, len(self._records) * 2)
+        records = np.empty(capacity, dtype=self._records.dtype)
+        records[: self._size] = self._records[: self._size]
+        dates = np.empty(capacity, dtype="datetime64[D]")
+        dates[: self._size] = self._dates[: self._size]
+        self._records, self._dates = records, dates
+
+    def merge(self, records: np.ndarray) -> int:
+        """合并服务器返回的记录
+
+        早于缓存中最后一天的记录将被忽略；与最后一天相同的记录将替换它。
+
+        Returns:
+            新增的记录数
+        """
+        if records is None or len(records) == 0:
+            return 0
+
+        dates = np.array(records["date"].tolist(), dtype="datetime64[D]")
+        with self._lock:
+            replaced = 0
+            if self._size > 0:
+                last = self._dates[self._size - 1]
+                start = np.searchsorted(dates, last)
+                replaced = int(start < len(dates) and dates[start] == last)
+                records, dates = records[start:], dates[start:]
+                self._size -= replaced
+
+            end = self._size + len(records)
+            self._reserve(end, records.dtype)
+            self._records[self._size : end] = records
+            self._dates[self._size : end] = dates
+            self._size = end
+
+        return len(records) - replaced
+
+    def window(
+        self,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
+    ) -> np.ndarray:
+        """取[start, end]间的记录
+
+        Returns:
+            缓存数组的视图，调用者不应修改它
+        """
+        with self._lock:
+            dates = self._dates[: self._size]
+            i = 0 if start is None else np.searchsorted(dates, np.datetime64(start))
+            j = (
+                self._size
+                if end is None
+                else np.searchsorted(dates, np.datetime64(end), side="right")
+            )
+            return self.data[i:j]
+
+    def clear(self):
+        with self._lock:
+            self._size = 0
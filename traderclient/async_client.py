@@ -0,0 +1,792 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import httpx
+import numpy as np
+
+from traderclient.assets import AssetSeries
+from traderclient.bills import BillsMirror
+from traderclient.client import (
+    TraderClient,
+    _buy_volumes,
+    _is_market_price,
+    _normalize_orders,
+    _normalize_result,
+    _PositionIndex,
+    _rebalance_report,
+    _rebalance_universe,
+    _schedule_payload,
+    _schedule_results,
+    _schedule_wire,
+    _sell_volumes,
+)
+from traderclient.datatypes import OrderSide, OrderType
+from traderclient.limits import _price_limits
+from traderclient.local import AsyncLocalSession, LocalEngine
+from traderclient.transport import (
+    ASGITransport,
+    AsyncSession,
+    Coalescer,
+    Hedger,
+    split_unix_url,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTraderClient:
+    """大富翁实盘和回测的异步客户端。
+
+    `AsyncTraderClient`的方法与[TraderClient][traderclient.client.TraderClient]一一对应，但都是协程，因此不会阻塞事件循环。同一进程中的多个协程可以共享同一个客户端（及其连接池），同时发出成百上千个下单和查询请求。
+
+    由于构造函数不能执行异步调用，在回测模式下，创建回测账户的操作推迟到`init`中进行。推荐以异步上下文管理器的方式使用，此时会自动调用`init`和`close`:
+
+    ```python
+    async with AsyncTraderClient(url, acct, token) as client:
+        await client.buy(...)
+    ```
+
+    `close`会等待所有进行中的请求完成后，再关闭连接池。
+    """
+
+    def __init__(
+        self, url: str, acct: str, token: str, is_backtest: bool = False, **kwargs
+    ):
+        """构建一个异步交易客户端
+
+        参数同[TraderClient][traderclient.client.TraderClient]，其中`session`应该为[AsyncSession][traderclient.transport.AsyncSession]，`transport`应为异步传输层，`app`将以[ASGITransport][traderclient.transport.ASGITransport]调用。
+        """
+        url, uds = split_unix_url(url)
+        self._url = url.rstrip("/")
+        self._token = token
+        self._account = acct
+        self.headers = {"Authorization": self._token}
+        self.headers["Account"] = self._account
+
+        self._is_backtest = is_backtest
+        self._fills_as_array = kwargs.get("fills_as_array", False)
+
+        session = kwargs.get("session")
+        self._owns_session = session is None
+        if session is None and url.startswith("local://"):
+            engine = kwargs.get("engine") or LocalEngine(kwargs.get("bars", {}))
+            session = AsyncLocalSession(engine)
+        elif session is None:
+            transport = kwargs.get("transport")
+            if transport is None and kwargs.get("app") is not None:
+                transport = ASGITransport(kwargs["app"])
+            hedger = kwargs.get("hedge")
+            if hedger is True:
+                hedger = Hedger()
+            coalescer = kwargs.get("coalesce")
+            if coalescer is True:
+                coalescer = Coalescer()
+            session = AsyncSession(
+                max_connections=kwargs.get("max_connections", 100),
+                max_keepalive_connections=kwargs.get("max_keepalive_connections", 20),
+                keepalive_expiry=kwargs.get("keepalive_expiry", 5.0),
+                http2=kwargs.get("http2", False),
+                compression=kwargs.get("compression"),
+                compress_threshold=kwargs.get("compress_threshold"),
+                hedger=hedger or None,
+                instrument=kwargs.get("instrument"),
+                coalescer=coalescer or None,
+                timeouts=kwargs.get("timeouts"),
+                uds=kwargs.get("uds", uds),
+                transport=transport,
+            )
+        self._session = session
+
+        if is_backtest:
+            self._principal = kwargs.get("principal", 1_000_000)
+            self._commission = kwargs.get("commission", 1e-4)
+            self._start = kwargs.get("start")
+            self._end = kwargs.get("end")
+            if self._start is None or self._end is None:
+                raise ValueError("start and end must be specified in backtest mode")
+
+        self._initialized = False
+
+        self._is_dirty = False
+        self._snapshot: Optional[Dict] = None
+        self._snapshot_at = 0.0
+        self._snapshot_ttl = kwargs.get("snapshot_ttl", 1.0)
+        self._generation = 0
+        self._refresher: Optional[asyncio.Task] = None
+
+        # positions by date, each entry: (generation, fetched_at, index)
+        self._positions_cache: Dict[Optional[datetime.date], tuple] = {}
+
+        # daily assets fetched so far, see sync_assets
+        self._asset_series = AssetSeries()
+
+        # whether the server accepts bulk schedule upload
+        self._schedule_supported = True
+
+        self._price_limits = kwargs.get("price_limits")
+        if self._price_limits is None:
+            self._price_limits = _price_limits
+
+    def _cmd_url(self, cmd: str) -> str:
+        return f"{self._url}/{cmd}"
+
+    async def init(self):
+        """完成客户端初始化。在回测模式下，会在服务端创建新账户"""
+        if self._initialized:
+            return
+
+        if self._is_backtest:
+            await self._start_backtest(
+                self._account,
+                self._token,
+                self._principal,
+                self._commission,
+                self._start,
+                self._end,
+            )
+
+        self._initialized = True
+
+    async def close(self, timeout: Optional[float] = None):
+        """等待进行中的请求完成，并关闭客户端持有的连接池
+
+        如果连接池是通过`session`参数传入的，则由调用者负责关闭。
+
+        Args:
+            timeout : 等待进行中请求完成的最长时间（秒），None表示一直等待
+        """
+        await self.stop_refresher()
+        if self._owns_session:
+            await self._session.aclose(timeout)
+
+    async def __aenter__(self) -> "AsyncTraderClient":
+        await self.init()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _start_backtest(
+        self,
+        acct: str,
+        token: str,
+        principal: float,
+        commission: float,
+        start: datetime.date,
+        end: datetime.date,
+    ):
+        url = self._cmd_url("start_backtest")
+        data = {
+            "name": acct,
+            "token": token,
+            "principal": principal,
+            "commission": commission,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+        }
+
+        await self._session.post_json(url, data)
+
+    def _order_time(self, parameters: dict, order_time: Optional[datetime.datetime]):
+        if self._is_backtest:
+            if order_time is None:
+                raise ValueError("order_time is required in backtest mode")
+
+            parameters["order_time"] = order_time.strftime("%Y-%m-%d %H:%M:%S")
+
+    def _invalidate(self):
+        self._generation += 1
+        self._is_dirty = True
+        self._positions_cache.clear()
+
+    async def _post_order(self, url: str, params: Optional[Dict] = None) -> Any:
+        """发送会改变账户状态的请求，请求前后都使账户快照失效"""
+        self._invalidate()
+        try:
+            return await self._session.post_json(
+                url, params=params, headers=self.headers
+            )
+        finally:
+            self._invalidate()
+
+    async def _fetch_snapshot(self) -> Dict:
+        generation = self._generation
+
+        url = self._cmd_url("info")
+        r = await self._session.get(url, headers=self.headers)
+
+        if generation == self._generation:
+            self._snapshot = r
+            self._snapshot_at = time.monotonic()
+            self._is_dirty = False
+
+        return r
+
+    async def _account_snapshot(self) -> Dict:
+        fresh = (
+            self._snapshot is not None
+            and not self._is_dirty
+            and (
+                self._snapshot_ttl is None
+                or time.monotonic() - self._snapshot_at < self._snapshot_ttl
+            )
+        )
+        if fresh:
+            return self._snapshot
+
+        return await self._fetch_snapshot()
+
+    def start_refresher(self, interval: Optional[float] = None):
+        """参考[start_refresher][traderclient.client.TraderClient.start_refresher]
+
+        刷新在当前事件循环的一个后台任务中进行。
+        """
+        if self._refresher is not None:
+            return
+
+        if interval is None:
+            if self._snapshot_ttl is None:
+                raise ValueError("interval is required when snapshot_ttl is None")
+            interval = self._snapshot_ttl / 2
+
+        async def refresh():
+            while True:
+                try:
+                    await self._fetch_snapshot()
+                except Exception as e:
+                    logger.warning("failed to refresh account snapshot: %s", e)
+
+                await asyncio.sleep(interval)
+
+        self._refresher = asyncio.create_task(refresh())
+
+    async def stop_refresher(self):
+        """停止后台刷新任务"""
+        if self._refresher is None:
+            return
+
+        self._refresher.cancel()
+        try:
+            await self._refresher
+        except asyncio.CancelledError:
+            pass
+        self._refresher = None
+
+    async def info(self) -> Dict:
+        """参考[info][traderclient.client.TraderClient.info]"""
+        return dict(await self._account_snapshot())
+
+    async def balance(self) -> Dict:
+        """参考[balance][traderclient.client.TraderClient.balance]"""
+        r = await self._account_snapshot()
+
+        return {
+            "available": r["available"],
+            "market_value": r["market_value"],
+            "assets": r["assets"],
+            "pnl": r["pnl"],
+            "ppnl": r["ppnl"],
+        }
+
+    @property
+    def account(self) -> str:
+        return self._account
+
+    async def available_money(self) -> float:
+        """参考[available_money][traderclient.client.TraderClient.available_money]
+
+        与同步版本不同，这是一个协程，而不是属性。
+        """
+        return (await self._account_snapshot()).get("available")
+
+    async def principal(self) -> float:
+        """参考[principal][traderclient.client.TraderClient.principal]
+
+        与同步版本不同，这是一个协程，而不是属性。
+        """
+        if self._is_backtest:
+            return self._principal
+
+        return (await self._account_snapshot()).get("principal")
+
+    async def positions(self, dt: Optional[datetime.date] = None) -> np.ndarray:
+        """参考[positions][traderclient.client.TraderClient.positions]"""
+        if self._is_backtest and dt is None:
+            raise ValueError("`dt` is required under backtest mode")
+
+        return (await self._position_index(dt)).positions.copy()
+
+    async def _position_index(self, dt: Optional[datetime.date]) -> _PositionIndex:
+        generation = self._generation
+        cached = self._positions_cache.get(dt)
+        if cached is not None:
+            cached_generation, fetched_at, index = cached
+            if cached_generation == generation and (
+                self._snapshot_ttl is None
+                or time.monotonic() - fetched_at < self._snapshot_ttl
+            ):
+                return index
+
+        url = self._cmd_url("positions")
+        r = await self._session.get(
+            url,
+            params={"date": dt.isoformat() if dt is not None else None},
+            headers=self.headers,
+        )
+        index = _PositionIndex(r)
+
+        if generation == self._generation:
+            self._positions_cache[dt] = (generation, time.monotonic(), index)
+
+        return index
+
+    async def available_shares(
+        self, security: str, dt: Optional[datetime.date] = None
+    ) -> float:
+        """参考[available_shares][traderclient.client.TraderClient.available_shares]"""
+        return (await self.available_shares_many([security], dt))[0].item()
+
+    async def available_shares_many(
+        self, securities: List[str], dt: Optional[datetime.date] = None
+    ) -> np.ndarray:
+        """参考[available_shares_many][traderclient.client.TraderClient.available_shares_many]"""
+        if self._is_backtest and dt is None:
+            raise ValueError("`dt` is required under backtest!")
+
+        return (await self._position_index(dt)).sellable(securities)
+
+    async def today_entrusts(self) -> List:
+        """参考[today_entrusts][traderclient.client.TraderClient.today_entrusts]"""
+        url = self._cmd_url("today_entrusts")
+
+        return await self._session.get(url, headers=self.headers)
+
+    async def cancel_entrust(self, cid: str) -> Dict:
+        """参考[cancel_entrust][traderclient.client.TraderClient.cancel_entrust]"""
+        url = self._cmd_url("cancel_entrust")
+
+        data = {"cid": cid}
+
+        return await self._post_order(url, data)
+
+    async def cancel_all_entrusts(self) -> List:
+        """参考[cancel_all_entrusts][traderclient.client.TraderClient.cancel_all_entrusts]"""
+        url = self._cmd_url("cancel_all_entrusts")
+
+        return await self._post_order(url)
+
+    async def buy_by_money(
+        self,
+        security: str,
+        money: float,
+        price: Optional[float] = None,
+        timeout: float = 0.5,
+        order_time: Optional[datetime.datetime] = None,
+        **kwargs,
+    ) -> Dict:
+        """参考[buy_by_money][traderclient.client.TraderClient.buy_by_money]"""
+        order_time = order_time or datetime.datetime.now()
+
+        if price is None:
+            price = await self._get_market_buy_price(security, order_time)
+            volume = int(money / price / 100) * 100
+
+            return await self.market_buy(
+                security, volume, timeout=timeout, order_time=order_time
+            )
+        else:
+            volume = int(money / price / 100) * 100
+            return await self.buy(security, price, volume, timeout, order_time)
+
+    async def buy(
+        self,
+        security: str,
+        price: float,
+        volume: int,
+        timeout: float = 0.5,
+        order_time: Optional[datetime.datetime] = None,
+        **kwargs,
+    ) -> Dict:
+        """参考[buy][traderclient.client.TraderClient.buy]"""
+        if volume != volume // 100 * 100:
+            volume = volume // 100 * 100
+            logger.warning("买入数量必须是100的倍数, 已取整到%d", volume)
+
+        url = self._cmd_url("buy")
+
+        parameters = {
+            "security": security,
+            "price": price,
+            "volume": volume,
+            "timeout": timeout,
+            **kwargs,
+        }
+        self._order_time(parameters, order_time)
+
+        r = await self._post_order(url, parameters)
+
+        return _normalize_result(r, self._fills_as_array)
+
+    async def market_buy(
+        self,
+        security: str,
+        volume: int,
+        order_type: OrderType = OrderType.MARKET,
+        limit_price: Optional[float] = None,
+        timeout: float = 0.5,
+        order_time: Optional[datetime.datetime] = None,
+        **kwargs,
+    ) -> Dict:
+        """参考[market_buy][traderclient.client.TraderClient.market_buy]"""
+        if volume != volume // 100 * 100:
+            volume = volume // 100 * 100
+            logger.warning("买入数量必须是100的倍数, 已取整到%d", volume)
+
+        url = self._cmd_url("market_buy")
+        parameters = {
+            "security": security,
+            "price": 0,
+            "volume": volume,
+            "order_type": order_type,
+            "timeout": timeout,
+            "limit_price": limit_price,
+            **kwargs,
+        }
+        self._order_time(parameters, order_time)
+
+        r = await self._post_order(url, parameters)
+
+        return _normalize_result(r, self._fills_as_array)
+
+    async def sell(
+        self,
+        security: str,
+        price: float,
+        volume: int,
+        timeout: float = 0.5,
+        order_time: Optional[datetime.datetime] = None,
+        **kwargs,
+    ) -> Union[List, Dict]:
+        """参考[sell][traderclient.client.TraderClient.sell]"""
+        url = self._cmd_url("sell")
+        parameters = {
+            "security": security,
+            "price": price,
+            "volume": volume,
+            "timeout": timeout,
+            **kwargs,
+        }
+        self._order_time(parameters, order_time)
+
+        r = await self._post_order(url, parameters)
+
+        return _normalize_result(r, self._fills_as_array)
+
+    async def market_sell(
+        self,
+        security: str,
+        volume: int,
+        order_type: OrderType = OrderType.MARKET,
+        limit_price: Optional[float] = None,
+        timeout: float = 0.5,
+        order_time: Optional[datetime.datetime] = None,
+        **kwargs,
+    ) -> Union[List, Dict]:
+        """参考[market_sell][traderclient.client.TraderClient.market_sell]"""
+        url = self._cmd_url("market_sell")
+        parameters = {
+            "security": security,
+            "price": 0,
+            "volume": volume,
+            "order_type": order_type,
+            "timeout": timeout,
+            "limit_price": limit_price,
+            **kwargs,
+        }
+        self._order_time(parameters, order_time)
+
+        r = await self._post_order(url, parameters)
+
+        return _normalize_result(r, self._fills_as_array)
+
+    # price lookups are already coroutines, share them with the sync client
+    prefetch_limits = TraderClient.prefetch_limits
+    _get_market_sell_price = TraderClient._get_market_sell_price
+    _get_market_buy_price = TraderClient._get_market_buy_price
+    _get_last_price = TraderClient._get_last_price
+    _weights_orders = TraderClient._weights_orders
+
+    async def buy_by_weights(
+        self,
+        securities: List[str],
+        weights: Union[List[float], np.ndarray],
+        total_money: float,
+        prices: Optional[Union[List[float], np.ndarray]] = None,
+        timeout: float = 0.5,
+        order_time: Optional[datetime.datetime] = None,
+        max_concurrency: int = 10,
+    ) -> List:
+        """参考[buy_by_weights][traderclient.client.TraderClient.buy_by_weights]"""
+        order_time = order_time or datetime.datetime.now()
+        orders, indices = await self._weights_orders(
+            securities, weights, total_money, prices, timeout, order_time
+        )
+
+        results = [None] * len(securities)
+        submitted = await self.submit_many(orders, max_concurrency)
+        for i, r in zip(indices, submitted):
+            results[i] = r
+
+        return results
+
+    _rebalance_prices = TraderClient._rebalance_prices
+    _rebalance_orders = TraderClient._rebalance_orders
+
+    async def rebalance(
+        self,
+        target_weights: Dict[str, float],
+        prices: Optional[Dict[str, float]] = None,
+        total_assets: Optional[float] = None,
+        timeout: float = 0.5,
+        order_time: Optional[datetime.datetime] = None,
+        max_concurrency: int = 10,
+    ) -> np.ndarray:
+        """参考[rebalance][traderclient.client.TraderClient.rebalance]"""
+        order_time = order_time or datetime.datetime.now()
+        dt = order_time.date() if self._is_backtest else None
+
+        index = await self._position_index(dt)
+        securities, weights = _rebalance_universe(index.positions, target_weights)
+        current = index.shares(securities)
+        sellable = index.sellable(securities)
+
+        reference, order_prices, sizing = await self._rebalance_prices(
+            securities, prices, order_time
+        )
+        if total_assets is None:
+            total_assets = (await self.info())["assets"]
+        target = np.floor(weights * total_assets / reference / 100) * 100
+
+        sells = self._rebalance_orders(
+            securities,
+            _sell_volumes(current, sellable, target),
+            OrderSide.SELL,
+            order_prices,
+            timeout,
+            order_time,
+        )
+        sold = await self.submit_many(sells, max_concurrency)
+
+        buys = self._rebalance_orders(
+            securities,
+            _buy_volumes(current, target, sizing, await self.available_money()),
+            OrderSide.BUY,
+            order_prices,
+            timeout,
+            order_time,
+        )
+        bought = await self.submit_many(buys, max_concurrency)
+
+        return _rebalance_report(
+            sells + buys,
+            sold + bought,
+            dict(zip(securities, current.tolist())),
+            dict(zip(securities, target.tolist())),
+        )
+
+    async def sell_percent(
+        self,
+        security: str,
+        price: float,
+        percent: float,
+        timeout: float = 0.5,
+        order_time: Optional[datetime.datetime] = None,
+        **kwargs,
+    ) -> Union[List, Dict]:
+        """参考[sell_percent][traderclient.client.TraderClient.sell_percent]"""
+        if percent <= 0 or percent > 1:
+            raise ValueError("percent should between [0, 1]")
+        if len(security) < 6:
+            raise ValueError(f"wrong security format {security}")
+
+        url = self._cmd_url("sell_percent")
+        parameters = {
+            "security": security,
+            "price": price,
+            "timeout": timeout,
+            "percent": percent,
+        }
+        self._order_time(parameters, order_time)
+
+        r = await self._post_order(url, parameters)
+
+        return _normalize_result(r, self._fills_as_array)
+
+    async def sell_all(self, percent: float, timeout: float = 0.5) -> List:
+        """参考[sell_all][traderclient.client.TraderClient.sell_all]"""
+        if percent <= 0 or percent > 1:
+            raise ValueError("percent should between [0, 1]")
+
+        url = self._cmd_url("sell_all")
+        parameters = {"percent": percent, "timeout": timeout}
+
+        return await self._post_order(url, parameters)
+
+    async def _dispatch_order(self, order: Dict) -> Union[List, Dict]:
+        side = OrderSide(order["side"])
+        security = order["security"]
+        volume = order["volume"]
+        price = order.get("price")
+        kwargs = {
+            "timeout": order.get("timeout", 0.5),
+            "order_time": order.get("order_time"),
+        }
+
+        if _is_market_price(price):
+            if side == OrderSide.BUY:
+                return await self.market_buy(security, volume, **kwargs)
+            return await self.market_sell(security, volume, **kwargs)
+
+        if side == OrderSide.BUY:
+            return await self.buy(security, price, volume, **kwargs)
+        return await self.sell(security, price, volume, **kwargs)
+
+    async def submit_many(
+        self, orders: Union[List[Dict], np.ndarray], max_concurrency: int = 10
+    ) -> List:
+        """参考[submit_many][traderclient.client.TraderClient.submit_many]"""
+        orders = _normalize_orders(orders)
+        if self._is_backtest:
+            max_concurrency = 1
+
+        return await self._run_many(self._dispatch_order, orders, max_concurrency)
+
+    async def submit_schedule(
+        self, orders: Union[List[Dict], np.ndarray], chunk_size: int = 1000
+    ) -> List:
+        """参考[submit_schedule][traderclient.client.TraderClient.submit_schedule]"""
+        if not self._is_backtest:
+            raise ValueError("submit_schedule is only available in backtest mode")
+
+        orders = _normalize_orders(orders)
+        last_trade = (await self._account_snapshot()).get("last_trade")
+        payload = _schedule_payload(orders, self._start, self._end, last_trade)
+
+        results: List = []
+        for i in range(0, len(orders), chunk_size):
+            try:
+                results.extend(await self._upload_schedule(payload[i : i + chunk_size]))
+            except Exception as e:
+                logger.warning("failed to upload schedule from order %s: %s", i, e)
+                results.extend([e] * (len(orders) - i))
+                break
+
+        return results
+
+    async def _upload_schedule(self, payload: List[Dict]) -> List:
+        if self._schedule_supported:
+            url = self._cmd_url("schedule")
+            try:
+                r = await self._post_order(url, {"orders": _schedule_wire(payload)})
+                return _schedule_results(r, len(payload), self._fills_as_array)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in (404, 405):
+                    raise
+
+                logger.info("schedule upload is not supported, submit one by one")
+                self._schedule_supported = False
+
+        return await self._run_many(self._dispatch_order, payload, 1)
+
+    async def cancel_many(self, cids: List[str], max_concurrency: int = 10) -> List:
+        """参考[cancel_many][traderclient.client.TraderClient.cancel_many]"""
+        return await self._run_many(self.cancel_entrust, cids, max_concurrency)
+
+    async def _run_many(self, func, args: List, max_concurrency: int) -> List:
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def run(arg):
+            async with semaphore:
+                return await func(arg)
+
+        return await asyncio.gather(*[run(arg) for arg in args], return_exceptions=True)
+
+    async def metrics(
+        self,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
+        baseline: Optional[str] = None,
+    ) -> Dict:
+        """参考[metrics][traderclient.client.TraderClient.metrics]"""
+        url = self._cmd_url("metrics")
+        params = {
+            "start": start.strftime("%Y-%m-%d") if start else None,
+            "end": end.strftime("%Y-%m-%d") if end else None,
+            "baseline": baseline,
+        }
+        return await self._session.get(url, headers=self.headers, params=params)
+
+    async def bills(self) -> Dict:
+        """参考[bills][traderclient.client.TraderClient.bills]"""
+        url = self._cmd_url("bills")
+        return await self._session.get(url, headers=self.headers)
+
+    async def sync_bills(self, path: str) -> BillsMirror:
+        """参考[sync_bills][traderclient.client.TraderClient.sync_bills]
+
+        文件读写在当前线程中进行，镜像很大时可能会短暂阻塞事件循环。
+        """
+        mirror = BillsMirror(path, self._account)
+        since = mirror.since
+        params = {"start": since.isoformat()} if since is not None else None
+
+        url = self._cmd_url("bills")
+        mirror.merge(await self._session.get(url, params=params, headers=self.headers))
+        return mirror
+
+    async def get_assets(
+        self,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
+    ) -> np.ndarray:
+        """参考[get_assets][traderclient.client.TraderClient.get_assets]"""
+        url = self._cmd_url("assets")
+        _start = start.strftime("%Y-%m-%d") if start else None
+        _end = end.strftime("%Y-%m-%d") if end else None
+        return await self._session.get(
+            url, headers=self.headers, params={"start": _start, "end": _end}
+        )
+
+    async def sync_assets(self, end: Optional[datetime.date] = None) -> AssetSeries:
+        """参考[sync_assets][traderclient.client.TraderClient.sync_assets]"""
+        records = await self.get_assets(self._asset_series.last_date, end)
+        self._asset_series.merge(records)
+        return self._asset_series
+
+    async def stop_backtest(self):
+        """参考[stop_backtest][traderclient.client.TraderClient.stop_backtest]"""
+        url = self._cmd_url("stop_backtest")
+        return await self._session.post_json(url, headers=self.headers)
+
+    @staticmethod
+    async def list_accounts(url_prefix: str, admin_token: str) -> List:
+        """参考[list_accounts][traderclient.client.TraderClient.list_accounts]"""
+        url_prefix = url_prefix.rstrip("/")
+        url = f"{url_prefix}/accounts"
+        headers = {"Authorization": admin_token}
+        async with AsyncSession() as session:
+            return await session.get(url, headers=headers)
+
+    @staticmethod
+    async def delete_account(url_prefix: str, account_name: str, token: str) -> int:
+        """参考[delete_account][traderclient.client.TraderClient.delete_account]"""
+        url_prefix = url_prefix.rstrip("/")
+        url = f"{url_prefix}/accounts"
+        headers = {"Authorization": token}
+        async with AsyncSession() as session:
+            return await session.delete(
+                url, headers=headers, params={"name": account_name}
+            )
@@ -0,0 +1,344 @@
+"""`bills`的本地镜像
+
+`bills`将交易、持仓、资产和交易对（tx）一次性返回，数据必须全部载入内存，并且每次分析都要重新下载。[BillsMirror][traderclient.bills.BillsMirror]将各部分分别保存为`.npy`文件，以内存映射方式打开，载入时间几乎为零:
+
+```python
+mirror = client.sync_bills("~/bills/my-account")
+trades = mirror.select("trades", start=datetime.date(2022, 3, 1), security="000001.XSHE")
+```
+
+各部分的记录按日期（时间）排序保存，按日期查询使用`searchsorted`；含有`security`字段的部分另外保存一个按证券代码排序的索引。
+
+为了能以内存映射方式打开，字符串字段以定长unicode保存，时间字段以`datetime64`保存。
+
+[sync_bills][traderclient.client.TraderClient.sync_bills]只请求镜像中最后一天及以后的记录（服务器不支持`start`参数时，多余的记录在本地丢弃）。最后一天的记录可能并不完整，因此它们将被新取得的记录替换。新记录直接追加到`.npy`文件末尾，只有字段类型变化（比如更长的字符串）时，才会重写整个文件。
+"""
+import datetime
+import io
+import json
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from traderclient.utils import parse_times
+
+SECTIONS = ("trades", "tx", "positions", "assets")
+
+# 按此顺序查找各部分的时间字段
+_TIME_KEYS = ("date", "time", "exit", "exit_time")
+
+
+def _columns(records: Any) -> Dict[str, Any]:
+    """将dict的列表（或者字典）、structured array转换为字段名到取值的字典"""
+    if isinstance(records, np.ndarray):
+        return {name: records[name] for name in records.dtype.names or ()}
+
+    if isinstance(records, dict):
+        records = list(records.values())
+
+    names = dict.fromkeys(key for record in records for key in record)
+    return {name: [record.get(name) for record in records] for name in names}
+
+
+def _fixed(name: str, values: Any) -> np.ndarray:
+    """将一列数据转换为可以内存映射的定长类型"""
+    arr = np.asarray(values)
+    if name in _TIME_KEYS or (
+        arr.dtype.kind == "O"
+        and any(isinstance(v, datetime.date) for v in arr.tolist())
+    ):
+        times = parse_times(arr.tolist())
+        return times.astype("datetime64[D]") if name == "date" else times
+
+    if arr.dtype.kind != "O":
+        return arr
+
+    items = arr.tolist()
+    if all(v is None or isinstance(v, (int, float)) for v in items):
+        return np.array([np.nan if v is None else v for v in items], dtype=float)
+
+    return np.array(["" if v is None else str(v) for v in items], dtype=str)
+
+
+def to_fixed(records: Any) -> np.ndarray:
+    """将`bills`中的一部分转换为字段均为定长类型的structured array"""
+    columns = {name: _fixed(name, values) for name, values in _columns(records).items()}
+    size = len(next(iter(columns.values()))) if columns else 0
+
+    data = np.empty(size, dtype=[(name, col.dtype) for name, col in columns.items()])
+    for name, col in columns.items():
+        data[name] = col
+
+    return data
+
+
+def _time_key(dtype: np.dtype) -> Optional[str]:
+    return next((key for key in _TIME_KEYS if key in (dtype.names or ())), None)
+
+
+def _days(data: np.ndarray, key: str) -> np.ndarray:
+    return data[key].astype("datetime64[D]")
+
+
+def _promote(old: np.dtype, new: np.dtype) -> np.dtype:
+    """合并两个structured dtype，同名字段取能同时容纳两者的类型"""
+    fields = {name: old[name] for name in old.names}
+    for name in new.names:
+        fields[name] = (
+            np.promote_types(fields[name], new[name]) if name in fields else new[name]
+        )
+    return np.dtype(list(fields.items()))
+
+
+def _cast(data: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """转换为`dtype`，缺失的字段以nan、NaT或者空字符串填充"""
+    if data.dtype == dtype:
+        return data
+
+    result = np.zeros(len(data), dtype=dtype)
+    for name in dtype.names:
+        if name in data.dtype.names:
+            result[name] = data[name]
+        elif dtype[name].kind == "f":
+            result[name] = np.nan
+        elif dtype[name].kind == "M":
+            result[name] = np.datetime64("NaT")
+    return result
+
+
+def _append(path: str, keep: int, rows: np.ndarray):
+    """保留文件中前`keep`条记录，并在其后追加`rows`。文件的dtype须与`rows`相同
+
+    Raises:
+        ValueError: 无法原地修改文件头
+    """
+    fmt = np.lib.format
+    with open(path, "r+b") as f:
+        version = fmt.read_magic(f)
+        if version == (1, 0):
+            read, write = fmt.read_array_header_1_0, fmt.write_array_header_1_0
+        elif version == (2, 0):
+            read, write = fmt.read_array_header_2_0, fmt.write_array_header_2_0
+        else:
+            raise ValueError(f"unsupported npy version {version}")
+
+        _, fortran, dtype = read(f)
+        offset = f.tell()
+
+        # numpy pads the header, so that the shape can grow in place
+        header = io.BytesIO()
+        write(
+            header,
+            {
+                "descr": fmt.dtype_to_descr(dtype),
+                "fortran_order": fortran,
+                "shape": (keep + len(rows),),
+            },
+        )
+        if header.tell() != offset:
+            raise ValueError("npy header does not fit")
+
+        f.truncate(offset + keep * dtype.itemsize)
+        f.seek(0, os.SEEK_END)
+        f.write(rows.tobytes())
+        f.seek(0)
+        f.write(header.getvalue())
+
+
+def _save(path: str, data: np.ndarray):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.lib.format.write_array(f, data, allow_pickle=False)
+    os.replace(tmp, path)
+
+
+def _load(path: str) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # an empty array can not be memory-mapped
+        return np.load(path)
+
+
+class BillsMirror:
+    """保存在`path`目录下的`bills`镜像
+
+    目录下的文件：
+
+    - meta.json: 账户名，镜像覆盖到的最后一天
+    - <section>.npy: 各部分的记录，按时间排序
+    - <section>.by_security.npy: 按证券代码排序的行号
+    """
+
+    def __init__(self, path: str, account: Optional[str] = None):
+        """
+        Args:
+            path: 镜像所在的目录，不存在时将被创建
+            account: 账户名。如果目录中已有其它账户的镜像，将抛出ValueError
+
+        Raises:
+            ValueError: 目录中保存的是其它账户的镜像
+        """
+        self.path = os.path.expanduser(path)
+        os.makedirs(self.path, exist_ok=True)
+
+        self._meta = {"account": account, "since": None}
+        meta = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta):
+            with open(meta, "r", encoding="utf-8") as f:
+                self._meta = json.load(f)
+
+        if account is not None and self._meta.get("account") not in (None, account):
+            raise ValueError(
+                f"{self.path} mirrors account {self._meta['account']}, not {account}"
+            )
+        self._meta["account"] = account or self._meta.get("account")
+
+        self._cache: Dict[str, np.ndarray] = {}
+        self._security_keys: Dict[str, tuple] = {}
+
+    @property
+    def since(self) -> Optional[datetime.date]:
+        """镜像中最后一天。下一次同步将从这一天开始"""
+        since = self._meta.get("since")
+        return datetime.date.fromisoformat(since) if since else None
+
+    def _file(self, section: str, suffix: str = "") -> str:
+        return os.path.join(self.path, f"{section}{suffix}.npy")
+
+    def __getitem__(self, section: str) -> np.ndarray:
+        """以内存映射方式打开`section`。镜像中没有这一部分时，返回空数组"""
+        if section not in self._cache:
+            path = self._file(section)
+            if not os.path.exists(path):
+                return np.empty(0, dtype=[("security", "U1")])
+            self._cache[section] = _load(path)
+        return self._cache[section]
+
+    def _security_rows(self, section: str, security: str) -> np.ndarray:
+        if section not in self._security_keys:
+            order = _load(self._file(section, ".by_security"))
+            keys = np.asarray(self[section]["security"])[order]
+            self._security_keys[section] = (order, keys)
+
+        order, keys = self._security_keys[section]
+        i = np.searchsorted(keys, security, side="left")
+        j = np.searchsorted(keys, security, side="right")
+        return np.sort(order[i:j])
+
+    def select(
+        self,
+        section: str,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
+        security: Optional[str] = None,
+    ) -> np.ndarray:
+        """按日期区间[start, end]及证券代码查询`section`中的记录
+
+        只按日期查询时，返回的是内存映射的视图；按证券代码查询时，返回的是副本。
+        """
+        data = self[section]
+        key = _time_key(data.dtype)
+
+        i, j = 0, len(data)
+        if key is not None and (start is not None or end is not None):
+            days = _days(data, key)
+            if start is not None:
+                i = np.searchsorted(days, np.datetime64(start, "D"))
+            if end is not None:
+                j = np.searchsorted(days, np.datetime64(end, "D"), side="right")
+
+        if security is None:
+            return data[i:j]
+
+        if "security" not in (data.dtype.names or ()):
+            return data[:0]
+
+        rows = self._security_rows(section, security)
+        return data[rows[(rows >= i) & (rows < j)]]
+
+    def merge(self, bills: Dict[str, Any]) -> Dict[str, int]:
+        """合并服务器返回的`bills`
+
+        镜像中最后一天（`since`）及以后的记录将被替换，早于这一天的新记录将被丢弃。没有时间字段的部分将被整体替换。
+
+        Returns:
+            各部分合并后新增的记录数
+        """
+        since = self.since
+        since = np.datetime64(since, "D") if since else None
+        last = since
+        added = {}
+
+        for section in SECTIONS:
+            if bills.get(section) is None:
+                continue
+
+            rows = to_fixed(bills[section])
+            if not rows.dtype.names:
+                continue
+
+            path = self._file(section)
+            key = _time_key(rows.dtype)
+
+            keep = 0
+            if key is not None:
+                rows = rows[np.argsort(rows[key], kind="stable")]
+                if since is not None:
+                    rows = rows[_days(rows, key) >= since]
+                    if os.path.exists(path):
+                        days = _days(_load(path), key)
+                        keep = np.searchsorted(days, since).item()
+
+            added[section] = self._write(section, keep, rows)
+
+            if key is not None and len(rows):
+                day = _days(rows, key)[-1]
+                if last is None or day > last:
+                    last = day
+
+        if last is not None:
+            self._meta["since"] = str(last)
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self._meta, f)
+
+        return added
+
+    def _write(self, section: str, keep: int, rows: np.ndarray) -> int:
+        """保留前`keep`条记录，追加`rows`，并重建证券代码索引。返回新增的记录数"""
+        path = self._file(section)
+        self._cache.pop(section, None)
+        self._security_keys.pop(section, None)
+
+        if not os.path.exists(path):
+            # column types of an empty section are unknown
+            if len(rows) == 0:
+                return 0
+            _save(path, rows)
+            data, total = rows, 0
+        else:
+            stored = _load(path)
+            total = len(stored)
+            if len(rows) == 0:
+                rows = np.empty(0, dtype=stored.dtype)
+            dtype = _promote(stored.dtype, rows.dtype)
+            if dtype == stored.dtype:
+                rows = _cast(rows, dtype)
+                del stored
+                try:
+                    _append(path, keep, rows)
+                except ValueError:
+                    _save(path, np.concatenate([_load(path)[:keep], rows]))
+            else:
+                _save(
+                    path,
+                    np.concatenate([_cast(stored[:keep], dtype), _cast(rows, dtype)]),
+                )
+            data = _load(path)
+
+        if "security" in (data.dtype.names or ()):
+            order = np.argsort(np.asarray(data["security"]), kind="stable")
+            _save(self._file(section, ".by_security"), order)
+
+        return len(data) - total
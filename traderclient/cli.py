@@ -0,0 +1,328 @@
+"""命令行工具
+
+目前提供`bench`命令，用以对交易服务器或者回测服务器进行压力测试：以N个账户、每个账户M个并发worker，按给定比例混合发送下单、撤单和查询请求，最后按端点报告吞吐量、错误率和延迟分布。
+
+```
+bt bench http://localhost:7080/backtest/api/trade/v0.4 --backtest \\
+    --accounts 8 --workers 4 --duration 30 \\
+    --mix buy=4,market_buy=1,sell=2,cancel=1,positions=1,info=1
+```
+
+在回测模式下，服务器要求同一账户的`order_time`严格递增，因此同一账户的下单请求将依次发出，只有查询请求是并发的。委托时间不会超过`--end`，一个账户的委托时间用完后，它的worker即停止，吞吐量按实际运行的时长计算。
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from traderclient.async_client import AsyncTraderClient
+from traderclient.transport import AsyncSession
+
+# 操作名到是否为下单（需要order_time）的映射
+OPERATIONS = {
+    "buy": True,
+    "market_buy": True,
+    "sell": True,
+    "market_sell": True,
+    "cancel": False,
+    "positions": False,
+    "info": False,
+    "entrusts": False,
+}
+
+DEFAULT_MIX = "buy=4,market_buy=1,sell=2,market_sell=1,positions=1,info=1"
+
+# 延迟直方图的桶边界（毫秒）
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """解析形如`buy=4,sell=2,info=1`的操作比例
+
+    Raises:
+        ValueError: 操作名不被支持，或者权重不是正数
+    """
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"unknown operation {name}, use one of {list(OPERATIONS)}")
+
+        weights[name] = float(weight or 1)
+        if weights[name] <= 0:
+            raise ValueError(f"weight of {name} must be positive")
+
+    return weights
+
+
+def order_times(
+    start: datetime.date, end: Optional[datetime.date] = None, step: int = 60
+) -> Iterator[datetime.datetime]:
+    """从`start`开始，以`step`秒为间隔，生成工作日交易时段内递增的委托时间
+
+    Args:
+        start: 第一天
+        end: 最后一天（含）。为None时不停止
+        step: 间隔秒数
+    """
+    day = start
+    while end is None or day <= end:
+        if day.weekday() < 5:
+            t = datetime.datetime.combine(day, datetime.time(9, 31))
+            close = datetime.datetime.combine(day, datetime.time(14, 56))
+            while t <= close:
+                yield t
+                t += datetime.timedelta(seconds=step)
+        day += datetime.timedelta(days=1)
+
+
+class Stats:
+    """按端点记录请求数、错误和延迟"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, op: str, elapsed: float, error: Optional[BaseException] = None):
+        self.latencies[op].append(elapsed)
+        if error is not None:
+            self.errors[op][type(error).__name__] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Dict]:
+        """各端点的统计结果，延迟以毫秒为单位"""
+        report = {}
+        for op, latencies in sorted(self.latencies.items()):
+            samples = np.array(latencies) * 1000
+            errors = sum(self.errors[op].values())
+            p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+            counts, _ = np.histogram(samples, bins=[0, *BUCKETS, np.inf])
+            report[op] = {
+                "count": len(samples),
+                "errors": errors,
+                "error_rate": errors / len(samples),
+                "error_types": dict(self.errors[op]),
+                "ops": len(samples) / elapsed,
+                "p50": float(p50),
+                "p90": float(p90),
+                "p99": float(p99),
+                "max": float(samples.max()),
+                "histogram": counts.tolist(),
+            }
+
+        return report
+
+
+class _Exhausted(Exception):
+    """回测账户的委托时间已经用完"""
+
+
+class Account:
+    """一个压测账户，及其委托时间"""
+
+    def __init__(self, client: AsyncTraderClient, args: argparse.Namespace):
+        self.client = client
+        self.args = args
+        self._times = order_times(args.start, args.end) if args.backtest else None
+        self.last_time: Optional[datetime.datetime] = None
+        self.exhausted = False
+        # the backtest server requires increasing order_time within an account
+        self._order_lock = asyncio.Lock() if args.backtest else None
+
+    async def _order(self, op: str):
+        args = self.args
+        kwargs = {}
+        if self._times is not None:
+            order_time = next(self._times, None)
+            if order_time is None:
+                self.exhausted = True
+                raise _Exhausted()
+            self.last_time = kwargs["order_time"] = order_time
+
+        if op == "buy":
+            return await self.client.buy(
+                args.security, args.price, args.volume, **kwargs
+            )
+        if op == "market_buy":
+            return await self.client.market_buy(args.security, args.volume, **kwargs)
+        if op == "sell":
+            return await self.client.sell(
+                args.security, args.price, args.volume, **kwargs
+            )
+        return await self.client.market_sell(args.security, args.volume, **kwargs)
+
+    async def call(self, op: str):
+        if OPERATIONS[op]:
+            if self._order_lock is None:
+                return await self._order(op)
+            async with self._order_lock:
+                return await self._order(op)
+
+        if op == "cancel":
+            return await self.client.cancel_all_entrusts()
+        if op == "positions":
+            dt = None
+            if self.args.backtest:
+                dt = self.last_time.date() if self.last_time else self.args.start
+            return await self.client.positions(dt)
+        if op == "info":
+            return await self.client.info()
+        return await self.client.today_entrusts()
+
+
+async def _worker(
+    account: Account, ops: List[str], weights: List[float], stats: Stats, stop: float
+):
+    while time.perf_counter() < stop and not account.exhausted:
+        op = random.choices(ops, weights)[0]
+        t0 = time.perf_counter()
+        try:
+            await account.call(op)
+        except _Exhausted:
+            return
+        except Exception as e:
+            stats.record(op, time.perf_counter() - t0, e)
+        else:
+            stats.record(op, time.perf_counter() - t0)
+
+
+async def bench(args: argparse.Namespace) -> Dict:
+    """运行压测，返回统计结果"""
+    weights = parse_mix(args.mix)
+    ops, probs = list(weights), list(weights.values())
+    stats = Stats()
+
+    workers = args.accounts * args.workers
+    async with AsyncSession(
+        max_connections=workers, max_keepalive_connections=workers
+    ) as session:
+        accounts = []
+        for i in range(args.accounts):
+            if args.backtest:
+                token = uuid.uuid4().hex
+                name = f"{args.prefix}-{token[-8:]}-{i}"
+            else:
+                token = args.token
+                name = f"{args.prefix}-{i}" if args.accounts > 1 else args.prefix
+
+            client = AsyncTraderClient(
+                args.url,
+                name,
+                token,
+                is_backtest=args.backtest,
+                session=session,
+                snapshot_ttl=0,
+                principal=args.principal,
+                start=args.start,
+                end=args.end,
+            )
+            await client.init()
+            accounts.append(Account(client, args))
+
+        t0 = time.perf_counter()
+        stop = t0 + args.duration
+        await asyncio.gather(
+            *[
+                _worker(account, ops, probs, stats, stop)
+                for account in accounts
+                for _ in range(args.workers)
+            ]
+        )
+        elapsed = time.perf_counter() - t0
+
+        if args.backtest:
+            await asyncio.gather(
+                *[a.client.stop_backtest() for a in accounts], return_exceptions=True
+            )
+
+    return {
+        "url": args.url,
+        "accounts": args.accounts,
+        "workers": args.workers,
+        "elapsed": elapsed,
+        "endpoints": stats.report(elapsed),
+    }
+
+
+def print_report(report: Dict):
+    endpoints = report["endpoints"]
+    total = sum(e["count"] for e in endpoints.values())
+    print(
+        f"{report['accounts']} accounts x {report['workers']} workers, "
+        f"{total} requests in {report['elapsed']:.1f}s, "
+        f"{total / report['elapsed']:,.0f} req/s"
+    )
+
+    print(
+        f"{'endpoint':12s} {'count':>8s} {'ops/s':>8s} {'err%':>6s} "
+        f"{'p50 ms':>8s} {'p90 ms':>8s} {'p99 ms':>8s} {'max ms':>8s}"
+    )
+    for op, e in endpoints.items():
+        print(
+            f"{op:12s} {e['count']:8d} {e['ops']:8,.0f} {e['error_rate']:6.1%} "
+            f"{e['p50']:8.2f} {e['p90']:8.2f} {e['p99']:8.2f} {e['max']:8.2f}"
+        )
+
+    labels = [f"<{b}" for b in BUCKETS] + [f">={BUCKETS[-1]}"]
+    for op, e in endpoints.items():
+        print(f"\n{op} latency (ms)")
+        width = max(e["histogram"])
+        for label, count in zip(labels, e["histogram"]):
+            if count:
+                bar = "#" * max(1, int(40 * count / width))
+                print(f"  {label:>6s} {count:8d} {bar}")
+        for name, count in e["error_types"].items():
+            print(f"  error {name}: {count}")
+
+
+def _date(value: str) -> datetime.date:
+    return datetime.date.fromisoformat(value)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="bt")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("bench", help="对交易服务器或回测服务器进行压力测试")
+    p.add_argument("url", help="服务器地址及路径")
+    p.add_argument("--accounts", type=int, default=1, help="账户数")
+    p.add_argument("--workers", type=int, default=4, help="每个账户的并发数")
+    p.add_argument("--duration", type=float, default=10, help="压测时长（秒）")
+    p.add_argument("--mix", default=DEFAULT_MIX, help="各操作的权重")
+    p.add_argument("--security", default="000001.XSHE")
+    p.add_argument("--price", type=float, default=10.0, help="限价委托的价格")
+    p.add_argument("--volume", type=int, default=100)
+    p.add_argument("--backtest", action="store_true", help="为每个账户创建回测账户")
+    p.add_argument("--start", type=_date, default=datetime.date(2022, 3, 1))
+    p.add_argument("--end", type=_date, default=datetime.date(2022, 3, 31))
+    p.add_argument("--principal", type=float, default=1_000_000)
+    p.add_argument("--token", default="", help="实盘模式下各账户共用的token")
+    p.add_argument(
+        "--prefix", default="bench", help="账户名前缀。实盘模式下，多个账户依次为<prefix>-0, <prefix>-1..."
+    )
+    p.add_argument("--json", help="将统计结果保存到此文件")
+
+    args = parser.parse_args(argv)
+
+    try:
+        report = asyncio.run(bench(args))
+    except ValueError as e:
+        parser.error(str(e))
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,378 @@
+import asyncio
+import contextvars
 import datetime
 import logging
-from typing import Dict, List, Optional, Union
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
-import arrow
+import httpx
 import numpy as np
-
-from traderclient.datatypes import OrderSide, OrderStatus, OrderType
-from traderclient.transport import delete, get, post_json
+from coretypes.errors.trade import TradeError
+
+from traderclient.assets import AssetSeries
+from traderclient.bills import BillsMirror
+from traderclient.datatypes import (
+    OrderSide,
+    OrderStatus,
+    OrderType,
+    rebalance_dtype,
+    trade_dtype,
+)
+from traderclient.limits import _price_limits
+from traderclient.local import LocalEngine, LocalSession
+from traderclient.transport import (
+    Coalescer,
+    Hedger,
+    Session,
+    SyncASGITransport,
+    delete,
+    get,
+    post_json,
+    split_unix_url,
+)
+from traderclient.utils import parse_times, to_datetimes
 
 logger = logging.getLogger(__name__)
 
 
+def _is_market_price(price: Optional[float]) -> bool:
+    """price为None、0或者nan时，视为市价委托"""
+    return price is None or price == 0 or math.isnan(price)
+
+
+def _normalize_orders(orders: Union[List[Dict], np.ndarray]) -> List[Dict]:
+    """将批量委托统一转换为dict的列表
+
+    如果`orders`是numpy structured array，其中的datetime64字段将转换为`datetime.datetime`，NaT转换为None。
+    """
+    if isinstance(orders, np.ndarray):
+        names = orders.dtype.names
+        return [dict(zip(names, row)) for row in orders.tolist()]
+
+    return list(orders)
+
+
+_TIME_KEYS = ("time", "created_at", "recv_at")
+
+
+def _normalize_result(r: Union[Dict, List], as_array: bool = False):
+    """将下单返回中的时间字段转换为`datetime.datetime`
+
+    回测时，卖出可能返回多笔成交记录。此时同一字段的所有记录一次性解析，解析耗时不随成交笔数增长。
+
+    Args:
+        r: 下单返回，单个委托（dict）或者成交记录的列表
+        as_array: 为True时，成交记录的列表将转换为dtype为`trade_dtype`的numpy structured array
+    """
+    if isinstance(r, dict):
+        keys = [key for key in _TIME_KEYS if r.get(key) is not None]
+        for key, value in zip(keys, to_datetimes([r[key] for key in keys])):
+            r[key] = value
+        return r
+
+    if not isinstance(r, list) or len(r) == 0 or not isinstance(r[0], dict):
+        return r
+
+    if as_array:
+        fills = np.empty(len(r), dtype=trade_dtype)
+        for name in trade_dtype.names:
+            if name != "time":
+                fills[name] = [rec.get(name) for rec in r]
+        fills["time"] = parse_times([rec.get("time") for rec in r])
+        return fills
+
+    for key in _TIME_KEYS:
+        if key in r[0]:
+            values = to_datetimes([rec.get(key) for rec in r])
+            for rec, value in zip(r, values):
+                rec[key] = value
+
+    return r
+
+
+def _head(indices: np.ndarray, n: int = 10) -> str:
+    """显示前`n`个序号，用于错误信息"""
+    more = ", ..." if len(indices) > n else ""
+    return ", ".join(str(i) for i in indices[:n].tolist()) + more
+
+
+def _schedule_payload(
+    orders: List[Dict],
+    start: datetime.date,
+    end: datetime.date,
+    since: Optional[Union[str, datetime.datetime]] = None,
+) -> List[Dict]:
+    """校验回测委托计划，并转换为统一格式
+
+    检查一次性完成（向量化），发现的所有问题将汇总在一个异常中。返回的委托中，`order_time`统一为`datetime.datetime`，`side`为整数，市价委托的`price`为None，既可以经`_schedule_wire`上传，也可以直接逐个提交。
+
+    Args:
+        orders: 委托列表，参见`submit_many`
+        start: 回测开始日期
+        end: 回测结束日期
+        since: 服务器上最后一笔交易的时间，委托不能早于此时间
+
+    Raises:
+        ValueError: 委托缺少时间、时间倒流、超出回测区间、方向或者数量非法
+    """
+    if len(orders) == 0:
+        return []
+
+    times = parse_times([o.get("order_time") for o in orders]).astype("datetime64[s]")
+    problems = []
+
+    missing = np.flatnonzero(np.isnat(times))
+    if missing.size:
+        problems.append(f"order_time is missing: {_head(missing)}")
+
+    rewind = np.flatnonzero(times[1:] < times[:-1]) + 1
+    if rewind.size:
+        problems.append(f"order_time goes backward at: {_head(rewind)}")
+
+    days = times.astype("datetime64[D]")
+    outside = np.flatnonzero(
+        (days < np.datetime64(start)) | (days > np.datetime64(end))
+    )
+    if outside.size:
+        problems.append(f"order_time is out of [{start}, {end}]: {_head(outside)}")
+
+    if since is not None:
+        since = parse_times([since]).astype("datetime64[s]")[0]
+        early = np.flatnonzero(times < since)
+        if early.size:
+            problems.append(
+                f"order_time is earlier than last trade {since}: {_head(early)}"
+            )
+
+    sides = np.array([o.get("side") for o in orders], dtype=object)
+    bad_side = np.flatnonzero(~np.isin(sides, [OrderSide.BUY, OrderSide.SELL]))
+    if bad_side.size:
+        problems.append(f"side is invalid: {_head(bad_side)}")
+
+    volumes = np.array([o.get("volume") or 0 for o in orders], dtype=float)
+    bad_volume = np.flatnonzero(~(volumes > 0))
+    if bad_volume.size:
+        problems.append(f"volume is invalid: {_head(bad_volume)}")
+
+    if problems:
+        raise ValueError("invalid schedule: " + "; ".join(problems))
+
+    return [
+        {
+            "security": order["security"],
+            "side": int(order["side"]),
+            "price": None if _is_market_price(order.get("price")) else order["price"],
+            "volume": order["volume"],
+            "timeout": order.get("timeout", 0.5),
+            "order_time": order_time,
+        }
+        for order, order_time in zip(orders, times.tolist())
+    ]
+
+
+def _schedule_wire(payload: List[Dict]) -> List[Dict]:
+    """将`_schedule_payload`的结果转换为上传格式，`order_time`为字符串"""
+    return [
+        {**order, "order_time": order["order_time"].strftime("%Y-%m-%d %H:%M:%S")}
+        for order in payload
+    ]
+
+
+def _schedule_results(r: List[Dict], size: int, as_array: bool = False) -> List:
+    """将`schedule`接口的返回转换为与委托一一对应的结果或者异常"""
+    if not isinstance(r, list) or len(r) != size:
+        raise TradeError(f"schedule returns {len(r)} results for {size} orders")
+
+    return [
+        TradeError.from_json(item["error"])
+        if item.get("error") is not None
+        else _normalize_result(item.get("data"), as_array)
+        for item in r
+    ]
+
+
+def _lot_volumes(budgets: np.ndarray, prices: np.ndarray, cash: float) -> np.ndarray:
+    """按手（100股）分配各证券的买入数量
+
+    先对每支证券向下取整到整手，再将取整剩余的资金按缺口从大到小，逐支补足一手；剩余资金不足以补足某一支时，跳过它，继续尝试后面的证券。
+
+    Args:
+        budgets: 各证券分配到的资金
+        prices: 各证券的委托价格
+        cash: 可用的总资金。补足时，总金额既不超过此数，也不超过`budgets`之和
+
+    Returns:
+        各证券的买入股数，均为100的整数倍
+    """
+    lot_costs = prices * 100
+    lots = np.floor(budgets / lot_costs)
+
+    residue = min(cash, np.sum(budgets)) - np.sum(lots * lot_costs)
+    shortfall = budgets - lots * lot_costs
+    candidates = np.flatnonzero(budgets > 0)
+    order = candidates[np.argsort(-shortfall[candidates], kind="stable")]
+    for i in order:
+        if lot_costs[i] <= residue + 1e-6:
+            lots[i] += 1
+            residue -= lot_costs[i]
+
+    return lots.astype(np.int64) * 100
+
+
+def _rebalance_universe(
+    positions: np.ndarray, target_weights: Dict[str, float]
+) -> Tuple[List[str], np.ndarray]:
+    """调仓涉及的证券及其目标权重。持仓中不在`target_weights`里的证券，目标权重为0"""
+    securities = list(target_weights)
+    if len(positions):
+        held = positions["security"][positions["shares"] > 0].tolist()
+        securities.extend(
+            sec for sec in dict.fromkeys(held) if sec not in target_weights
+        )
+
+    weights = np.array([target_weights.get(sec, 0) for sec in securities], dtype=float)
+    if np.any(~(weights >= 0)):
+        raise ValueError("weights must be non-negative")
+    if weights.sum() > 1 + 1e-6:
+        raise ValueError(f"sum of weights {weights.sum()} exceeds 1")
+
+    return securities, weights
+
+
+def _sell_volumes(
+    current: np.ndarray, sellable: np.ndarray, target: np.ndarray
+) -> np.ndarray:
+    """各证券的卖出数量：不超过可卖数量（T+1），清仓时可以卖出零股，否则按整手向下取整"""
+    volumes = np.minimum(np.maximum(current - target, 0), sellable)
+    return np.where(target > 0, np.floor(volumes / 100) * 100, volumes)
+
+
+def _buy_volumes(
+    current: np.ndarray, target: np.ndarray, prices: np.ndarray, cash: float
+) -> np.ndarray:
+    """各证券的买入数量，按整手向下取整。资金不足时，各证券按比例缩减"""
+    volumes = np.floor(np.maximum(target - current, 0) / 100) * 100
+    costs = volumes * prices
+    if costs.sum() <= cash:
+        return volumes
+
+    return _lot_volumes(costs * max(cash, 0) / costs.sum(), prices, max(cash, 0))
+
+
+def _filled(result: Any) -> float:
+    """从下单结果中取已成交量。回测中卖出可能返回多笔成交"""
+    if isinstance(result, dict):
+        return result.get("filled") or 0
+    if isinstance(result, np.ndarray):
+        return result["filled"].sum().item()
+    if isinstance(result, list):
+        return sum(r.get("filled") or 0 for r in result if isinstance(r, dict))
+    return 0
+
+
+def _rebalance_report(
+    orders: List[Dict],
+    results: List,
+    current: Dict[str, float],
+    target: Dict[str, float],
+) -> np.ndarray:
+    """汇总调仓委托及其结果，dtype为`rebalance_dtype`"""
+    report = np.zeros(len(orders), dtype=rebalance_dtype)
+    for i, (order, result) in enumerate(zip(orders, results)):
+        sec = order["security"]
+        error = result if isinstance(result, BaseException) else None
+        price = order["price"]
+        report[i] = (
+            sec,
+            order["side"],
+            np.nan if price is None else price,
+            order["volume"],
+            0 if error is not None else _filled(result),
+            current[sec],
+            target[sec],
+            error,
+        )
+
+    return report
+
+
+class _PositionIndex:
+    """持仓的证券代码索引
+
+    按证券代码排好序后，一次`searchsorted`即可查找多支证券的持仓，无须对每支证券扫描整个持仓数组。
+    """
+
+    def __init__(self, positions: np.ndarray):
+        self.positions = positions
+
+        if len(positions) == 0:
+            self._sorted = np.array([], dtype=object)
+            self._order = np.array([], dtype=np.intp)
+            self._duplicated = set()
+            return
+
+        securities = np.asarray(positions["security"], dtype=object)
+        self._order = np.argsort(securities, kind="stable")
+        self._sorted = securities[self._order]
+
+        same = self._sorted[1:] == self._sorted[:-1]
+        self._duplicated = set(self._sorted[1:][same].tolist())
+
+    def rows(self, securities: List[str]) -> np.ndarray:
+        """查找`securities`在持仓中的行号，不在持仓中的为-1
+
+        Raises:
+            ValueError: 如果某支证券在持仓中有多条记录
+        """
+        query = np.asarray(securities, dtype=object)
+        if len(self._sorted) == 0:
+            return np.full(len(query), -1, dtype=np.intp)
+
+        duplicated = self._duplicated.intersection(query.tolist())
+        if duplicated:
+            securities = self.positions["security"]
+            found = self.positions[np.isin(securities, list(duplicated))]
+            logger.warning("found more than one position entry in response: %s", found)
+            raise ValueError(f"found more than one position entry in response: {found}")
+
+        pos = np.searchsorted(self._sorted, query)
+        pos = np.minimum(pos, len(self._sorted) - 1)
+        matched = self._sorted[pos] == query
+
+        return np.where(matched, self._order[pos], -1)
+
+    def _field(self, securities: List[str], name: str) -> np.ndarray:
+        rows = self.rows(securities)
+        if len(self._sorted) == 0:
+            return np.zeros(len(rows))
+
+        values = self.positions[name]
+        return np.where(rows >= 0, values[rows], 0).astype(values.dtype)
+
+    def sellable(self, securities: List[str]) -> np.ndarray:
+        """`securities`中各证券的可售数量，不在持仓中的为0"""
+        return self._field(securities, "sellable")
+
+    def shares(self, securities: List[str]) -> np.ndarray:
+        """`securities`中各证券的持股数，不在持仓中的为0"""
+        return self._field(securities, "shares")
+
+
 class TraderClient:
     """大富翁实盘和回测的客户端。
 
     在使用客户端时，需要先构建客户端实例，再调用其他方法，并处理[coretypes.errors.trade.*][https://zillionare.github.io/core-types/latest/#22-trade-errors]的异常，可以通过异常对象的`error_code`和`error_msg`来获取错误信息。如果是回测模式，一般会在回测结束时调用`metrics`方法来查看策略评估结果。如果要进一步查看信息，可以调用`bills`方法来获取历史持仓、交易记录和每日资产数据。
 
+    客户端内部持有一个带连接池的[Session][traderclient.transport.Session]，各次请求之间复用keep-alive连接。使用完毕后，应该调用`close`，或者以上下文管理器的方式使用客户端:
+
+    ```python
+    with TraderClient(url, acct, token) as client:
+        client.buy(...)
+    ```
+
     !!! Warn
         此类实例既非线程安全，也非异步事件安全。即你不能在多个线程中，或者多个异步队列中使用它。
     """
@@ -31,7 +388,7 @@ class TraderClient:
             如果`url`指向了回测服务器，但`is_backtest`设置为False，且如果提供的账户acct,token在服务器端存在，则将重用该账户，该账户之前的一些数据仍将保留，这可能导致某些错误，特别是继续进行测试时，时间发生rewind的情况。一般情况下，这种情况只用于获取之前的测试数据。
 
         Args:
-            url : 服务器地址及路径，比如 http://localhost:port/trade/api/v1
+            url : 服务器地址及路径，比如 http://localhost:port/trade/api/v1。使用`local://`时，将在进程内运行本地回测引擎
             acct : 子账号
             token : 子账号对应的服务器访问令牌
             is_backtest : 是否为回测模式，默认为False。
@@ -41,7 +398,27 @@ class TraderClient:
             commission: float 手续费率，默认为1e-4
             start: datetime.date 回测开始日期，必选
             end: datetime.date 回测结束日期，必选
+            session: Session 共享的连接池会话。如果提供，客户端不负责关闭它
+            max_connections: int 连接池最大连接数，默认为100
+            max_keepalive_connections: int 连接池保持的最大空闲连接数，默认为20
+            keepalive_expiry: float 空闲连接的保持时间（秒），默认为5
+            http2: bool 是否启用HTTP/2，默认为False
+            compression: List[str] 允许服务器使用的响应压缩算法，默认为所有可用算法，空列表表示不压缩
+            compress_threshold: int 请求体超过此字节数时以gzip压缩，默认不压缩
+            hedge: bool|Hedger 是否对`info`、`positions`等查询进行对冲，以降低尾延迟。传入True时使用默认配置的[Hedger][traderclient.transport.Hedger]。下单等POST请求从不对冲
+            instrument: Instrument 请求统计数据的记录者，参见[Instrument][traderclient.instrument.Instrument]
+            coalesce: bool|Coalescer 是否合并并发的相同查询（比如多个线程同时调用`positions`），只发出一个请求并共享结果。传入True时使用新建的[Coalescer][traderclient.transport.Coalescer]
+            timeouts: Timeouts 各类端点的connect/read/write/pool超时，参见[Timeouts][traderclient.transport.Timeouts]。如果要限定某次调用的总耗时，可以使用[deadline][traderclient.transport.deadline]
+            fills_as_array: bool 卖出等操作返回多笔成交记录时，是否以dtype为`trade_dtype`的numpy structured array返回，默认为False，即返回dict的列表
+            snapshot_ttl: float 账户快照和持仓缓存的有效期（秒），默认为1。None表示只在下单、撤单后才失效
+            bars: Dict[str, np.ndarray] `url`为`local://`时，本地回测引擎使用的行情数据，参见[LocalEngine][traderclient.local.LocalEngine]
+            engine: LocalEngine `url`为`local://`时，使用已有的本地回测引擎，以便多个账户共享行情数据
+            uds: str Unix domain socket的路径，与服务器部署在同一台机器时可以省去TCP开销。也可以使用`http+unix://`形式的url，比如`http+unix://%2Frun%2Ftrader.sock/trade/api/v1`
+            transport: httpx.BaseTransport 自定义的httpx传输层
+            app: ASGI应用（比如Sanic应用）。如果提供，请求将在进程内直接交给该应用处理，不经过网络，参见[SyncASGITransport][traderclient.transport.SyncASGITransport]
+            price_limits: PriceLimitCache 市价买卖时使用的涨跌停价缓存，参见[PriceLimitCache][traderclient.limits.PriceLimitCache]。默认为所有客户端共享的缓存
         """
+        url, uds = split_unix_url(url)
         self._url = url.rstrip("/")
         self._token = token
         self._account = acct
@@ -49,6 +426,38 @@ class TraderClient:
         self.headers["Account"] = self._account
 
         self._is_backtest = is_backtest
+        self._fills_as_array = kwargs.get("fills_as_array", False)
+
+        session = kwargs.get("session")
+        self._owns_session = session is None
+        if session is None and url.startswith("local://"):
+            engine = kwargs.get("engine") or LocalEngine(kwargs.get("bars", {}))
+            session = LocalSession(engine)
+        elif session is None:
+            transport = kwargs.get("transport")
+            if transport is None and kwargs.get("app") is not None:
+                transport = SyncASGITransport(kwargs["app"])
+            hedger = kwargs.get("hedge")
+            if hedger is True:
+                hedger = Hedger()
+            coalescer = kwargs.get("coalesce")
+            if coalescer is True:
+                coalescer = Coalescer()
+            session = Session(
+                max_connections=kwargs.get("max_connections", 100),
+                max_keepalive_connections=kwargs.get("max_keepalive_connections", 20),
+                keepalive_expiry=kwargs.get("keepalive_expiry", 5.0),
+                http2=kwargs.get("http2", False),
+                compression=kwargs.get("compression"),
+                compress_threshold=kwargs.get("compress_threshold"),
+                hedger=hedger or None,
+                instrument=kwargs.get("instrument"),
+                coalescer=coalescer or None,
+                timeouts=kwargs.get("timeouts"),
+                uds=kwargs.get("uds", uds),
+                transport=transport,
+            )
+        self._session = session
 
         if is_backtest:
             self._principal = kwargs.get("principal", 1_000_000)
@@ -58,14 +467,50 @@ class TraderClient:
             if start is None or end is None:
                 raise ValueError("start and end must be specified in backtest mode")
 
+            self._start, self._end = start, end
             self._start_backtest(acct, token, self._principal, commission, start, end)
 
+        # account snapshot shared by info, balance, principal and available_money
         self._is_dirty = False
-        self._cash = None
+        self._snapshot: Optional[Dict] = None
+        self._snapshot_at = 0.0
+        self._snapshot_ttl = kwargs.get("snapshot_ttl", 1.0)
+        self._snapshot_lock = threading.Lock()
+        self._generation = 0
+        self._refresher: Optional[threading.Thread] = None
+        self._refresher_stop = threading.Event()
+
+        # positions by date, each entry: (generation, fetched_at, index)
+        self._positions_cache: Dict[Optional[datetime.date], tuple] = {}
+
+        # daily assets fetched so far, see sync_assets
+        self._asset_series = AssetSeries()
+
+        # whether the server accepts bulk schedule upload
+        self._schedule_supported = True
+
+        self._price_limits = kwargs.get("price_limits")
+        if self._price_limits is None:
+            self._price_limits = _price_limits
 
     def _cmd_url(self, cmd: str) -> str:
         return f"{self._url}/{cmd}"
 
+    def close(self):
+        """停止后台刷新，并关闭客户端持有的连接池
+
+        如果连接池是通过`session`参数传入的，则由调用者负责关闭。
+        """
+        self.stop_refresher()
+        if self._owns_session:
+            self._session.close()
+
+    def __enter__(self) -> "TraderClient":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     def _start_backtest(
         self,
         acct: str,
@@ -95,11 +540,108 @@ class TraderClient:
             "end": end.isoformat(),
         }
 
-        post_json(url, data)
+        self._session.post_json(url, data)
+
+    def _invalidate(self):
+        """账户可能发生了变化（比如下单、撤单），使账户快照失效"""
+        with self._snapshot_lock:
+            self._generation += 1
+            self._is_dirty = True
+            self._positions_cache.clear()
+
+    def _post_order(self, url: str, params: Optional[Dict] = None) -> Any:
+        """发送会改变账户状态的请求（下单、撤单等）
+
+        请求前后都使账户快照失效：请求进行中的读取可能取得变化之前的状态，请求返回后它们不能被继续使用。请求出错时同样如此，因为服务器可能已经执行了它。
+        """
+        self._invalidate()
+        try:
+            return self._session.post_json(url, params=params, headers=self.headers)
+        finally:
+            self._invalidate()
+
+    def _fetch_snapshot(self) -> Dict:
+        """从服务器获取账户快照
+
+        如果在请求过程中账户快照被置为失效，则取回的数据可能已经过时，此时不更新缓存。
+        """
+        generation = self._generation
+
+        url = self._cmd_url("info")
+        r = self._session.get(url, headers=self.headers)
+
+        with self._snapshot_lock:
+            if generation == self._generation:
+                self._snapshot = r
+                self._snapshot_at = time.monotonic()
+                self._is_dirty = False
+
+        return r
+
+    def _account_snapshot(self) -> Dict:
+        """取账户快照。如果缓存仍然有效，则直接使用缓存"""
+        with self._snapshot_lock:
+            snapshot = self._snapshot
+            fresh = (
+                snapshot is not None
+                and not self._is_dirty
+                and (
+                    self._snapshot_ttl is None
+                    or time.monotonic() - self._snapshot_at < self._snapshot_ttl
+                )
+            )
+
+        if fresh:
+            return snapshot
+
+        return self._fetch_snapshot()
+
+    def start_refresher(self, interval: Optional[float] = None):
+        """启动后台线程，定期刷新账户快照
+
+        这样在策略的每个tick开始时，账户快照已经是新的，`info`、`balance`等调用无须等待网络请求。
+
+        Args:
+            interval: 刷新间隔（秒），默认为`snapshot_ttl`的一半
+        """
+        if self._refresher is not None:
+            return
+
+        if interval is None:
+            if self._snapshot_ttl is None:
+                raise ValueError("interval is required when snapshot_ttl is None")
+            interval = self._snapshot_ttl / 2
+
+        self._refresher_stop.clear()
+
+        def refresh():
+            while not self._refresher_stop.is_set():
+                try:
+                    self._fetch_snapshot()
+                except Exception as e:
+                    logger.warning("failed to refresh account snapshot: %s", e)
+
+                self._refresher_stop.wait(interval)
+
+        self._refresher = threading.Thread(
+            target=refresh, name=f"snapshot-refresher-{self._account}", daemon=True
+        )
+        self._refresher.start()
+
+    def stop_refresher(self):
+        """停止后台刷新线程"""
+        if self._refresher is None:
+            return
+
+        self._refresher_stop.set()
+        self._refresher.join()
+        self._refresher = None
 
     def info(self) -> Dict:
         """账户的当前基本信息，比如账户名、资金、持仓和资产等
 
+        `info`、`balance`、`principal`和`available_money`共享同一个账户快照。快照在`snapshot_ttl`秒内有效，期间的调用不会访问服务器；任何下单、撤单操作都会使快照失效。
+
         !!! info
             在回测模式下，info总是返回`last_trade`对应的那天的信息，因为这就是回测时的当前日期。
 
@@ -118,10 +660,7 @@ class TraderClient:
             - positions: 当前持仓，dtype为[position_dtype](https://zillionare.github.io/backtesting/0.3.2/api/trade/#backtest.trade.datatypes.position_dtype)的numpy structured array
 
         """
-        url = self._cmd_url("info")
-        r = get(url, headers=self.headers)
-        self._is_dirty = False
-        return r
+        return dict(self._account_snapshot())
 
     def balance(self) -> Dict:
         """取该账号对应的账户余额信息
@@ -136,8 +675,7 @@ class TraderClient:
             - ppnl: 盈亏(百分比)，即pnl/principal
 
         """
-        url = self._cmd_url("info")
-        r = get(url, headers=self.headers)
+        r = self._account_snapshot()
 
         return {
             "available": r["available"],
@@ -158,11 +696,7 @@ class TraderClient:
         Returns:
             float: 账户可用资金
         """
-        if self._is_dirty or self._cash is None:
-            info = self.info()
-            self._cash = info.get("available")
-
-        return self._cash
+        return self._account_snapshot().get("available")
 
     @property
     def principal(self) -> float:
@@ -174,13 +708,13 @@ class TraderClient:
         if self._is_backtest:
             return self._principal
 
-        url = self._cmd_url("info")
-        r = get(url, headers=self.headers)
-        return r.get("principal")
+        return self._account_snapshot().get("principal")
 
     def positions(self, dt: Optional[datetime.date] = None) -> np.ndarray:
         """取该子账户当前持仓信息
 
+        持仓按日期缓存，有效期与账户快照相同（`snapshot_ttl`），任何下单、撤单操作都会使其失效。
+
         Warning:
             在回测模式下，持仓信息不包含alias字段
 
@@ -192,12 +726,35 @@ class TraderClient:
         if self._is_backtest and dt is None:
             raise ValueError("`dt` is required under backtest mode")
 
+        return self._position_index(dt).positions.copy()
+
+    def _position_index(self, dt: Optional[datetime.date]) -> _PositionIndex:
+        """取`dt`日持仓的索引。如果缓存仍然有效，则直接使用缓存"""
+        with self._snapshot_lock:
+            cached = self._positions_cache.get(dt)
+            generation = self._generation
+
+        if cached is not None:
+            cached_generation, fetched_at, index = cached
+            if cached_generation == generation and (
+                self._snapshot_ttl is None
+                or time.monotonic() - fetched_at < self._snapshot_ttl
+            ):
+                return index
+
         url = self._cmd_url("positions")
-        return get(
+        r = self._session.get(
             url,
             params={"date": dt.isoformat() if dt is not None else None},
             headers=self.headers,
         )
+        index = _PositionIndex(r)
+
+        with self._snapshot_lock:
+            if generation == self._generation:
+                self._positions_cache[dt] = (generation, time.monotonic(), index)
+
+        return index
 
     def available_shares(
         self, security: str, dt: Optional[datetime.date] = None
@@ -211,19 +768,26 @@ class TraderClient:
         Returns:
             float: 指定股票在`dt`日可卖数量，无可卖即为0
         """
+        return self.available_shares_many([security], dt)[0].item()
+
+    def available_shares_many(
+        self, securities: List[str], dt: Optional[datetime.date] = None
+    ) -> np.ndarray:
+        """返回多支股票在`dt`日的可售数量
+
+        只取一次持仓，并通过索引一次性完成查找，适合在调仓时对整个股票池调用。
+
+        Args:
+            securities: 股票代码列表
+            dt: 持仓查询日期。在实盘下可为None，表明取最新持仓。
+
+        Returns:
+            np.ndarray: 与`securities`一一对应的可卖数量，无可卖即为0
+        """
         if self._is_backtest and dt is None:
             raise ValueError("`dt` is required under backtest!")
 
-        positions = self.positions(dt)
-
-        found = positions[positions["security"] == security]
-        if found.size == 1:
-            return found["sellable"][0].item()
-        elif found.size == 0:
-            return 0
-        else:
-            logger.warning("found more than one position entry in response: %s", found)
-            raise ValueError(f"found more than one position entry in response: {found}")
+        return self._position_index(dt).sellable(securities)
 
     def today_entrusts(self) -> List:
         """查询账户当日所有委托，包括失败的委托
@@ -235,7 +799,7 @@ class TraderClient:
         """
         url = self._cmd_url("today_entrusts")
 
-        return get(url, headers=self.headers)
+        return self._session.get(url, headers=self.headers)
 
     def cancel_entrust(self, cid: str) -> Dict:
         """撤销委托
@@ -251,8 +815,7 @@ class TraderClient:
 
         data = {"cid": cid}
 
-        self._is_dirty = True
-        return post_json(url, params=data, headers=self.headers)
+        return self._post_order(url, data)
 
     def cancel_all_entrusts(self) -> List:
         """撤销当前所有未完成的委托，包括部分成交，不同交易系统实现不同
@@ -263,8 +826,7 @@ class TraderClient:
         """
         url = self._cmd_url("cancel_all_entrusts")
 
-        self._is_dirty = True
-        return post_json(url, headers=self.headers)
+        return self._post_order(url)
 
     async def buy_by_money(
         self,
@@ -293,6 +855,226 @@ class TraderClient:
             volume = int(money / price / 100) * 100
             return self.buy(security, price, volume, timeout, order_time)
 
+    async def _weights_orders(
+        self,
+        securities: List[str],
+        weights: Union[List[float], np.ndarray],
+        total_money: float,
+        prices: Optional[Union[List[float], np.ndarray]],
+        timeout: float,
+        order_time: datetime.datetime,
+    ) -> Tuple[List[Dict], np.ndarray]:
+        """计算`buy_by_weights`的委托，返回委托列表，及其在`securities`中的序号"""
+        weights = np.asarray(weights, dtype=float)
+        if len(weights) != len(securities):
+            raise ValueError("securities and weights must have the same length")
+        if np.any(~(weights >= 0)):
+            raise ValueError("weights must be non-negative")
+        if weights.sum() > 1 + 1e-6:
+            raise ValueError(f"sum of weights {weights.sum()} exceeds 1")
+
+        if prices is None:
+            prices = np.full(len(securities), np.nan)
+        else:
+            prices = np.array([np.nan if p is None else p for p in prices], dtype=float)
+            if len(prices) != len(securities):
+                raise ValueError("securities and prices must have the same length")
+
+        # market orders are sized by the high limit, so they never exceed the budget
+        sizing = prices.copy()
+        missing = np.flatnonzero(np.isnan(prices) | (prices == 0))
+        if missing.size:
+            names = [securities[i] for i in missing]
+            await self.prefetch_limits(names, order_time.date())
+            sizing[missing] = await asyncio.gather(
+                *[self._get_market_buy_price(sec, order_time) for sec in names]
+            )
+
+        if np.any(~(sizing > 0)):
+            raise ValueError("prices must be positive")
+
+        volumes = _lot_volumes(weights * total_money, sizing, total_money)
+        indices = np.flatnonzero(volumes > 0)
+        orders = [
+            {
+                "security": securities[i],
+                "side": OrderSide.BUY,
+                "price": None if _is_market_price(prices[i]) else prices[i].item(),
+                "volume": volumes[i].item(),
+                "timeout": timeout,
+                "order_time": order_time,
+            }
+            for i in indices
+        ]
+
+        return orders, indices
+
+    async def buy_by_weights(
+        self,
+        securities: List[str],
+        weights: Union[List[float], np.ndarray],
+        total_money: float,
+        prices: Optional[Union[List[float], np.ndarray]] = None,
+        timeout: float = 0.5,
+        order_time: Optional[datetime.datetime] = None,
+        max_concurrency: int = 10,
+    ) -> List:
+        """按权重将资金分配到一篮子股票并买入
+
+        各股票的买入数量一次性计算：先按`total_money * weight / price`向下取整到整手，再将取整剩余的资金按缺口从大到小逐支补足一手，总金额不超过`total_money * sum(weights)`。未提供价格的股票以市价买入，其涨停价一次性载入（参考[prefetch_limits][traderclient.client.TraderClient.prefetch_limits]），并以涨停价计算数量。委托通过[submit_many][traderclient.client.TraderClient.submit_many]在线程池中并发提交，不会阻塞调用者的事件循环。
+
+        Args:
+            securities: 股票代码列表
+            weights: 与`securities`一一对应的权重，非负且总和不超过1
+            total_money: 用于买入的总资金
+            prices: 与`securities`一一对应的委托价格。为None，或者其中某项为None、0或者nan时，以市价委托
+            timeout: 委托超时
+            order_time: 下单时间。在回测模式下使用。
+            max_concurrency: 最大并发数
+
+        Returns:
+            List: 与`securities`一一对应的结果，参考`submit_many`。买入数量不足一手的股票不下单，对应结果为None
+        """
+        order_time = order_time or datetime.datetime.now()
+        orders, indices = await self._weights_orders(
+            securities, weights, total_money, prices, timeout, order_time
+        )
+
+        results = [None] * len(securities)
+        submitted = await self._in_thread(self.submit_many, orders, max_concurrency)
+        for i, r in zip(indices, submitted):
+            results[i] = r
+
+        return results
+
+    async def _rebalance_prices(
+        self,
+        securities: List[str],
+        prices: Optional[Dict[str, float]],
+        order_time: datetime.datetime,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """调仓使用的价格
+
+        Returns:
+            (估值价, 委托价, 买入时用于计算资金占用的价格)。未提供价格的证券以市价委托，委托价为nan，估值价为前收盘价（涨跌停价的中值），资金占用按涨停价计算
+        """
+        prices = prices or {}
+        given = np.array([prices.get(sec) or np.nan for sec in securities], dtype=float)
+        reference, sizing = given.copy(), given.copy()
+
+        missing = np.flatnonzero(np.isnan(given))
+        if missing.size:
+            names = [securities[i] for i in missing]
+            date = order_time.date()
+            await self.prefetch_limits(names, date)
+            limits = await asyncio.gather(
+                *[self._price_limits.get(sec, date) for sec in names]
+            )
+            for i, sec, lim in zip(missing, names, limits):
+                if lim is None:
+                    reference[i] = sizing[i] = await self._get_last_price(
+                        sec, order_time
+                    )
+                else:
+                    reference[i] = (lim[0] + lim[1]) / 2
+                    sizing[i] = lim[0]
+
+        return reference, given, sizing
+
+    def _rebalance_orders(
+        self,
+        securities: List[str],
+        volumes: np.ndarray,
+        side: OrderSide,
+        prices: np.ndarray,
+        timeout: float,
+        order_time: datetime.datetime,
+    ) -> List[Dict]:
+        return [
+            {
+                "security": securities[i],
+                "side": side,
+                "price": None if np.isnan(prices[i]) else prices[i].item(),
+                "volume": volumes[i].item(),
+                "timeout": timeout,
+                "order_time": order_time,
+            }
+            for i in np.flatnonzero(volumes > 0)
+        ]
+
+    async def rebalance(
+        self,
+        target_weights: Dict[str, float],
+        prices: Optional[Dict[str, float]] = None,
+        total_assets: Optional[float] = None,
+        timeout: float = 0.5,
+        order_time: Optional[datetime.datetime] = None,
+        max_concurrency: int = 10,
+    ) -> np.ndarray:
+        """将持仓调整到目标权重
+
+        只取一次持仓，目标持股数、卖出数量和买入数量都以向量方式一次算出：
+
+        - 持仓中不在`target_weights`里的证券将被清仓
+        - 卖出数量不超过可卖数量（T+1），除清仓外按整手取整；买入数量按整手向下取整
+        - 目标与现有持仓相差不足一手的证券不下单
+
+        先并发提交所有卖单，再以卖出后的可用资金并发提交买单。资金不足时，各买单按比例缩减。持仓、资产查询及委托都在线程池中执行，不会阻塞调用者的事件循环。
+
+        Args:
+            target_weights: 证券到目标权重的字典，权重为占总资产的比例，非负且总和不超过1
+            prices: 证券到委托价格的字典。未提供价格的证券以市价委托，并以前收盘价估值
+            total_assets: 用于计算目标市值的总资产，默认为账户当前的总资产
+            timeout: 委托超时
+            order_time: 下单时间。在回测模式下使用，同时也是回测中取持仓的日期
+            max_concurrency: 最大并发数
+
+        Returns:
+            np.ndarray: dtype为[rebalance_dtype][traderclient.datatypes.rebalance_dtype]的调仓报告，每个委托一行，卖单在前
+        """
+        order_time = order_time or datetime.datetime.now()
+        dt = order_time.date() if self._is_backtest else None
+
+        index = await self._in_thread(self._position_index, dt)
+        securities, weights = _rebalance_universe(index.positions, target_weights)
+        current = index.shares(securities)
+        sellable = index.sellable(securities)
+
+        reference, order_prices, sizing = await self._rebalance_prices(
+            securities, prices, order_time
+        )
+        if total_assets is None:
+            total_assets = (await self._in_thread(self.info))["assets"]
+        target = np.floor(weights * total_assets / reference / 100) * 100
+
+        sells = self._rebalance_orders(
+            securities,
+            _sell_volumes(current, sellable, target),
+            OrderSide.SELL,
+            order_prices,
+            timeout,
+            order_time,
+        )
+        sold = await self._in_thread(self.submit_many, sells, max_concurrency)
+
+        cash = await self._in_thread(lambda: self.available_money)
+        buys = self._rebalance_orders(
+            securities,
+            _buy_volumes(current, target, sizing, cash),
+            OrderSide.BUY,
+            order_prices,
+            timeout,
+            order_time,
+        )
+        bought = await self._in_thread(self.submit_many, buys, max_concurrency)
+
+        return _rebalance_report(
+            sells + buys,
+            sold + bought,
+            dict(zip(securities, current.tolist())),
+            dict(zip(securities, target.tolist())),
+        )
+
     def buy(
         self,
         security: str,
@@ -373,14 +1155,9 @@ class TraderClient:
             _order_time = order_time.strftime("%Y-%m-%d %H:%M:%S")
             parameters["order_time"] = _order_time
 
-        self._is_dirty = True
-        r = post_json(url, params=parameters, headers=self.headers)
+        r = self._post_order(url, parameters)
 
-        for key in ("time", "created_at", "recv_at"):
-            if key in r:
-                r[key] = arrow.get(r[key]).naive
-
-        return r
+        return _normalize_result(r, self._fills_as_array)
 
     def market_buy(
         self,
@@ -434,15 +1211,9 @@ class TraderClient:
             _order_time = order_time.strftime("%Y-%m-%d %H:%M:%S")
             parameters["order_time"] = _order_time
 
-        self._is_dirty = True
-
-        r = post_json(url, params=parameters, headers=self.headers)
-
-        for key in ("time", "created_at", "recv_at"):
-            if key in r:
-                r[key] = arrow.get(r[key]).naive
+        r = self._post_order(url, parameters)
 
-        return r
+        return _normalize_result(r, self._fills_as_array)
 
     def sell(
         self,
@@ -485,17 +1256,9 @@ class TraderClient:
             _order_time = order_time.strftime("%Y-%m-%d %H:%M:%S")
             parameters["order_time"] = _order_time
 
-        self._is_dirty = True
-        r = post_json(url, params=parameters, headers=self.headers)
-        for key in ("created_at", "recv_at"):
-            if key in r:
-                r[key] = arrow.get(r[key]).naive
-
-        if self._is_backtest:
-            for rec in r:
-                rec["time"] = arrow.get(rec["time"]).naive
+        r = self._post_order(url, parameters)
 
-        return r
+        return _normalize_result(r, self._fills_as_array)
 
     def market_sell(
         self,
@@ -544,14 +1307,27 @@ class TraderClient:
             _order_time = order_time.strftime("%Y-%m-%d %H:%M:%S")
             parameters["order_time"] = _order_time
 
-        self._is_dirty = True
+        r = self._post_order(url, parameters)
 
-        r = post_json(url, params=parameters, headers=self.headers)
-        for key in ("time", "created_at", "recv_at"):
-            if key in r:
-                r[key] = arrow.get(r[key]).naive
+        return _normalize_result(r, self._fills_as_array)
 
-        return r
+    async def prefetch_limits(
+        self, securities: List[str], date: Optional[datetime.date] = None
+    ) -> int:
+        """一次载入一篮子股票在`date`日的涨跌停价
+
+        在对一篮子股票调用`buy_by_money`等需要涨跌停价的方法之前调用，可以将逐个查询合并为一次。
+
+        Args:
+            securities: 证券列表
+            date: 日期，默认为今天
+
+        Returns:
+            新载入的证券数
+        """
+        return await self._price_limits.prefetch(
+            securities, date or datetime.date.today()
+        )
 
     async def _get_market_sell_price(
         self, sec: str, order_time: Optional[datetime.datetime] = None
@@ -560,20 +1336,12 @@ class TraderClient:
 
         如果无法取得跌停价，则以当前价卖出。
         """
-        from coretypes import FrameType
-        from omicron.models.stock import Stock
-
         order_time = order_time or datetime.datetime.now()
-        frame = order_time.date()
-        limit_prices = await Stock.get_trade_price_limits(sec, frame, frame)
-        if len(limit_prices) >= 0:
-            price = limit_prices["low_limit"][0]
-        else:
-            price = (await Stock.get_bars(sec, 1, FrameType.MIN1, end=order_time))[
-                "close"
-            ][0]
+        limits = await self._price_limits.get(sec, order_time.date())
+        if limits is not None:
+            return limits[1]
 
-        return price.item()
+        return await self._get_last_price(sec, order_time)
 
     async def _get_market_buy_price(
         self, sec: str, order_time: Optional[datetime.datetime] = None
@@ -582,20 +1350,19 @@ class TraderClient:
 
         如果无法取得涨停价，则以当前价买入。
         """
+        order_time = order_time or datetime.datetime.now()
+        limits = await self._price_limits.get(sec, order_time.date())
+        if limits is not None:
+            return limits[0]
+
+        return await self._get_last_price(sec, order_time)
+
+    async def _get_last_price(self, sec: str, order_time: datetime.datetime) -> float:
         from coretypes import FrameType
         from omicron.models.stock import Stock
 
-        order_time = order_time or datetime.datetime.now()
-        frame = order_time.date()
-        limit_prices = await Stock.get_trade_price_limits(sec, frame, frame)
-        if len(limit_prices) >= 0:
-            price = limit_prices["high_limit"][0]
-        else:
-            price = (await Stock.get_bars(sec, 1, FrameType.MIN1, end=order_time))[
-                "close"
-            ][0]
-
-        return price.item()
+        bars = await Stock.get_bars(sec, 1, FrameType.MIN1, end=order_time)
+        return bars["close"][0].item()
 
     def sell_percent(
         self,
@@ -641,13 +1408,9 @@ class TraderClient:
             _order_time = order_time.strftime("%Y-%m-%d %H:%M:%S")
             parameters["order_time"] = _order_time
 
-        self._is_dirty = True
-        r = post_json(url, params=parameters, headers=self.headers)
-        for key in ("time", "created_at", "recv_at"):
-            if key in r:
-                r[key] = arrow.get(r[key]).naive
+        r = self._post_order(url, parameters)
 
-        return r
+        return _normalize_result(r, self._fills_as_array)
 
     def sell_all(self, percent: float, timeout: float = 0.5) -> List:
         """将所有持仓按percent比例进行减仓，用于特殊情况下的快速减仓（基于可买股票数）
@@ -667,9 +1430,150 @@ class TraderClient:
         url = self._cmd_url("sell_all")
         parameters = {"percent": percent, "timeout": timeout}
 
-        self._is_dirty = True
+        return self._post_order(url, parameters)
+
+    def _dispatch_order(self, order: Dict) -> Union[List, Dict]:
+        """根据委托的方向和价格，调用对应的下单方法"""
+        side = OrderSide(order["side"])
+        security = order["security"]
+        volume = order["volume"]
+        price = order.get("price")
+        kwargs = {
+            "timeout": order.get("timeout", 0.5),
+            "order_time": order.get("order_time"),
+        }
+
+        if _is_market_price(price):
+            if side == OrderSide.BUY:
+                return self.market_buy(security, volume, **kwargs)
+            return self.market_sell(security, volume, **kwargs)
+
+        if side == OrderSide.BUY:
+            return self.buy(security, price, volume, **kwargs)
+        return self.sell(security, price, volume, **kwargs)
+
+    async def _in_thread(self, func: Callable, *args) -> Any:
+        """在线程池中调用同步方法，以免阻塞调用者的事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, contextvars.copy_context().run, func, *args
+        )
+
+    def submit_many(
+        self, orders: Union[List[Dict], np.ndarray], max_concurrency: int = 10
+    ) -> List:
+        """批量下单
+
+        各委托将以并发方式提交，同时进行中的请求数不超过`max_concurrency`，因此整个批次的耗时取决于最慢的那个委托，而不是所有委托耗时之和。
+
+        !!! Warn
+            回测服务器要求`order_time`严格递增，因此在回测模式下，委托将按输入顺序逐个提交，此时`max_concurrency`不起作用。
+
+        Args:
+            orders: 委托列表。可以是dict的列表，也可以是dtype为[order_dtype][traderclient.datatypes.order_dtype]的numpy structured array。每个委托包含以下字段：
+
+                - security: 证券代码
+                - side: 委托方向，[OrderSide][traderclient.datatypes.OrderSide]
+                - price: 委托价格。为None、0或者nan时，以市价委托
+                - volume: 委托数量
+                - order_time: 下单时间，回测模式下必须提供
+                - timeout: 可选，默认为0.5秒
+            max_concurrency: 最大并发数
+
+        Returns:
+            List: 与`orders`一一对应的结果。如果委托成功，则为对应下单方法的返回值，否则为抛出的异常对象。
+        """
+        orders = _normalize_orders(orders)
+        if self._is_backtest:
+            max_concurrency = 1
+
+        return self._run_many(self._dispatch_order, orders, max_concurrency)
+
+    def submit_schedule(
+        self, orders: Union[List[Dict], np.ndarray], chunk_size: int = 1000
+    ) -> List:
+        """回测时，批量上传按时间排好序的委托计划
+
+        逐个调用`buy`、`sell`时，每个委托都是一次HTTP往返，一个数万笔委托的回测需要同样多次的往返。`submit_schedule`将委托按`chunk_size`分块，每块只需一次请求。
+
+        上传前，将在客户端一次性检查所有委托：`order_time`必须存在、不得倒流、不得早于服务器上最后一笔交易，且必须在回测区间内；方向和数量必须合法。发现问题时抛出`ValueError`，不会上传任何委托。
+
+        委托分块以`{"orders": [...]}`的形式POST到服务器的`schedule`接口，服务器按顺序撮合，并返回与之一一对应的列表，每项为`{"data": 成交}`或者`{"error": 异常}`。如果服务器不支持此接口（返回404或者405），将回退到在连接池上逐个提交。
+
+        Args:
+            orders: 委托列表，格式同`submit_many`，必须按`order_time`排序
+            chunk_size: 每次上传的委托数
+
+        Returns:
+            List: 与`orders`一一对应的结果。如果委托成功，则为成交记录，否则为异常对象。如果某一块整体失败（比如网络错误），该块及其后所有委托的结果均为该异常，之后的块不再上传。
+        """
+        if not self._is_backtest:
+            raise ValueError("submit_schedule is only available in backtest mode")
+
+        orders = _normalize_orders(orders)
+        last_trade = self._account_snapshot().get("last_trade")
+        payload = _schedule_payload(orders, self._start, self._end, last_trade)
+
+        results: List = []
+        for i in range(0, len(orders), chunk_size):
+            try:
+                results.extend(self._upload_schedule(payload[i : i + chunk_size]))
+            except Exception as e:
+                logger.warning("failed to upload schedule from order %s: %s", i, e)
+                results.extend([e] * (len(orders) - i))
+                break
+
+        return results
+
+    def _upload_schedule(self, payload: List[Dict]) -> List:
+        """上传一块委托计划，服务器不支持时回退到逐个提交"""
+        if self._schedule_supported:
+            url = self._cmd_url("schedule")
+            try:
+                r = self._post_order(url, {"orders": _schedule_wire(payload)})
+                return _schedule_results(r, len(payload), self._fills_as_array)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in (404, 405):
+                    raise
+
+                logger.info("schedule upload is not supported, submit one by one")
+                self._schedule_supported = False
+
+        return self._run_many(self._dispatch_order, payload, 1)
+
+    def cancel_many(self, cids: List[str], max_concurrency: int = 10) -> List:
+        """批量撤销委托
+
+        此API在回测模式下不可用。
+
+        Args:
+            cids: 交易服务器返回的委托合同号列表
+            max_concurrency: 最大并发数
 
-        return post_json(url, params=parameters, headers=self.headers)
+        Returns:
+            List: 与`cids`一一对应的结果。如果撤单成功，则为`cancel_entrust`的返回值，否则为抛出的异常对象。
+        """
+        return self._run_many(self.cancel_entrust, cids, max_concurrency)
+
+    def _run_many(self, func, args: List, max_concurrency: int) -> List:
+        """以最多`max_concurrency`个线程并发执行`func`，按输入顺序返回结果或者异常"""
+        if len(args) == 0:
+            return []
+
+        workers = max(1, min(max_concurrency, len(args)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # each task runs in a copy of the caller's context, so deadline applies
+            futures = [
+                executor.submit(contextvars.copy_context().run, func, arg)
+                for arg in args
+            ]
+
+        results = []
+        for future in futures:
+            e = future.exception()
+            results.append(future.result() if e is None else e)
+
+        return results
 
     def metrics(
         self,
@@ -717,7 +1621,7 @@ class TraderClient:
             "end": end.strftime("%Y-%m-%d") if end else None,
             "baseline": baseline,
         }
-        return get(url, headers=self.headers, params=params)
+        return self._session.get(url, headers=self.headers, params=params)
 
     def bills(self) -> Dict:
         """获取账户的交易、持仓、市值流水信息。
@@ -731,7 +1635,26 @@ class TraderClient:
             - tx
         """
         url = self._cmd_url("bills")
-        return get(url, headers=self.headers)
+        return self._session.get(url, headers=self.headers)
+
+    def sync_bills(self, path: str) -> BillsMirror:
+        """增量同步`bills`到本地镜像
+
+        各部分保存为以内存映射方式打开的`.npy`文件，并按日期和证券代码建立索引，参见[BillsMirror][traderclient.bills.BillsMirror]。再次同步时，只请求镜像中最后一天及以后的记录。
+
+        Args:
+            path: 镜像所在的目录，一个目录只能保存一个账户的镜像
+
+        Returns:
+            [BillsMirror][traderclient.bills.BillsMirror]: 同步后的镜像
+        """
+        mirror = BillsMirror(path, self._account)
+        since = mirror.since
+        params = {"start": since.isoformat()} if since is not None else None
+
+        url = self._cmd_url("bills")
+        mirror.merge(self._session.get(url, params=params, headers=self.headers))
+        return mirror
 
     def get_assets(
         self,
@@ -752,7 +1675,29 @@ class TraderClient:
         url = self._cmd_url("assets")
         _start = start.strftime("%Y-%m-%d") if start else None
         _end = end.strftime("%Y-%m-%d") if end else None
-        return get(url, headers=self.headers, params={"start": _start, "end": _end})
+        return self._session.get(
+            url, headers=self.headers, params={"start": _start, "end": _end}
+        )
+
+    def sync_assets(self, end: Optional[datetime.date] = None) -> AssetSeries:
+        """增量同步账户的资产记录到本地缓存
+
+        只请求缓存中最后一天至`end`的记录，追加到缓存中。缓存中最后一天的记录可能是盘中估算值，将被新取得的记录替换。同步后，可以通过返回值的`window`方法取得任意区间的数据，不再访问服务器:
+
+        ```python
+        series = client.sync_assets()
+        series.window(start, end)
+        ```
+
+        Args:
+            end: 结束日期，默认为服务器上的最新记录
+
+        Returns:
+            [AssetSeries][traderclient.assets.AssetSeries]: 本账户的资产记录缓存
+        """
+        records = self.get_assets(self._asset_series.last_date, end)
+        self._asset_series.merge(records)
+        return self._asset_series
 
     def stop_backtest(self):
         """停止回测。
@@ -763,7 +1708,7 @@ class TraderClient:
 
         """
         url = self._cmd_url("stop_backtest")
-        return post_json(url, headers=self.headers)
+        return self._session.post_json(url, headers=self.headers)
 
     @staticmethod
     def list_accounts(url_prefix: str, admin_token: str) -> List:
@@ -3,6 +3,8 @@
 # @Time     : 2022-03-09 15:08
 from enum import IntEnum
 
+import numpy as np
+
 
 class OrderSide(IntEnum):
     BUY = 1  # 股票买入
@@ -20,3 +22,47 @@ class OrderStatus(IntEnum):
     PARTIAL_TRANSACTION = 2  # #部分成交
     ALL_TRANSACTIONS = 3  # 全部成交
     CANCEL_ALL_ORDERS = 4  # 全部撤单
+
+
+# 批量下单时使用的委托结构，参见`TraderClient.submit_many`
+# price为0或者nan时，以市价委托；order_time仅在回测时使用
+order_dtype = np.dtype(
+    [
+        ("security", "O"),
+        ("side", "i4"),
+        ("price", "f8"),
+        ("volume", "i8"),
+        ("order_time", "datetime64[s]"),
+    ]
+)
+
+
+# 回测中成交记录的结构，参见`TraderClient`的`fills_as_array`参数
+trade_dtype = np.dtype(
+    [
+        ("tid", "O"),
+        ("eid", "O"),
+        ("security", "O"),
+        ("order_side", "i4"),
+        ("price", "f8"),
+        ("filled", "f8"),
+        ("time", "datetime64[us]"),
+        ("trade_fees", "f8"),
+    ]
+)
+
+
+# 调仓报告的结构，参见`TraderClient.rebalance`
+# current、target为调仓前后（目标）的持股数；委托失败时，error为对应的异常
+rebalance_dtype = np.dtype(
+    [
+        ("security", "O"),
+        ("side", "i4"),
+        ("price", "f8"),
+        ("volume", "f8"),
+        ("filled", "f8"),
+        ("current", "f8"),
+        ("target", "f8"),
+        ("error", "O"),
+    ]
+)
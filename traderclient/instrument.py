@@ -0,0 +1,234 @@
+"""请求的延迟和数据量统计
+
+[Instrument][traderclient.instrument.Instrument]按命令（即url的最后一段，比如`buy`、`info`）分别记录每次请求各阶段的耗时、响应大小和状态码，并可以随时通过`snapshot`取得p50/p99等统计数据，以便在下单延迟变差时告警。
+
+各阶段的含义如下：
+
+- connect: 建立TCP连接及TLS握手的耗时。复用keep-alive连接时为0
+- send: 发送请求头和请求体的耗时
+- wait: 请求发出后，到收到响应头的耗时，包括网络往返和服务器处理时间
+- download: 接收响应体的耗时
+- decode: 解码响应（比如unpickle）的耗时
+- total: 从发出请求到解码完成的总耗时
+
+如果服务器返回了`Server-Timing`头，其中的各项也会以`server.<name>`为名记录。
+
+使用方法:
+
+```python
+from traderclient.instrument import Instrument
+
+instrument = Instrument()
+client = TraderClient(url, acct, token, instrument=instrument)
+...
+print(instrument.snapshot()["buy"]["latency"]["total"]["p99"])
+```
+
+任何实现了`record`方法的对象都可以作为instrument传入，从而接入其它监控系统。
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional
+
+import numpy as np
+
+# 与httpcore trace事件名对应的阶段。事件名形如http11.send_request_headers.started
+_PHASE_EVENTS = {
+    "send": ("send_request_headers.started", "send_request_body.complete"),
+    "wait": ("send_request_body.complete", "receive_response_headers.complete"),
+    "download": ("receive_response_body.started", "receive_response_body.complete"),
+}
+
+
+class Histogram:
+    """保留最近`window`个样本，用以计算分位数"""
+
+    def __init__(self, window: int = 1024):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, value: float):
+        self._samples.append(value)
+        self.count += 1
+
+    def percentile(self, q: float) -> float:
+        if len(self._samples) == 0:
+            return float("nan")
+
+        return float(np.percentile(self._samples, q))
+
+    def snapshot(self) -> Dict[str, float]:
+        """返回样本的统计信息
+
+        Returns:
+            包含count, mean, p50, p99和max的字典。count为累计样本数，其它统计量只基于最近的样本
+        """
+        if len(self._samples) == 0:
+            return {"count": 0}
+
+        samples = np.fromiter(self._samples, dtype=float)
+        p50, p99 = np.percentile(samples, [50, 99])
+        return {
+            "count": self.count,
+            "mean": float(samples.mean()),
+            "p50": float(p50),
+            "p99": float(p99),
+            "max": float(samples.max()),
+        }
+
+
+class Tracer:
+    """收集httpcore的trace事件，用以计算各阶段耗时
+
+    同一个对象可以同时作为同步（`trace`）和异步（`atrace`）回调使用。
+    """
+
+    def __init__(self):
+        self.events: Dict[str, float] = {}
+
+    def trace(self, event: str, info: Optional[dict] = None):
+        # drop the protocol prefix, i.e. http11. or http2.
+        if event.startswith("http"):
+            event = event.split(".", 1)[1]
+        self.events[event] = time.perf_counter()
+
+    async def atrace(self, event: str, info: Optional[dict] = None):
+        self.trace(event, info)
+
+    def _span(self, start: str, end: str) -> float:
+        if start in self.events and end in self.events:
+            return self.events[end] - self.events[start]
+        return 0.0
+
+    def phases(self) -> Dict[str, float]:
+        """根据收集到的事件计算connect, send, wait和download各阶段耗时"""
+        if not self.events:
+            return {}
+
+        phases = {
+            "connect": self._span(
+                "connection.connect_tcp.started", "connection.connect_tcp.complete"
+            )
+            + self._span(
+                "connection.start_tls.started", "connection.start_tls.complete"
+            )
+        }
+        for phase, (start, end) in _PHASE_EVENTS.items():
+            phases[phase] = self._span(start, end)
+
+        return phases
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """解析`Server-Timing`响应头
+
+    比如`db;dur=53, app;desc="handler";dur=47.2`将解析为`{"db": 0.053, "app": 0.0472}`。没有`dur`的项将被忽略。
+
+    Args:
+        header: `Server-Timing`头的值
+
+    Returns:
+        指标名到耗时（秒）的字典
+    """
+    timings = {}
+    if not header:
+        return timings
+
+    for metric in header.split(","):
+        parts = [p.strip() for p in metric.split(";")]
+        name = parts[0]
+        for param in parts[1:]:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "dur":
+                try:
+                    timings[name] = float(value.strip('"')) / 1000
+                except ValueError:
+                    pass
+
+    return timings
+
+
+class Instrument:
+    """按命令统计请求的各阶段耗时、响应大小和状态码
+
+    此类是线程安全的，多个会话和线程可以共享同一个实例。
+    """
+
+    def __init__(self, window: int = 1024):
+        """
+        Args:
+            window: 计算分位数时，每个指标保留的最近样本数
+        """
+        self._window = window
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def _new_stats(self) -> Dict[str, Any]:
+        return {
+            "count": 0,
+            "status": defaultdict(int),
+            "latency": defaultdict(lambda: Histogram(self._window)),
+            "size": defaultdict(lambda: Histogram(self._window)),
+        }
+
+    def record(
+        self,
+        cmd: str,
+        timings: Dict[str, float],
+        size: Dict[str, int],
+        status: int,
+        server_timing: Optional[str] = None,
+    ):
+        """记录一次请求
+
+        Args:
+            cmd: 命令名
+            timings: 各阶段耗时（秒）
+            size: 数据量（字节），比如`{"wire": 1024, "body": 4096}`，分别为网络传输和解压后的大小
+            status: HTTP状态码
+            server_timing: `Server-Timing`响应头
+        """
+        with self._lock:
+            stats = self._stats.get(cmd)
+            if stats is None:
+                stats = self._stats[cmd] = self._new_stats()
+
+            stats["count"] += 1
+            stats["status"][status] += 1
+
+            for phase, elapsed in timings.items():
+                stats["latency"][phase].add(elapsed)
+
+            for name, elapsed in parse_server_timing(server_timing).items():
+                stats["latency"][f"server.{name}"].add(elapsed)
+
+            for name, nbytes in size.items():
+                stats["size"][name].add(nbytes)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """取得当前的统计数据
+
+        Returns:
+            以命令名为键的字典，每项包含：
+
+            - count: 请求数
+            - status: 状态码到次数的字典
+            - latency: 阶段名到统计信息（count, mean, p50, p99, max）的字典
+            - size: 数据量的统计信息
+        """
+        with self._lock:
+            return {
+                cmd: {
+                    "count": stats["count"],
+                    "status": dict(stats["status"]),
+                    "latency": {k: h.snapshot() for k, h in stats["latency"].items()},
+                    "size": {k: h.snapshot() for k, h in stats["size"].items()},
+                }
+                for cmd, stats in self._stats.items()
+            }
+
+    def reset(self):
+        """清除所有统计数据"""
+        with self._lock:
+            self._stats.clear()
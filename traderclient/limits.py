@@ -0,0 +1,136 @@
+"""涨跌停价缓存
+
+市价买入（卖出）时，需要以涨（跌）停价作为委托价。[PriceLimitCache][traderclient.limits.PriceLimitCache]以(security, date)为键缓存涨跌停价，并可以通过`prefetch`一次载入一篮子股票，避免逐笔下单时逐个查询。
+
+缓存按LRU策略淘汰，并且在自然日变化时清空，以免实盘中使用前一日的涨跌停价。
+
+取数据的方式可以通过`loader`定制，它是一个协程函数，接受证券列表和日期，返回证券到(涨停价, 跌停价)的字典。缺省的loader通过omicron并发查询各证券的涨跌停价；如果有能一次查询多个证券的数据源，可以传入自己的loader:
+
+```python
+async def loader(securities, date):
+    ...
+    return {"000001.XSHE": (10.12, 8.28)}
+
+client = TraderClient(url, acct, token, price_limits=PriceLimitCache(loader=loader))
+await client.prefetch_limits(basket, datetime.date.today())
+```
+"""
+import asyncio
+import datetime
+import logging
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Limits = Tuple[float, float]
+Loader = Callable[[List[str], datetime.date], Awaitable[Dict[str, Limits]]]
+
+
+async def omicron_loader(
+    securities: List[str], date: datetime.date
+) -> Dict[str, Limits]:
+    """通过omicron取涨跌停价。omicron只支持按单个证券查询，因此各证券的查询将并发进行"""
+    from omicron.models.stock import Stock
+
+    results = await asyncio.gather(
+        *[Stock.get_trade_price_limits(sec, date, date) for sec in securities],
+        return_exceptions=True,
+    )
+
+    limits = {}
+    for sec, r in zip(securities, results):
+        if isinstance(r, Exception):
+            logger.warning("failed to get price limits of %s: %s", sec, r)
+        elif len(r) > 0:
+            limits[sec] = (r["high_limit"][0].item(), r["low_limit"][0].item())
+
+    return limits
+
+
+class PriceLimitCache:
+    """以(security, date)为键的涨跌停价缓存
+
+    此类是线程安全的，多个客户端可以共享同一个实例。
+    """
+
+    def __init__(self, maxsize: int = 8192, loader: Optional[Loader] = None):
+        """
+        Args:
+            maxsize: 最多缓存的(security, date)数
+            loader: 取涨跌停价的协程函数，缺省为[omicron_loader][traderclient.limits.omicron_loader]
+        """
+        self.maxsize = maxsize
+        self._loader = loader or omicron_loader
+        self._cache: "OrderedDict[Tuple[str, datetime.date], Limits]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._day = datetime.date.today()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _check_day(self):
+        today = datetime.date.today()
+        if today != self._day:
+            self._cache.clear()
+            self._day = today
+
+    def _lookup(self, key: Tuple[str, datetime.date]) -> Optional[Limits]:
+        with self._lock:
+            self._check_day()
+            limits = self._cache.get(key)
+            if limits is not None:
+                self._cache.move_to_end(key)
+            return limits
+
+    def _store(self, date: datetime.date, limits: Dict[str, Limits]):
+        with self._lock:
+            self._check_day()
+            for sec, value in limits.items():
+                self._cache[(sec, date)] = value
+                self._cache.move_to_end((sec, date))
+
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    async def prefetch(self, securities: Iterable[str], date: datetime.date) -> int:
+        """一次载入`securities`在`date`日的涨跌停价，已缓存的将被跳过
+
+        Returns:
+            新载入的证券数
+        """
+        missing = [sec for sec in dict.fromkeys(securities) if (sec, date) not in self]
+        if len(missing) == 0:
+            return 0
+
+        limits = await self._loader(missing, date)
+        self._store(date, limits)
+        return len(limits)
+
+    async def get(self, security: str, date: datetime.date) -> Optional[Limits]:
+        """取得`security`在`date`日的(涨停价, 跌停价)，未缓存时将载入。无数据时返回None"""
+        limits = self._lookup((security, date))
+        if limits is not None:
+            self.hits += 1
+            return limits
+
+        self.misses += 1
+        await self.prefetch([security], date)
+        return self._lookup((security, date))
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def __contains__(self, key: Tuple[str, datetime.date]) -> bool:
+        with self._lock:
+            self._check_day()
+            return key in self._cache
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+# 缺省的缓存，由未指定`price_limits`的客户端共享
+_price_limits = PriceLimitCache()
@@ -0,0 +1,698 @@
+"""进程内的本地回测引擎
+
+[LocalEngine][traderclient.local.LocalEngine]在进程内实现了回测服务器的`start_backtest`、`buy`、`sell`、`market_buy`、`market_sell`、`sell_percent`、`positions`、`info`、`assets`、`metrics`、`bills`和`stop_backtest`接口。撮合基于调用者以numpy structured array提供的行情数据，持仓和资产也保存在structured array中。由于没有网络和序列化开销，适合需要反复运行的参数寻优。
+
+当`TraderClient`的url以`local://`开头时，将自动使用本地引擎，策略代码无须改动:
+
+```python
+bars = {"002537.XSHE": bars}  # dtype为bars_dtype的数组，可以是分钟线或者日线
+client = TraderClient(
+    "local://", acct, token, is_backtest=True, start=start, end=end, bars=bars
+)
+client.buy("002537.XSHE", 10, 500, order_time=datetime.datetime(2022, 3, 1, 10, 4))
+```
+
+撮合规则是回测服务器的简化版本：
+
+- 委托在`order_time`当天、`order_time`及之后的行情中撮合，成交时间记为`order_time`
+- 买入时，收盘价不高于委托价的bar可以成交，卖出时则是不低于委托价的bar。每个bar的成交量不超过其成交量，成交价为这些bar收盘价的加权平均
+- 如果行情中有`high_limit`、`low_limit`字段，则第一个bar涨停时不能买入，跌停时不能卖出。市价委托以涨（跌）停价撮合，没有涨跌停价时不限价格
+- 买入量按手（100股）取整，并受可用资金限制；当天买入的股票不能卖出（T+1）
+- 买卖均按`commission`收取手续费，不计印花税
+
+!!! Warn
+    本地引擎不实现账户管理（`list_accounts`、`delete_account`）和实盘接口（比如`today_entrusts`、撤单），调用时将抛出`TradeError`。
+"""
+import datetime
+import threading
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from coretypes.errors.trade import (
+    AccountConflictError,
+    AccountStoppedError,
+    BadParamsError,
+    BuylimitError,
+    CashError,
+    NoData,
+    NoDataForMatch,
+    PositionError,
+    PriceNotMeet,
+    SellLimitError,
+    TimeRewindError,
+    TradeError,
+    VolumeNotMeet,
+)
+
+from traderclient.datatypes import OrderSide
+from traderclient.utils import cmd_name, parse_times
+
+# 行情数据的结构。还可以包含high_limit和low_limit字段，用以判断涨跌停
+bars_dtype = np.dtype(
+    [
+        ("frame", "datetime64[s]"),
+        ("open", "f4"),
+        ("high", "f4"),
+        ("low", "f4"),
+        ("close", "f4"),
+        ("volume", "f8"),
+    ]
+)
+
+position_dtype = np.dtype(
+    [("security", "O"), ("shares", "f8"), ("sellable", "f8"), ("price", "f8")]
+)
+
+rich_assets_dtype = np.dtype(
+    [("date", "O"), ("assets", "f8"), ("cash", "f8"), ("mv", "f8")]
+)
+
+# 内部持仓：bought为当天买入、尚不能卖出的股数
+_holding_dtype = np.dtype(
+    [("security", "O"), ("shares", "f8"), ("bought", "f8"), ("price", "f8")]
+)
+
+_DAYS_PER_YEAR = 252
+
+
+def _date(value: Any) -> Optional[datetime.date]:
+    if value is None or isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def _ratio_metrics(returns: np.ndarray) -> Dict[str, float]:
+    """根据日收益率计算夏普、索提诺和波动率等指标"""
+    if len(returns) < 2:
+        return {"sharpe": np.nan, "sortino": np.nan, "volatility": np.nan}
+
+    std = returns.std(ddof=1)
+    downside = returns[returns < 0]
+    down_std = downside.std(ddof=1) if len(downside) > 1 else np.nan
+    scale = np.sqrt(_DAYS_PER_YEAR)
+
+    return {
+        "sharpe": float(returns.mean() / std * scale) if std > 0 else np.nan,
+        "sortino": float(returns.mean() / down_std * scale) if down_std > 0 else np.nan,
+        "volatility": float(std * scale),
+    }
+
+
+def _series_metrics(values: np.ndarray, base: float) -> Dict[str, float]:
+    """根据净值序列计算收益、回撤等指标
+
+    Args:
+        values: 每日净值（资产或者收盘价）
+        base: 期初净值
+    """
+    series = np.concatenate([[base], values]).astype(float)
+    returns = np.diff(series) / series[:-1]
+    drawdown = series / np.maximum.accumulate(series) - 1
+    max_drawdown = float(drawdown.min())
+
+    total = float(series[-1] / base - 1)
+    annual = float((1 + total) ** (_DAYS_PER_YEAR / max(len(values), 1)) - 1)
+
+    return {
+        "total_profit_rate": total,
+        "annual_return": annual,
+        "max_drawdown": max_drawdown,
+        "calmar": annual / abs(max_drawdown) if max_drawdown < 0 else np.nan,
+        **_ratio_metrics(returns),
+    }
+
+
+class LocalBroker:
+    """本地引擎中的一个回测账户"""
+
+    def __init__(
+        self,
+        engine: "LocalEngine",
+        name: str,
+        token: str,
+        principal: float,
+        commission: float,
+        start: datetime.date,
+        end: datetime.date,
+    ):
+        self.engine = engine
+        self.name = name
+        self.token = token
+        self.principal = principal
+        self.commission = commission
+        self.start = start
+        self.end = end
+
+        self.cash = principal
+        self.last_trade: Optional[datetime.datetime] = None
+        self.stopped = False
+
+        self._holdings = np.empty(0, dtype=_holding_dtype)
+
+        # 回测区间内的交易日，以及按日记录的资产和收盘后的持仓
+        days = engine.trade_days
+        self._days = days[(days >= np.datetime64(start)) & (days <= np.datetime64(end))]
+        self._assets = np.zeros(len(self._days), dtype=rich_assets_dtype)
+        self._assets["date"] = self._days.tolist()
+        self._closed = 0
+        self._position_history: Dict[datetime.date, np.ndarray] = {}
+
+        self.trades: List[Dict] = []
+        self.tx: List[Dict] = []
+        # security -> [[volume, price], ...]，用以配对交易
+        self._lots: Dict[str, List[List[float]]] = {}
+
+    @property
+    def today(self) -> Optional[datetime.date]:
+        return self.last_trade.date() if self.last_trade is not None else None
+
+    def _row(self, security: str) -> int:
+        rows = np.flatnonzero(self._holdings["security"] == security)
+        return rows[0] if len(rows) else -1
+
+    def market_value(self, t: np.datetime64) -> float:
+        if len(self._holdings) == 0:
+            return 0.0
+
+        prices = np.array(
+            [self.engine.price_at(sec, t) for sec in self._holdings["security"]]
+        )
+        return float((self._holdings["shares"] * prices).sum())
+
+    def _close_days(self, until: np.datetime64):
+        """对`until`之前（不含）尚未结算的交易日进行结算，记录资产和持仓"""
+        while self._closed < len(self._days) and self._days[self._closed] < until:
+            day = self._days[self._closed]
+            close = (day + 1).astype("datetime64[s]") - 1
+            mv = self.market_value(close)
+
+            record = self._assets[self._closed]
+            record["cash"] = self.cash
+            record["mv"] = mv
+            record["assets"] = self.cash + mv
+            self._position_history[day.tolist()] = self._positions(sellable_all=False)
+
+            # T+1: shares bought before the next day become sellable
+            self._holdings["bought"] = 0
+            self._closed += 1
+
+    def _positions(self, sellable_all: bool) -> np.ndarray:
+        holdings = self._holdings
+        positions = np.empty(len(holdings), dtype=position_dtype)
+        positions["security"] = holdings["security"]
+        positions["shares"] = holdings["shares"]
+        positions["price"] = holdings["price"]
+        positions["sellable"] = (
+            holdings["shares"]
+            if sellable_all
+            else holdings["shares"] - holdings["bought"]
+        )
+        return positions
+
+    def positions(self, date: Optional[datetime.date] = None) -> np.ndarray:
+        """取`date`日的持仓。早于当前交易日时，取该日收盘后的持仓"""
+        today = self.today
+        if date is None or today is None or date >= today:
+            return self._positions(
+                sellable_all=today is not None and date is not None and date > today
+            )
+
+        history = [d for d in self._position_history if d <= date]
+        if len(history) == 0:
+            return np.empty(0, dtype=position_dtype)
+
+        return self._position_history[max(history)].copy()
+
+    def _check_time(self, order_time: datetime.datetime):
+        if self.stopped:
+            raise AccountStoppedError(order_time, self.end)
+
+        if not self.start <= order_time.date() <= self.end:
+            raise BadParamsError(
+                f"order_time {order_time} is out of [{self.start}, {self.end}]"
+            )
+
+        if self.last_trade is not None and order_time < self.last_trade:
+            raise TimeRewindError(order_time, self.last_trade)
+
+    def trade(
+        self,
+        security: str,
+        side: OrderSide,
+        price: Optional[float],
+        volume: float,
+        order_time: datetime.datetime,
+    ) -> Dict:
+        """撮合一笔委托，返回成交记录"""
+        self._check_time(order_time)
+        t = np.datetime64(order_time, "s")
+        self._close_days(t.astype("datetime64[D]"))
+        self.last_trade = order_time
+
+        if side == OrderSide.SELL:
+            row = self._row(security)
+            sellable = (
+                0
+                if row < 0
+                else self._holdings[row]["shares"] - self._holdings[row]["bought"]
+            )
+            if sellable <= 0:
+                raise PositionError(security, order_time)
+            volume = min(volume, sellable)
+
+        filled, fill_price = self.engine.match(
+            security, side, price, volume, order_time
+        )
+
+        if side == OrderSide.BUY:
+            filled = filled // 100 * 100
+            affordable = self.cash // (fill_price * (1 + self.commission) * 100) * 100
+            if filled > affordable:
+                if affordable <= 0:
+                    required = fill_price * 100 * (1 + self.commission)
+                    raise CashError(self.name, required, self.cash)
+                filled = affordable
+
+            if filled <= 0:
+                raise VolumeNotMeet(security, fill_price)
+
+        value = filled * fill_price
+        fee = value * self.commission
+        if side == OrderSide.BUY:
+            self.cash -= value + fee
+            self._add(security, filled, fill_price)
+        else:
+            self.cash += value - fee
+            self._remove(security, filled, fill_price, order_time)
+
+        trade = {
+            "tid": uuid.uuid4().hex,
+            "eid": uuid.uuid4().hex,
+            "security": security,
+            "order_side": int(side),
+            "price": fill_price,
+            "filled": filled,
+            "time": order_time,
+            "trade_fees": fee,
+        }
+        self.trades.append(trade)
+        return trade
+
+    def _add(self, security: str, volume: float, price: float):
+        row = self._row(security)
+        if row < 0:
+            record = np.array([(security, volume, volume, price)], dtype=_holding_dtype)
+            self._holdings = np.concatenate([self._holdings, record])
+        else:
+            holding = self._holdings[row]
+            shares = holding["shares"] + volume
+            holding["price"] = (
+                holding["shares"] * holding["price"] + volume * price
+            ) / shares
+            holding["shares"] = shares
+            holding["bought"] += volume
+
+        self._lots.setdefault(security, []).append([volume, price])
+
+    def _remove(
+        self, security: str, volume: float, price: float, order_time: datetime.datetime
+    ):
+        row = self._row(security)
+        self._holdings[row]["shares"] -= volume
+        if self._holdings[row]["shares"] <= 0:
+            self._holdings = np.delete(self._holdings, row)
+
+        # pair with buy lots, first in first out
+        lots = self._lots.get(security, [])
+        while volume > 0 and lots:
+            lot = lots[0]
+            paired = min(volume, lot[0])
+            self.tx.append(
+                {
+                    "security": security,
+                    "volume": paired,
+                    "buy_price": lot[1],
+                    "sell_price": price,
+                    "profit": (price - lot[1]) * paired,
+                    "pprofit": price / lot[1] - 1,
+                    "exit": order_time,
+                }
+            )
+            lot[0] -= paired
+            volume -= paired
+            if lot[0] <= 0:
+                lots.pop(0)
+
+    def info(self) -> Dict:
+        t = (
+            np.datetime64(self.last_trade, "s")
+            if self.last_trade is not None
+            else np.datetime64(self.start, "s")
+        )
+        mv = self.market_value(t)
+        assets = self.cash + mv
+        return {
+            "name": self.name,
+            "principal": self.principal,
+            "assets": assets,
+            "start": self.start,
+            "last_trade": self.today,
+            "available": self.cash,
+            "market_value": mv,
+            "pnl": assets - self.principal,
+            "ppnl": assets / self.principal - 1,
+            "positions": self.positions(),
+        }
+
+    def assets(
+        self, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None
+    ) -> np.ndarray:
+        """取[start, end]间每个交易日收盘后的资产。当前交易日按最新价格估算"""
+        assets = self._assets[: self._closed]
+        if (
+            not self.stopped
+            and self._closed < len(self._days)
+            and self.last_trade is not None
+        ):
+            info = self.info()
+            today = np.array(
+                [(self.today, info["assets"], self.cash, info["market_value"])],
+                dtype=rich_assets_dtype,
+            )
+            assets = np.concatenate([assets, today])
+
+        dates = np.array(assets["date"].tolist(), dtype="datetime64[D]")
+        mask = np.ones(len(assets), dtype=bool)
+        if start is not None:
+            mask &= dates >= np.datetime64(start)
+        if end is not None:
+            mask &= dates <= np.datetime64(end)
+
+        return assets[mask].copy()
+
+    def stop(self):
+        """冻结账户，结算至回测结束日"""
+        if not self.stopped:
+            self._close_days(np.datetime64(self.end) + 1)
+            self.stopped = True
+
+    def metrics(
+        self,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
+        baseline: Optional[str] = None,
+    ) -> Dict:
+        assets = self.assets(start, end)
+        if len(assets) == 0:
+            raise NoData(self.name, start or self.start)
+
+        tx = [
+            t
+            for t in self.tx
+            if (start is None or t["exit"].date() >= start)
+            and (end is None or t["exit"].date() <= end)
+        ]
+        pprofits = np.array([t["pprofit"] for t in tx])
+
+        result = {
+            "start": assets["date"][0],
+            "end": assets["date"][-1],
+            "window": len(assets),
+            "total_tx": len(tx),
+            "total_profit": float(assets["assets"][-1] - self.principal),
+            "win_rate": float((pprofits > 0).mean()) if len(tx) else np.nan,
+            "mean_return": float(pprofits.mean()) if len(tx) else np.nan,
+            **_series_metrics(assets["assets"], self.principal),
+        }
+
+        if baseline is not None:
+            dates = np.array(assets["date"].tolist(), dtype="datetime64[D]")
+            closes = np.array(
+                [
+                    self.engine.price_at(baseline, (d + 1).astype("datetime64[s]") - 1)
+                    for d in dates
+                ]
+            )
+            first = self.engine.price_at(baseline, dates[0].astype("datetime64[s]") - 1)
+            if np.isnan(first):
+                first = closes[0]
+
+            returns = np.diff(np.concatenate([[first], closes])) / np.concatenate(
+                [[first], closes[:-1]]
+            )
+            result["baseline"] = {
+                "win_rate": float((returns > 0).mean()),
+                "mean_return": float(returns.mean()),
+                **_series_metrics(closes, first),
+            }
+
+        return result
+
+    def bills(self) -> Dict:
+        history = [
+            (date, *row)
+            for date, positions in sorted(self._position_history.items())
+            for row in positions.tolist()
+        ]
+        positions = np.array(history, dtype=[("date", "O")] + position_dtype.descr)
+        return {
+            "trades": list(self.trades),
+            "tx": list(self.tx),
+            "positions": positions,
+            "assets": self.assets(),
+        }
+
+
+class LocalEngine:
+    """进程内的回测引擎，持有行情数据和回测账户
+
+    一个引擎可以为多个客户端（账户）服务，账户之间以`Account`请求头区分，与回测服务器相同。
+    """
+
+    def __init__(self, bars: Dict[str, np.ndarray]):
+        """
+        Args:
+            bars: 证券代码到行情数据的字典。行情数据为numpy structured array，至少包含`frame`和`close`、`volume`字段（参见`bars_dtype`），可以是分钟线或者日线，需按`frame`升序排列
+        """
+        self._bars: Dict[str, np.ndarray] = {}
+        self._frames: Dict[str, np.ndarray] = {}
+        self._daily: Dict[str, bool] = {}
+        for security, data in bars.items():
+            frames = parse_times(data["frame"]).astype("datetime64[s]")
+            self._bars[security] = data
+            self._frames[security] = frames
+            self._daily[security] = bool(
+                np.all(frames == frames.astype("datetime64[D]"))
+            )
+
+        frames = [f.astype("datetime64[D]") for f in self._frames.values()]
+        self.trade_days = (
+            np.unique(np.concatenate(frames))
+            if frames
+            else np.array([], dtype="datetime64[D]")
+        )
+
+        self.accounts: Dict[str, LocalBroker] = {}
+        self._lock = threading.Lock()
+
+    def price_at(self, security: str, t: np.datetime64) -> float:
+        """`t`时刻（含）之前最后一个bar的收盘价，没有行情时为nan"""
+        frames = self._frames.get(security)
+        if frames is None:
+            return np.nan
+
+        i = np.searchsorted(frames, t, side="right") - 1
+        return float(self._bars[security]["close"][i]) if i >= 0 else np.nan
+
+    def match(
+        self,
+        security: str,
+        side: OrderSide,
+        price: Optional[float],
+        volume: float,
+        order_time: datetime.datetime,
+    ):
+        """在`order_time`当天的行情中撮合委托
+
+        Returns:
+            成交量和成交均价
+        """
+        frames = self._frames.get(security)
+        if frames is None:
+            raise NoData(security, order_time)
+
+        t = np.datetime64(order_time, "s")
+        day = t.astype("datetime64[D]")
+        start = day if self._daily[security] else t
+        i = np.searchsorted(frames, start.astype("datetime64[s]"), side="left")
+        j = np.searchsorted(frames, (day + 1).astype("datetime64[s]"), side="left")
+        if i >= j:
+            raise NoDataForMatch(security, order_time)
+
+        bars = self._bars[security][i:j]
+        close = bars["close"].astype(float)
+        names = bars.dtype.names
+
+        if side == OrderSide.BUY:
+            limit = bars["high_limit"][0] if "high_limit" in names else None
+            if limit is not None and close[0] >= limit - 0.005:
+                raise BuylimitError(security, order_time)
+            if price is None:
+                price = limit if limit is not None else np.inf
+            eligible = close <= price
+        else:
+            limit = bars["low_limit"][0] if "low_limit" in names else None
+            if limit is not None and close[0] <= limit + 0.005:
+                raise SellLimitError(security, order_time)
+            if price is None:
+                price = limit if limit is not None else 0
+            eligible = close >= price
+
+        if not eligible.any():
+            raise PriceNotMeet(security, price, order_time)
+
+        prices = close[eligible]
+        volumes = bars["volume"][eligible].astype(float)
+        before = np.cumsum(volumes) - volumes
+        taken = np.clip(volume - before, 0, volumes)
+
+        filled = float(taken.sum())
+        if filled <= 0:
+            raise VolumeNotMeet(security, price)
+
+        return filled, float((taken * prices).sum() / filled)
+
+    def _broker(self, headers: Optional[dict]) -> LocalBroker:
+        headers = headers or {}
+        broker = self.accounts.get(headers.get("Account"))
+        if broker is None or broker.token != headers.get("Authorization"):
+            raise TradeError(f"account {headers.get('Account')} is not found")
+        return broker
+
+    def handle(self, cmd: str, params: Optional[dict], headers: Optional[dict]) -> Any:
+        """处理一个命令，返回值与回测服务器的响应相同"""
+        params = params or {}
+        with self._lock:
+            if cmd == "start_backtest":
+                return self._start_backtest(params)
+
+            broker = self._broker(headers)
+            if cmd in ("buy", "market_buy", "sell", "market_sell", "sell_percent"):
+                return self._order(broker, cmd, params)
+            if cmd == "positions":
+                return broker.positions(_date(params.get("date")))
+            if cmd == "info":
+                return broker.info()
+            if cmd == "assets":
+                return broker.assets(
+                    _date(params.get("start")), _date(params.get("end"))
+                )
+            if cmd == "metrics":
+                return broker.metrics(
+                    _date(params.get("start")),
+                    _date(params.get("end")),
+                    params.get("baseline"),
+                )
+            if cmd == "bills":
+                return broker.bills()
+            if cmd == "stop_backtest":
+                return broker.stop()
+
+        raise TradeError(f"{cmd} is not supported by local engine")
+
+    def _start_backtest(self, params: dict):
+        name = params["name"]
+        if name in self.accounts:
+            raise AccountConflictError(name)
+
+        self.accounts[name] = LocalBroker(
+            self,
+            name,
+            params["token"],
+            params.get("principal", 1_000_000),
+            params.get("commission", 1e-4),
+            _date(params["start"]),
+            _date(params["end"]),
+        )
+
+    def _order(self, broker: LocalBroker, cmd: str, params: dict):
+        order_time = params.get("order_time")
+        if order_time is None:
+            raise BadParamsError("order_time is required in backtest mode")
+        order_time = parse_times([order_time]).tolist()[0]
+
+        security = params["security"]
+        price = params.get("price")
+        if cmd.startswith("market") or not price or np.isnan(price):
+            price = None
+
+        if cmd == "sell_percent":
+            positions = broker.positions(order_time.date())
+            found = positions[positions["security"] == security]
+            if len(found) == 0:
+                raise PositionError(security, order_time)
+            volume = found["sellable"][0] * params["percent"] // 100 * 100
+            side = OrderSide.SELL
+        else:
+            volume = params["volume"]
+            side = OrderSide.BUY if cmd.endswith("buy") else OrderSide.SELL
+
+        trade = broker.trade(security, side, price, volume, order_time)
+        return trade if side == OrderSide.BUY else [trade]
+
+
+class LocalSession:
+    """与[Session][traderclient.transport.Session]接口相同，但在进程内调用[LocalEngine][traderclient.local.LocalEngine]"""
+
+    def __init__(self, engine: LocalEngine):
+        self.engine = engine
+        self._closed = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def get(self, url, params: Optional[dict] = None, headers=None) -> Any:
+        return self.engine.handle(cmd_name(url), params, headers)
+
+    def post_json(self, url, params=None, headers=None) -> Any:
+        return self.engine.handle(cmd_name(url), params, headers)
+
+    def delete(self, url, params: Optional[Dict] = None, headers=None) -> Any:
+        return self.engine.handle(cmd_name(url), params, headers)
+
+    def close(self):
+        self._closed = True
+
+    def __enter__(self) -> "LocalSession":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class AsyncLocalSession(LocalSession):
+    """[LocalSession][traderclient.local.LocalSession]的异步版本，供`AsyncTraderClient`使用"""
+
+    async def get(self, url, params: Optional[dict] = None, headers=None) -> Any:
+        return self.engine.handle(cmd_name(url), params, headers)
+
+    async def post_json(self, url, params=None, headers=None) -> Any:
+        return self.engine.handle(cmd_name(url), params, headers)
+
+    async def delete(self, url, params: Optional[Dict] = None, headers=None) -> Any:
+        return self.engine.handle(cmd_name(url), params, headers)
+
+    @property
+    def inflight(self) -> int:
+        return 0
+
+    async def aclose(self, timeout: Optional[float] = None):
+        self.close()
+
+    async def __aenter__(self) -> "AsyncLocalSession":
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
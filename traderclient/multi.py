@@ -0,0 +1,254 @@
+"""多账户并发查询
+
+[MultiAccountClient][traderclient.multi.MultiAccountClient]为每个账户构建一个`TraderClient`，所有客户端共享同一个连接池，并以线程池并发查询各账户的`info`、`positions`和`metrics`，再将结果汇总为numpy structured array（或者DataFrame）。单个账户出错时，错误被记录在返回结果的`errors`中，不会中断整个查询。
+
+```python
+with MultiAccountClient.from_server(url, admin_token) as multi:
+    infos = multi.info()
+    print(infos.data[infos.data["ppnl"] < -0.1])
+    print(infos.errors)
+```
+"""
+import contextvars
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from traderclient.client import TraderClient
+from traderclient.transport import Session
+
+info_dtype = np.dtype(
+    [
+        ("account", "O"),
+        ("principal", "f8"),
+        ("assets", "f8"),
+        ("available", "f8"),
+        ("market_value", "f8"),
+        ("pnl", "f8"),
+        ("ppnl", "f8"),
+        ("start", "O"),
+        ("last_trade", "O"),
+    ]
+)
+
+metrics_dtype = np.dtype(
+    [
+        ("account", "O"),
+        ("start", "O"),
+        ("end", "O"),
+        ("window", "f8"),
+        ("total_tx", "f8"),
+        ("total_profit", "f8"),
+        ("total_profit_rate", "f8"),
+        ("win_rate", "f8"),
+        ("mean_return", "f8"),
+        ("sharpe", "f8"),
+        ("sortino", "f8"),
+        ("calmar", "f8"),
+        ("max_drawdown", "f8"),
+        ("annual_return", "f8"),
+        ("volatility", "f8"),
+    ]
+)
+
+
+class FanOutResult(NamedTuple):
+    """多账户查询的结果
+
+    Attributes:
+        data: 汇总后的数据，第一列为账户名。`as_frame=True`时为DataFrame
+        errors: 出错账户到异常的字典
+    """
+
+    data: Any
+    errors: Dict[str, Exception]
+
+
+def _to_float(value: Any) -> float:
+    return np.nan if value is None else float(value)
+
+
+def _records(rows: List[Dict], dtype: np.dtype) -> np.ndarray:
+    """按`dtype`的字段从dict中取值，构建structured array。缺失的数值字段为nan"""
+    records = np.empty(len(rows), dtype=dtype)
+    for name in dtype.names:
+        values = [row.get(name) for row in rows]
+        if dtype[name].kind == "f":
+            values = [_to_float(v) for v in values]
+        records[name] = values
+
+    return records
+
+
+class MultiAccountClient:
+    """并发查询多个账户，并汇总结果
+
+    !!! Warn
+        `info`、`positions`等查询都是幂等的读请求，可以安全地并发。此类不提供下单等写操作。
+    """
+
+    def __init__(
+        self,
+        url: str,
+        accounts: Dict[str, str],
+        max_concurrency: int = 32,
+        session: Optional[Session] = None,
+        **kwargs,
+    ):
+        """
+        Args:
+            url: 服务器地址及路径
+            accounts: 账户名到token的字典
+            max_concurrency: 同时进行中的请求数上限
+            session: 共享的连接池会话。如果不提供，将创建一个连接数为`max_concurrency`的会话，并在`close`时关闭
+            kwargs: 传递给`Session`的其它参数，比如`http2`、`timeouts`
+        """
+        self._owns_session = session is None
+        if session is None:
+            session = Session(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+                **kwargs,
+            )
+        self._session = session
+        self._max_concurrency = max_concurrency
+
+        self.clients = {
+            acct: TraderClient(url, acct, token, session=session, snapshot_ttl=0)
+            for acct, token in accounts.items()
+        }
+
+    @classmethod
+    def from_server(cls, url: str, admin_token: str, **kwargs) -> "MultiAccountClient":
+        """通过`list_accounts`取得服务器上的所有账户，构建`MultiAccountClient`
+
+        Args:
+            url: 服务器地址及路径
+            admin_token: 管理员token
+            kwargs: 传递给构造函数的其它参数
+        """
+        accounts = {}
+        for account in TraderClient.list_accounts(url, admin_token):
+            name = account.get("name") or account.get("account_name")
+            accounts[name] = account["token"]
+
+        return cls(url, accounts, **kwargs)
+
+    def _fan_out(self, func: Callable[[TraderClient], Any]) -> FanOutResult:
+        """对每个账户并发执行`func`，返回账户名到结果的字典，以及出错的账户"""
+        if len(self.clients) == 0:
+            return FanOutResult({}, {})
+
+        workers = max(1, min(self._max_concurrency, len(self.clients)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                acct: executor.submit(contextvars.copy_context().run, func, client)
+                for acct, client in self.clients.items()
+            }
+
+        results, errors = {}, {}
+        for acct, future in futures.items():
+            e = future.exception()
+            if e is None:
+                results[acct] = future.result()
+            else:
+                errors[acct] = e
+
+        return FanOutResult(results, errors)
+
+    @staticmethod
+    def _as_frame(data: np.ndarray, as_frame: bool):
+        if not as_frame:
+            return data
+
+        import pandas as pd
+
+        return pd.DataFrame(data)
+
+    def info(self, as_frame: bool = False) -> FanOutResult:
+        """并发查询各账户的`info`
+
+        Args:
+            as_frame: 是否以DataFrame返回。需要安装pandas
+
+        Returns:
+            `data`为dtype为`info_dtype`的数组，每个账户一行
+        """
+        results, errors = self._fan_out(lambda client: client.info())
+        rows = [{**info, "account": acct} for acct, info in results.items()]
+
+        return FanOutResult(
+            self._as_frame(_records(rows, info_dtype), as_frame), errors
+        )
+
+    def positions(
+        self, dt: Optional[datetime.date] = None, as_frame: bool = False
+    ) -> FanOutResult:
+        """并发查询各账户的持仓
+
+        Args:
+            dt: 持仓日期，回测账户需要提供
+            as_frame: 是否以DataFrame返回。需要安装pandas
+
+        Returns:
+            `data`为各账户持仓拼接而成的数组，在`positions`的字段前增加了`account`字段
+        """
+        results, errors = self._fan_out(lambda client: client.positions(dt))
+
+        arrays = [p for p in results.values() if p is not None and len(p)]
+        if arrays:
+            dtype = np.dtype([("account", "O")] + arrays[0].dtype.descr)
+        else:
+            dtype = np.dtype([("account", "O"), ("security", "O")])
+
+        # accounts may return slightly different fields, e.g. with or without alias
+        data = np.zeros(sum(len(p) for p in arrays), dtype=dtype)
+        offset = 0
+        for acct, positions in results.items():
+            if positions is None or len(positions) == 0:
+                continue
+
+            rows = slice(offset, offset + len(positions))
+            data["account"][rows] = acct
+            for name in dtype.names[1:]:
+                if name in positions.dtype.names:
+                    data[name][rows] = positions[name]
+            offset += len(positions)
+
+        return FanOutResult(self._as_frame(data, as_frame), errors)
+
+    def metrics(
+        self,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
+        baseline: Optional[str] = None,
+        as_frame: bool = False,
+    ) -> FanOutResult:
+        """并发查询各账户的策略指标
+
+        参数同[metrics][traderclient.client.TraderClient.metrics]。
+
+        Returns:
+            `data`为dtype为`metrics_dtype`的数组，每个账户一行。参考标的的指标不包含在内
+        """
+        results, errors = self._fan_out(
+            lambda client: client.metrics(start, end, baseline)
+        )
+        rows = [{**metrics, "account": acct} for acct, metrics in results.items()]
+
+        return FanOutResult(
+            self._as_frame(_records(rows, metrics_dtype), as_frame), errors
+        )
+
+    def close(self):
+        """关闭连接池。如果连接池是通过`session`传入的，则由调用者负责关闭"""
+        if self._owns_session:
+            self._session.close()
+
+    def __enter__(self) -> "MultiAccountClient":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,237 @@
+"""并行的回测参数寻优
+
+[Sweep][traderclient.sweep.Sweep]为参数网格中的每一组参数创建一个回测账户，调用策略函数，结束回测后取得`metrics`，最后将所有结果汇总为一张表。各次回测以线程池、进程池或者协程并发运行，并可以轮流分配到多个回测服务器上，从而使吞吐量随服务器能力扩展，而不是一次只运行一个回测。
+
+```python
+def strategy(client: TraderClient, fast: int, slow: int):
+    ...  # 以client下单
+
+sweep = Sweep(strategy, {"fast": [5, 10], "slow": [20, 30, 60]}, [url1, url2], start, end)
+r = sweep.run()
+print(np.sort(r.data, order="sharpe")[::-1])
+print(r.errors)
+```
+
+如果策略函数是协程函数，它将得到一个`AsyncTraderClient`，所有回测在同一个事件循环中并发运行。
+"""
+import asyncio
+import contextvars
+import datetime
+import itertools
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from traderclient.async_client import AsyncTraderClient
+from traderclient.client import TraderClient
+from traderclient.multi import FanOutResult, _records, metrics_dtype
+from traderclient.transport import AsyncSession, Session
+
+
+def param_grid(grid: Dict[str, Sequence]) -> List[Dict[str, Any]]:
+    """展开参数网格
+
+    Example:
+        >>> param_grid({"fast": [5, 10], "slow": [20]})
+        [{'fast': 5, 'slow': 20}, {'fast': 10, 'slow': 20}]
+    """
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+
+def _account(prefix: str, i: int):
+    token = uuid.uuid4().hex
+    return f"{prefix}-{i}-{token[-8:]}", token
+
+
+def _run_one(
+    strategy: Callable,
+    params: Dict,
+    url: str,
+    acct: str,
+    token: str,
+    options: Dict,
+    baseline: Optional[str],
+    session: Optional[Session] = None,
+) -> Dict:
+    """运行一次回测，返回其指标。此函数须在模块级别定义，以便在进程池中运行"""
+    with TraderClient(
+        url, acct, token, is_backtest=True, session=session, **options
+    ) as client:
+        strategy(client, **params)
+        client.stop_backtest()
+        return client.metrics(baseline=baseline)
+
+
+class Sweep:
+    """并行运行一组回测，收集各自的指标"""
+
+    def __init__(
+        self,
+        strategy: Callable,
+        grid: Union[Dict[str, Sequence], List[Dict[str, Any]]],
+        urls: Union[str, Sequence[str]],
+        start: datetime.date,
+        end: datetime.date,
+        principal: float = 1_000_000,
+        commission: float = 1e-4,
+        max_workers: int = 8,
+        use_processes: bool = False,
+        baseline: Optional[str] = None,
+        prefix: str = "sweep",
+        **kwargs,
+    ):
+        """
+        Args:
+            strategy: 策略函数，以`strategy(client, **params)`方式调用。协程函数将得到`AsyncTraderClient`
+            grid: 参数网格（参数名到取值列表的字典），或者已展开的参数列表
+            urls: 一个或者多个回测服务器地址。各次回测按顺序轮流分配到这些服务器上
+            start: 回测开始日期
+            end: 回测结束日期
+            principal: 初始资金
+            commission: 手续费率
+            max_workers: 同时运行的回测数
+            use_processes: 是否以进程池运行同步的策略函数，适用于策略本身计算量较大的情况。此时策略函数须可以被pickle
+            baseline: 计算指标时使用的参考标的
+            prefix: 回测账户名前缀
+            kwargs: 传递给`TraderClient`的其它参数，比如`timeouts`，或者`local://`回测所需的`bars`
+        """
+        self.strategy = strategy
+        self.params = param_grid(grid) if isinstance(grid, dict) else list(grid)
+        self.urls = [urls] if isinstance(urls, str) else list(urls)
+        if len(self.urls) == 0:
+            raise ValueError("at least one url is required")
+
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.baseline = baseline
+        self.prefix = prefix
+        self.options = {
+            "start": start,
+            "end": end,
+            "principal": principal,
+            "commission": commission,
+            **kwargs,
+        }
+
+    def _runs(self) -> List[tuple]:
+        """每次回测的(参数, 服务器, 账户名, token)"""
+        runs = []
+        for i, params in enumerate(self.params):
+            acct, token = _account(self.prefix, i)
+            runs.append((params, self.urls[i % len(self.urls)], acct, token))
+        return runs
+
+    def run(self) -> FanOutResult:
+        """运行所有回测
+
+        Returns:
+            `data`为structured array，每次回测一行，包含账户名、服务器、各参数及`metrics_dtype`中的指标；`errors`为出错的账户名到异常的字典
+        """
+        runs = self._runs()
+        if asyncio.iscoroutinefunction(self.strategy):
+            outcomes = asyncio.run(self._arun(runs))
+        elif self.use_processes:
+            outcomes = self._run_in_processes(runs)
+        else:
+            outcomes = self._run_in_threads(runs)
+
+        return self._collect(runs, outcomes)
+
+    def _run_in_threads(self, runs: List[tuple]) -> List:
+        # one connection pool per server, shared by all runs on it
+        sessions = {
+            url: Session(max_connections=self.max_workers)
+            for url in self.urls
+            if not url.startswith("local://")
+        }
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        _run_one,
+                        self.strategy,
+                        params,
+                        url,
+                        acct,
+                        token,
+                        self.options,
+                        self.baseline,
+                        sessions.get(url),
+                    )
+                    for params, url, acct, token in runs
+                ]
+            return [f.exception() or f.result() for f in futures]
+        finally:
+            for session in sessions.values():
+                session.close()
+
+    def _run_in_processes(self, runs: List[tuple]) -> List:
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(
+                    _run_one,
+                    self.strategy,
+                    params,
+                    url,
+                    acct,
+                    token,
+                    self.options,
+                    self.baseline,
+                )
+                for params, url, acct, token in runs
+            ]
+        return [f.exception() or f.result() for f in futures]
+
+    async def _arun(self, runs: List[tuple]) -> List:
+        semaphore = asyncio.Semaphore(self.max_workers)
+        sessions = {
+            url: AsyncSession(max_connections=self.max_workers)
+            for url in self.urls
+            if not url.startswith("local://")
+        }
+
+        async def run_one(params, url, acct, token):
+            async with semaphore:
+                client = AsyncTraderClient(
+                    url,
+                    acct,
+                    token,
+                    is_backtest=True,
+                    session=sessions.get(url),
+                    **self.options,
+                )
+                await client.init()
+                try:
+                    await self.strategy(client, **params)
+                    await client.stop_backtest()
+                    return await client.metrics(baseline=self.baseline)
+                finally:
+                    await client.close()
+
+        try:
+            return await asyncio.gather(
+                *[run_one(*run) for run in runs], return_exceptions=True
+            )
+        finally:
+            for session in sessions.values():
+                await session.aclose()
+
+    def _collect(self, runs: List[tuple], outcomes: List) -> FanOutResult:
+        keys = list(dict.fromkeys(k for params, *_ in runs for k in params))
+        rows, errors = [], {}
+        for (params, url, acct, _), outcome in zip(runs, outcomes):
+            if isinstance(outcome, BaseException):
+                errors[acct] = outcome
+                continue
+            rows.append({**params, **outcome, "account": acct, "url": url})
+
+        dtype = np.dtype(
+            [("account", "O"), ("url", "O")]
+            + [(k, "O") for k in keys]
+            + metrics_dtype.descr[1:]
+        )
+        return FanOutResult(_records(rows, dtype), errors)
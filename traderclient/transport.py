@@ -1,35 +1,344 @@
+import asyncio
+import gzip
+import importlib
+import io
+import json
 import logging
 import os
 import pickle
+import struct
+import threading
+import time
 import uuid
-from typing import Any, Dict, Optional
+import zipfile
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+from urllib.parse import unquote, urlsplit
 
 import httpx
-
-from traderclient.utils import get_cmd, status_ok
+import numpy as np
 from coretypes.errors.trade import TradeError
 
+from traderclient.instrument import Tracer
+from traderclient.utils import cmd_name, get_cmd, status_ok
+
 logger = logging.getLogger(__name__)
 
+# 二进制格式协商。服务器如果支持，可以直接以`.npy`（单个数组）或者不压缩的`.npz`（多个数组）格式返回numpy数组，客户端将以`np.frombuffer`构建响应体之上的视图，无须反序列化和复制；否则仍以pickle返回。
+NPY_CONTENT_TYPE = "application/x-npy"
+NPZ_CONTENT_TYPE = "application/x-npz"
+ACCEPT = (
+    f"{NPY_CONTENT_TYPE}, {NPZ_CONTENT_TYPE}, application/octet-stream;q=0.9, */*;q=0.8"
+)
+
+
+class JsonCodec:
+    """JSON编解码器，基于标准库`json`
+
+    请求体、响应体以及错误信息（`TradeError.from_json`）的编解码都通过当前的编解码器进行。可以继承此类，实现`dumps`和`loads`，再通过`set_codec`接入其它实现。
+    """
+
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        """将`obj`编码为UTF-8的JSON"""
+        return json.dumps(obj).encode("utf-8")
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """解码JSON"""
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """基于orjson的编解码器
+
+    可以直接编码numpy数组和标量、datetime和枚举。与标准库不同，nan和inf编码为null。orjson不接受`NaN`这样的非标准JSON，遇到时回退到标准库解码。
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+        self._option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._orjson.dumps(obj, option=self._option)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        try:
+            return self._orjson.loads(data)
+        except self._orjson.JSONDecodeError:
+            return json.loads(data)
+
 
-def timeout(params: Optional[dict] = None) -> int:
-    """determine timeout value for httpx request
+class MsgspecCodec(JsonCodec):
+    """基于msgspec的编解码器
 
-    if there's envar "TRADER_CLIENT_TIMEOUT", it will precedes, then the max of user timeout and default 30
+    numpy标量和数组通过`enc_hook`转换为Python对象后编码。遇到`NaN`这样的非标准JSON时，回退到标准库解码。
+    """
+
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+
+        self._error = msgspec.DecodeError
+        self._encoder = msgspec.json.Encoder(enc_hook=self._enc_hook)
+        self._decoder = msgspec.json.Decoder()
+
+    @staticmethod
+    def _enc_hook(obj: Any) -> Any:
+        if isinstance(obj, (np.generic, np.ndarray)):
+            return obj.tolist()
+        raise NotImplementedError(f"unsupported type: {type(obj)}")
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        try:
+            return self._decoder.decode(data)
+        except self._error:
+            return json.loads(data)
+
+
+def _default_codec() -> JsonCodec:
+    """按orjson、msgspec、标准库的顺序，选择第一个可用的编解码器"""
+    for codec in (OrjsonCodec, MsgspecCodec):
+        try:
+            return codec()
+        except ImportError:
+            pass
+
+    return JsonCodec()
+
+
+_codec: JsonCodec = _default_codec()
+
+
+def set_codec(codec: Optional[JsonCodec] = None):
+    """设置JSON编解码器
 
     Args:
-        params : user specified in request
+        codec: 编解码器，比如`JsonCodec()`。None表示恢复自动选择
+    """
+    global _codec
+    _codec = codec or _default_codec()
 
-    Returns:
-        timeout
+
+def get_codec() -> JsonCodec:
+    """当前使用的JSON编解码器"""
+    return _codec
+
+
+# 端点类别。未列出的端点视为查询(queries)
+ENDPOINT_CLASSES = {
+    "buy": "orders",
+    "market_buy": "orders",
+    "sell": "orders",
+    "market_sell": "orders",
+    "sell_percent": "orders",
+    "sell_all": "orders",
+    "cancel_entrust": "orders",
+    "cancel_all_entrusts": "orders",
+    "metrics": "reports",
+    "bills": "reports",
+    "assets": "reports",
+    "get_trades_in_range": "reports",
+    "get_entrusts_in_range": "reports",
+    "start_backtest": "reports",
+    "stop_backtest": "reports",
+    "schedule": "reports",
+}
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """请求未能在`deadline`规定的时间内完成"""
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """限定其中所有请求的总耗时
+
+    在此上下文中发出的请求，其各阶段的超时都不会超过剩余时间；时间用完后，新的请求将直接抛出`DeadlineExceeded`。异步请求还会在剩余时间用完时被取消。嵌套使用时，以较早的截止时间为准:
+
+    ```python
+    with deadline(0.8):
+        client.buy(...)
+        client.positions()
+    ```
+
+    Args:
+        seconds: 允许的总耗时（秒）
+    """
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        at = min(at, current)
+
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _remaining(at: Optional[float]) -> Optional[float]:
+    """距截止时间`at`的剩余时间，已超时则抛出`DeadlineExceeded`"""
+    if at is None:
+        return None
+
+    remaining = at - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("deadline exceeded")
+
+    return remaining
+
+
+class Timeouts:
+    """按端点类别确定connect/read/write/pool各阶段的超时
+
+    端点分为下单（orders）、查询（queries）和报表（reports）三类，各有缺省的超时。下单时传给服务器的`timeout`参数（等待成交回报的时间）会计入读超时，即读超时至少为`timeout + margin`。
+
+    设置`adaptive`后，每个端点的读超时将根据近期延迟自动收紧为`factor`倍的`percentile`分位数（不低于`floor`，也不超过该类别的缺省值），从而在网关挂起时尽早失败。
+
+    环境变量`TRADER_CLIENT_TIMEOUT`仅在构造时读取一次，如果设置，将作为所有类别的读超时。
     """
-    if os.environ.get("TRADER_CLIENT_TIMEOUT"):
-        return int(os.environ.get("TRADER_CLIENT_TIMEOUT", "5"))
 
-    if params is None or params.get("timeout") is None:
-        return 30
+    DEFAULTS = {
+        "orders": httpx.Timeout(connect=2.0, read=5.0, write=5.0, pool=2.0),
+        "queries": httpx.Timeout(connect=2.0, read=10.0, write=5.0, pool=5.0),
+        "reports": httpx.Timeout(connect=5.0, read=60.0, write=10.0, pool=10.0),
+    }
+
+    def __init__(
+        self,
+        orders: Optional[httpx.Timeout] = None,
+        queries: Optional[httpx.Timeout] = None,
+        reports: Optional[httpx.Timeout] = None,
+        margin: float = 1.0,
+        adaptive: bool = False,
+        percentile: float = 99,
+        factor: float = 3.0,
+        floor: float = 0.5,
+        min_samples: int = 50,
+        window: int = 256,
+    ):
+        """
+        Args:
+            orders : 下单类端点的超时，None表示使用缺省值
+            queries : 查询类端点的超时
+            reports : 报表类端点的超时
+            margin : 读超时在服务器等待成交回报的时间（即`timeout`参数）之外的余量（秒）
+            adaptive : 是否根据近期延迟自动调整读超时
+            percentile : 自适应时参考的延迟分位数
+            factor : 自适应时，读超时为分位数延迟的倍数
+            floor : 自适应读超时的下限（秒）
+            min_samples : 每个端点至少有多少个样本后才开始自适应
+            window : 每个端点保留的最近延迟样本数
+        """
+        self._timeouts = {
+            "orders": orders or self.DEFAULTS["orders"],
+            "queries": queries or self.DEFAULTS["queries"],
+            "reports": reports or self.DEFAULTS["reports"],
+        }
+
+        env = os.environ.get("TRADER_CLIENT_TIMEOUT")
+        if env:
+            read = float(env)
+            self._timeouts = {
+                k: httpx.Timeout(
+                    connect=t.connect, read=read, write=t.write, pool=t.pool
+                )
+                for k, t in self._timeouts.items()
+            }
+
+        self.margin = margin
+        self.adaptive = adaptive
+        self.percentile = percentile
+        self.factor = factor
+        self.floor = floor
+        self.min_samples = min_samples
+        self._latencies: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+
+    def record(self, cmd: str, elapsed: float):
+        """记录端点`cmd`一次成功请求的延迟，仅在`adaptive`时使用"""
+        if self.adaptive:
+            self._latencies[cmd].append(elapsed)
+
+    def _read(self, cmd: str, read: Optional[float]) -> Optional[float]:
+        samples = self._latencies.get(cmd)
+        if not self.adaptive or samples is None or len(samples) < self.min_samples:
+            return read
+
+        adaptive = max(
+            self.floor, self.factor * float(np.percentile(samples, self.percentile))
+        )
+        return adaptive if read is None else min(read, adaptive)
+
+    def timeout(
+        self, url: str, params: Optional[dict] = None, at: Optional[float] = None
+    ) -> httpx.Timeout:
+        """确定一次请求的超时
+
+        Args:
+            url : 目标URL，据此确定端点类别
+            params : 请求参数，其中的`timeout`为服务器等待成交回报的时间
+            at : 截止时间（`time.monotonic()`），各阶段超时不会超过剩余时间
 
-    return max(params.get("timeout", 5), 30)
+        Raises:
+            DeadlineExceeded: 已经超过截止时间
+        """
+        cmd = cmd_name(url)
+        base = self._timeouts[ENDPOINT_CLASSES.get(cmd, "queries")]
+
+        read = self._read(cmd, base.read)
+        wait = (params or {}).get("timeout")
+        if read is not None and wait is not None:
+            read = max(read, wait + self.margin)
+
+        phases = {
+            "connect": base.connect,
+            "read": read,
+            "write": base.write,
+            "pool": base.pool,
+        }
+
+        remaining = _remaining(at)
+        if remaining is not None:
+            phases = {
+                k: remaining if v is None else min(v, remaining)
+                for k, v in phases.items()
+            }
+
+        return httpx.Timeout(**phases)
+
+
+# 模块级的`get`、`post_json`和`delete`使用的超时
+_timeouts = Timeouts()
 
 
 def process_response_result(rsp: httpx.Response, cmd: Optional[str] = None) -> Any:
@@ -50,16 +359,20 @@ def process_response_result(rsp: httpx.Response, cmd: Optional[str] = None) -> A
     # process 20x response, check response code first
     if status_ok(rsp.status_code):
         if content_type == "application/json":
-            return rsp.json()
+            return _codec.loads(rsp.content)
         elif content_type.startswith("text"):
             return rsp.text
+        elif content_type.startswith(NPY_CONTENT_TYPE):
+            return decode_npy(rsp.content)
+        elif content_type.startswith(NPZ_CONTENT_TYPE):
+            return decode_npz(rsp.content)
         else:
             return pickle.loads(rsp.content)
 
     # http 1.1 allow us to extend http status code, so we choose 499 as our error code. The upstream server is currently built on top of sanic, it doesn't support customer reason phrase (always return "Unknown Error" if the status code is extened. So we have to use body to carry on reason phrase.
     if rsp.status_code == 499:
         if "json" in rsp.headers.get("Content-Type"):
-            e = TradeError.from_json(rsp.json())
+            e = TradeError.from_json(_codec.loads(rsp.content))
             logger.warning("%s failed: %s, %s", cmd, rsp.status_code, e.error_msg)
             raise e
         else:
@@ -69,26 +382,290 @@ def process_response_result(rsp: httpx.Response, cmd: Optional[str] = None) -> A
         rsp.raise_for_status()
 
 
-def get(url, params: Optional[dict] = None, headers=None) -> Any:
+def decode_npy(content: bytes) -> np.ndarray:
+    """将`.npy`格式的数据解码为numpy数组
+
+    返回的数组是`content`之上的只读视图，不发生复制。如果数组包含object字段（`.npy`只能以pickle方式保存这类数据），则退回到`np.load`。
+
+    Args:
+        content: `.npy`格式的数据，可以是bytes或者memoryview
+
+    Returns:
+        解码后的numpy数组
+    """
+    view = memoryview(content)
+    major = view[6]
+    if major == 1:
+        (header_len,) = struct.unpack("<H", view[8:10])
+        data_offset = 10 + header_len
+    else:
+        (header_len,) = struct.unpack("<I", view[8:12])
+        data_offset = 12 + header_len
+
+    stream = io.BytesIO(view[:data_offset].tobytes())
+    version = np.lib.format.read_magic(stream)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+
+    if dtype.hasobject:
+        return np.load(io.BytesIO(view.tobytes()), allow_pickle=True)
+
+    count = int(np.prod(shape))
+    arr = np.frombuffer(view, dtype=dtype, count=count, offset=data_offset)
+
+    return arr.reshape(shape, order="F" if fortran_order else "C")
+
+
+def decode_npz(content: bytes) -> Dict[str, np.ndarray]:
+    """将`.npz`格式的数据解码为以数组名为键的字典
+
+    对未压缩（即`np.savez`生成）的成员，返回`content`之上的只读视图；对压缩成员，则需要先解压。
+
+    Args:
+        content: `.npz`格式的数据
+
+    Returns:
+        数组名到numpy数组的字典
+    """
+    view = memoryview(content)
+
+    result = {}
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        for info in zf.infolist():
+            name = info.filename
+            if name.endswith(".npy"):
+                name = name[:-4]
+
+            if info.compress_type == zipfile.ZIP_STORED:
+                # local file header: 30 bytes, followed by file name and extra field
+                start = info.header_offset
+                name_len, extra_len = struct.unpack(
+                    "<HH", view[start + 26 : start + 30]
+                )
+                data_start = start + 30 + name_len + extra_len
+                member = view[data_start : data_start + info.file_size]
+                result[name] = decode_npy(member)
+            else:
+                result[name] = decode_npy(zf.read(info))
+
+    return result
+
+
+def _with_request_id(headers: Optional[dict] = None) -> dict:
+    """为请求加上唯一的Request-ID，以及支持的响应格式
+
+    调用者传入的`headers`不会被修改，因此多个线程可以共享同一个`headers`。
+    """
+    headers = dict(headers or {})
+    headers["Request-ID"] = uuid.uuid4().hex
+    headers.setdefault("Accept", ACCEPT)
+
+    return headers
+
+
+def _hedge_headers(headers: dict) -> dict:
+    """对冲请求使用的headers：新的Request-ID，并以Hedge-Of指向原请求"""
+    hedge = dict(headers)
+    hedge["Request-ID"] = uuid.uuid4().hex
+    hedge["Hedge-Of"] = headers.get("Request-ID", "")
+
+    return hedge
+
+
+def supported_encodings() -> List[str]:
+    """当前环境下httpx能够解码的响应压缩算法
+
+    gzip和deflate总是可用；安装了`brotli`后支持br，安装了`zstandard`（且httpx >= 0.27）后支持zstd。
+    """
+    # same detection as httpx, without relying on its private modules
+    encodings = ["gzip", "deflate"]
+    if _importable("brotli") or _importable("brotlicffi"):
+        encodings.insert(0, "br")
+
+    version = tuple(int(v) for v in httpx.__version__.split(".")[:2] if v.isdigit())
+    if version >= (0, 27) and _importable("zstandard"):
+        encodings.insert(0, "zstd")
+
+    return encodings
+
+
+@lru_cache(maxsize=None)
+def _importable(module: str) -> bool:
+    try:
+        importlib.import_module(module)
+    except ImportError:
+        return False
+    return True
+
+
+def _accept_encoding(compression: Optional[Sequence[str]] = None) -> str:
+    """根据配置生成Accept-Encoding
+
+    Args:
+        compression : 希望服务器使用的压缩算法，按优先级排列。None表示所有可用的算法，空列表表示不压缩。
+    """
+    available = supported_encodings()
+    if compression is None:
+        compression = available
+
+    encodings = [e for e in compression if e in available]
+    unsupported = set(compression) - set(encodings)
+    if unsupported:
+        logger.warning("unsupported compression ignored: %s", unsupported)
+
+    return ", ".join(encodings) or "identity"
+
+
+def _json_body(
+    params: Any, headers: dict, compress_threshold: Optional[int] = None
+) -> Optional[bytes]:
+    """将`params`编码为JSON请求体
+
+    如果编码后的长度超过`compress_threshold`，则以gzip压缩，并相应设置`Content-Encoding`。
+
+    Args:
+        params : 待编码的数据，为None时不发送请求体
+        headers : 请求头，将被就地修改
+        compress_threshold : 压缩阈值（字节），None表示不压缩
+    """
+    if params is None:
+        return None
+
+    body = _codec.dumps(params)
+    headers["Content-Type"] = "application/json"
+
+    if compress_threshold is not None and len(body) > compress_threshold:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+
+    return body
+
+
+# 未单独指定instrument时使用的缺省instrument
+_instrument = None
+
+
+def set_instrument(instrument):
+    """设置缺省的instrument
+
+    模块级的`get`、`post_json`和`delete`，以及未指定instrument的会话，都将把请求统计数据记录到此instrument中。
+
+    Args:
+        instrument: 实现了`record`方法的对象，比如[Instrument][traderclient.instrument.Instrument]。None表示关闭统计
+    """
+    global _instrument
+    _instrument = instrument
+
+
+def _record(instrument, cmd: str, rsp: httpx.Response, tracer, t0, t1, t2):
+    timings = tracer.phases() if tracer is not None else {}
+    timings["decode"] = t2 - t1
+    timings["total"] = t2 - t0
+    size = {"wire": rsp.num_bytes_downloaded, "body": len(rsp.content)}
+
+    try:
+        instrument.record(
+            cmd, timings, size, rsp.status_code, rsp.headers.get("Server-Timing")
+        )
+    except Exception:
+        logger.exception("failed to record stats of %s", cmd)
+
+
+def _perform(
+    url: str,
+    send: Callable[[dict], httpx.Response],
+    instrument=None,
+    hedger: Optional["Hedger"] = None,
+) -> Any:
+    """发送请求，处理响应，并记录统计数据
+
+    Args:
+        url : 目标URL
+        send : 以httpx的请求扩展（extensions）为参数，发送请求并返回响应的函数
+        instrument : 统计数据的记录者，为None时使用缺省的instrument
+        hedger : 如果提供，将对请求进行对冲
+    """
+    instrument = instrument or _instrument
+    cmd = cmd_name(url)
+
+    def attempt(**kwargs):
+        tracer = Tracer() if instrument is not None else None
+        t0 = time.perf_counter()
+        rsp = send({"trace": tracer.trace} if tracer is not None else {}, **kwargs)
+        return rsp, tracer, t0
+
+    if hedger is None:
+        rsp, tracer, t0 = attempt()
+    else:
+        rsp, tracer, t0 = hedger.run(cmd, attempt)
+
+    if instrument is None:
+        return process_response_result(rsp, get_cmd(url))
+
+    t1 = time.perf_counter()
+    try:
+        return process_response_result(rsp, get_cmd(url))
+    finally:
+        _record(instrument, cmd, rsp, tracer, t0, t1, time.perf_counter())
+
+
+async def _aperform(
+    url: str,
+    send: Callable[[dict], Awaitable[httpx.Response]],
+    instrument=None,
+    hedger: Optional["Hedger"] = None,
+) -> Any:
+    """`_perform`的异步版本"""
+    instrument = instrument or _instrument
+    cmd = cmd_name(url)
+
+    async def attempt(**kwargs):
+        tracer = Tracer() if instrument is not None else None
+        t0 = time.perf_counter()
+        rsp = await send(
+            {"trace": tracer.atrace} if tracer is not None else {}, **kwargs
+        )
+        return rsp, tracer, t0
+
+    if hedger is None:
+        rsp, tracer, t0 = await attempt()
+    else:
+        rsp, tracer, t0 = await hedger.arun(cmd, attempt)
+
+    if instrument is None:
+        return process_response_result(rsp, get_cmd(url))
+
+    t1 = time.perf_counter()
+    try:
+        return process_response_result(rsp, get_cmd(url))
+    finally:
+        _record(instrument, cmd, rsp, tracer, t0, t1, time.perf_counter())
+
+
+def get(url, params: Optional[dict] = None, headers=None, hedger=None) -> Any:
     """发送GET请求到上游服务接口
 
     Args:
         url : 目标URL，带服务器信息
         params : JSON格式的参数清单
         headers : 额外的header选项
+        hedger : 如果提供，将以[Hedger][traderclient.transport.Hedger]对请求进行对冲
 
     """
-    if headers is None:
-        headers = {"Request-ID": uuid.uuid4().hex}
-    else:
-        headers.update({"Request-ID": uuid.uuid4().hex})
+    headers = _with_request_id(headers)
+    at = _deadline.get()
 
-    rsp = httpx.get(url, params=params, headers=headers, timeout=timeout(params))
+    def send(extensions, hedge=False):
+        return httpx.get(
+            url,
+            params=params,
+            headers=_hedge_headers(headers) if hedge else headers,
+            timeout=_timeouts.timeout(url, params, at),
+        )
 
-    action = get_cmd(url)
-    result = process_response_result(rsp, action)
-
-    return result
+    return _perform(url, send, hedger=hedger)
 
 
 def post_json(url, params=None, headers=None) -> Any:
@@ -100,17 +677,20 @@ def post_json(url, params=None, headers=None) -> Any:
         headers : 额外的header选项
 
     """
-    if headers is None:
-        headers = {"Request-ID": uuid.uuid4().hex}
-    else:
-        headers.update({"Request-ID": uuid.uuid4().hex})
+    headers = _with_request_id(headers)
+    content = _json_body(params, headers)
 
-    rsp = httpx.post(url, json=params, headers=headers, timeout=timeout(params))
+    at = _deadline.get()
 
-    action = get_cmd(url)
-    result = process_response_result(rsp, action)
+    def send(extensions):
+        return httpx.post(
+            url,
+            content=content,
+            headers=headers,
+            timeout=_timeouts.timeout(url, params, at),
+        )
 
-    return result
+    return _perform(url, send)
 
 
 def delete(url, params: Optional[Dict] = None, headers=None) -> Any:
@@ -123,14 +703,702 @@ def delete(url, params: Optional[Dict] = None, headers=None) -> Any:
 
     Returns:
     """
-    if headers is None:
-        headers = {"Request-ID": uuid.uuid4().hex}
-    else:
-        headers.update({"Request-ID": uuid.uuid4().hex})
+    headers = _with_request_id(headers)
+    at = _deadline.get()
 
-    rsp = httpx.delete(url, params=params, headers=headers, timeout=timeout(params))
+    def send(extensions):
+        return httpx.delete(
+            url,
+            params=params,
+            headers=headers,
+            timeout=_timeouts.timeout(url, params, at),
+        )
 
-    action = get_cmd(url)
-    result = process_response_result(rsp, action)
+    return _perform(url, send)
 
-    return result
+
+class Hedger:
+    """对幂等的读请求进行对冲，以降低尾延迟
+
+    服务器偶尔出现GC停顿或者某个worker变慢时，`info`、`positions`这样的查询可能耗时数秒。对冲的做法是：如果请求在该端点近期延迟的`percentile`分位数时间内仍未返回，就再发出一个相同的请求，以先成功返回者为准。
+
+    在样本数达到`min_samples`之前，不进行对冲。
+
+    !!! Warn
+        对冲会重复发送请求，因此只能用于GET这样的幂等请求，绝不能用于`buy`、`sell`等会改变账户状态的POST请求。
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95,
+        min_samples: int = 20,
+        window: int = 256,
+        min_delay: float = 0.0,
+        max_workers: int = 8,
+    ):
+        """
+        Args:
+            percentile : 以近期延迟的哪个分位数作为对冲等待时间
+            min_samples : 开始对冲前，每个端点至少需要的延迟样本数
+            window : 每个端点保留的最近延迟样本数
+            min_delay : 对冲等待时间的下限（秒）
+            max_workers : 同步请求对冲时使用的线程数
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+
+        self._latencies: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # 发出对冲请求的次数，以及对冲请求先返回的次数
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def delay(self, endpoint: str) -> Optional[float]:
+        """端点`endpoint`的对冲等待时间，样本不足时返回None"""
+        with self._lock:
+            samples = list(self._latencies[endpoint])
+        if len(samples) < self.min_samples:
+            return None
+
+        return max(self.min_delay, float(np.percentile(samples, self.percentile)))
+
+    def record(self, endpoint: str, elapsed: float):
+        """记录一次请求的延迟"""
+        with self._lock:
+            self._latencies[endpoint].append(elapsed)
+
+    def _timed(self, endpoint: str, send: Callable[..., Any], **kwargs) -> Any:
+        t0 = time.perf_counter()
+        result = send(**kwargs)
+        self.record(endpoint, time.perf_counter() - t0)
+        return result
+
+    def run(self, endpoint: str, send: Callable[[], Any]) -> Any:
+        """执行同步请求`send`，必要时对冲
+
+        落后的请求无法取消，它会在后台线程中完成，其结果被丢弃，但延迟仍会被记录。
+
+        Args:
+            endpoint : 端点名，延迟按端点分别统计
+            send : 发送请求的函数。对冲请求以`send(hedge=True)`方式调用，它应当使用新的Request-ID
+        """
+        delay = self.delay(endpoint)
+        if delay is None:
+            return self._timed(endpoint, send)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+
+        primary = self._executor.submit(self._timed, endpoint, send)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        with self._lock:
+            self.hedged += 1
+        hedge = self._executor.submit(self._timed, endpoint, send, hedge=True)
+
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+
+        raise error
+
+    async def arun(self, endpoint: str, send: Callable[[], Awaitable[Any]]) -> Any:
+        """`run`的异步版本。先成功返回者胜出，落后的请求将被取消
+
+        Args:
+            endpoint : 端点名，延迟按端点分别统计
+            send : 返回协程的函数。对冲请求以`send(hedge=True)`方式调用
+        """
+
+        async def timed(**kwargs):
+            t0 = time.perf_counter()
+            result = await send(**kwargs)
+            self.record(endpoint, time.perf_counter() - t0)
+            return result
+
+        delay = self.delay(endpoint)
+        if delay is None:
+            return await timed()
+
+        primary = asyncio.ensure_future(timed())
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        with self._lock:
+            self.hedged += 1
+        hedge = asyncio.ensure_future(timed(hedge=True))
+
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        if task is hedge:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise error
+
+    def close(self):
+        """关闭对冲使用的线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class Coalescer:
+    """合并并发的相同读请求（single-flight）
+
+    客户端被多个线程或协程共享时，策略的各个部分常常在同一时刻调用`positions`或`info`。合并后，对于相同的请求（URL、参数和账户均相同），同一时刻只有一个请求发往服务器，其它调用者等待并共享它的结果（或异常）。请求完成后即不再合并，之后的调用会重新发出请求，因此不会读到过期的数据。
+
+    !!! Warn
+        被合并的调用者得到的是同一个结果对象，不应就地修改它。与[Hedger][traderclient.transport.Hedger]一样，只能用于幂等的读请求。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._ainflight: Dict[Hashable, asyncio.Future] = {}
+
+        # 实际发出的请求数，以及被合并（即节省）的调用数
+        self.calls = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(url: str, params: Optional[dict] = None, headers=None) -> Hashable:
+        """请求的合并键，由URL、参数和账户相关的请求头组成"""
+        headers = headers or {}
+        return (
+            url,
+            json.dumps(params, sort_keys=True, default=str),
+            headers.get("Account"),
+            headers.get("Authorization"),
+        )
+
+    def run(self, key: Hashable, call: Callable[[], Any]) -> Any:
+        """执行同步请求`call`。如果相同的请求正在进行中，则等待并共享其结果
+
+        Args:
+            key : 合并键，参见`key`
+            call : 发送请求的函数
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = call()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._inflight[key]
+        future.set_result(result)
+        return result
+
+    async def arun(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """`run`的异步版本
+
+        请求在独立的任务中执行，因此某个调用者被取消时，不影响其它等待同一请求的调用者。
+        """
+        task = self._ainflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = self._ainflight[key] = asyncio.ensure_future(call())
+            self.calls += 1
+
+            def done(t: asyncio.Future):
+                self._ainflight.pop(key, None)
+                # mark the exception retrieved in case all callers were cancelled
+                if not t.cancelled():
+                    t.exception()
+
+            task.add_done_callback(done)
+
+        return await asyncio.shield(task)
+
+
+UNIX_SCHEME = "http+unix"
+
+
+def split_unix_url(url: str) -> Tuple[str, Optional[str]]:
+    """将`http+unix://`形式的url拆分为HTTP url和Unix domain socket路径
+
+    socket路径作为url的主机部分，需要以百分号编码，比如`http+unix://%2Frun%2Ftrader.sock/trade/api/v1`将拆分为`http://localhost/trade/api/v1`和`/run/trader.sock`。其它url原样返回，socket路径为None。
+
+    Args:
+        url: 服务器地址
+
+    Returns:
+        HTTP url和socket路径
+    """
+    parts = urlsplit(url)
+    if parts.scheme != UNIX_SCHEME:
+        return url, None
+
+    return f"http://localhost{parts.path}", unquote(parts.netloc)
+
+
+class ASGITransport(httpx.AsyncBaseTransport):
+    """在进程内调用ASGI应用（比如Sanic）的传输层，请求不经过网络
+
+    与`httpx.ASGITransport`不同，首次请求前会向应用发送`lifespan.startup`事件，关闭时发送`lifespan.shutdown`，因此Sanic这类依赖启动事件的应用也可以直接使用。不支持lifespan的应用将跳过这一步。
+    """
+
+    def __init__(self, app: Callable):
+        """
+        Args:
+            app: ASGI应用
+        """
+        self.app = app
+        self._transport = httpx.ASGITransport(app=app)
+        self._lifespan: Optional[asyncio.Task] = None
+        self._events: Optional[asyncio.Queue] = None
+        self._started: Optional[asyncio.Future] = None
+
+    async def _startup(self):
+        loop = asyncio.get_running_loop()
+        self._events = asyncio.Queue()
+        self._started = loop.create_future()
+        stopped = loop.create_future()
+
+        async def receive():
+            return await self._events.get()
+
+        async def send(message):
+            kind = message["type"]
+            if kind == "lifespan.startup.complete":
+                self._started.set_result(True)
+            elif kind == "lifespan.startup.failed":
+                self._started.set_exception(RuntimeError(message.get("message")))
+            elif kind.startswith("lifespan.shutdown") and not stopped.done():
+                stopped.set_result(True)
+
+        async def run():
+            scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+            try:
+                await self.app(scope, receive, send)
+            except Exception:
+                logger.debug("lifespan is not supported by %s", self.app)
+            finally:
+                # the app returns early if it doesn't support lifespan
+                if not self._started.done():
+                    self._started.set_result(False)
+
+        self._lifespan = asyncio.create_task(run())
+        await self._events.put({"type": "lifespan.startup"})
+        await self._started
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self._started is None:
+            await self._startup()
+        else:
+            await self._started
+
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self):
+        if self._lifespan is not None and not self._lifespan.done():
+            await self._events.put({"type": "lifespan.shutdown"})
+            await self._lifespan
+        self._lifespan = None
+        self._started = None
+
+
+class SyncASGITransport(httpx.BaseTransport):
+    """[ASGITransport][traderclient.transport.ASGITransport]的同步版本
+
+    ASGI应用运行在一个专用线程的事件循环中，每个请求提交到该循环执行并等待其完成。
+    """
+
+    def __init__(self, app: Callable):
+        """
+        Args:
+            app: ASGI应用
+        """
+        self._transport = ASGITransport(app)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="asgi-transport", daemon=True
+        )
+        self._thread.start()
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        rsp = await self._transport.handle_async_request(request)
+        content = await rsp.aread()
+        return httpx.Response(
+            rsp.status_code,
+            headers=rsp.headers,
+            content=content,
+            extensions=rsp.extensions,
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        future = asyncio.run_coroutine_threadsafe(self._handle(request), self._loop)
+        return future.result()
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+
+        future = asyncio.run_coroutine_threadsafe(self._transport.aclose(), self._loop)
+        future.result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class Session:
+    """基于连接池的HTTP会话
+
+    模块级的`get`、`post_json`和`delete`每次调用都会新建一个TCP连接。`Session`持有一个长期存在的`httpx.Client`，在多次请求间复用keep-alive连接，从而省去每次下单时的握手开销。
+
+    `Session`可以作为上下文管理器使用，退出时关闭连接池:
+
+    ```python
+    with Session(http2=True) as session:
+        session.get(url)
+    ```
+
+    会话会通过`Accept-Encoding`告知服务器可以使用的压缩算法，并透明地解压响应。对于批量下单这样较大的请求体，还可以设置`compress_threshold`，超过阈值的请求体将以gzip压缩后发送（需要服务器支持）。
+
+    !!! Warn
+        启用`http2`需要安装`h2`，即`pip install httpx[http2]`。使用brotli压缩需要安装`brotli`，使用zstd压缩需要安装`zstandard`。
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = 100,
+        max_keepalive_connections: Optional[int] = 20,
+        keepalive_expiry: Optional[float] = 5.0,
+        http2: bool = False,
+        compression: Optional[Sequence[str]] = None,
+        compress_threshold: Optional[int] = None,
+        hedger: Optional[Hedger] = None,
+        instrument=None,
+        coalescer: Optional[Coalescer] = None,
+        timeouts: Optional[Timeouts] = None,
+        uds: Optional[str] = None,
+        transport=None,
+    ):
+        """构建一个会话
+
+        Args:
+            max_connections : 连接池允许的最大连接数，None表示不限
+            max_keepalive_connections : 连接池中保持空闲的最大连接数，None表示不限
+            keepalive_expiry : 空闲连接的保持时间（秒）
+            http2 : 是否启用HTTP/2
+            compression : 允许服务器使用的响应压缩算法，比如["zstd", "br", "gzip"]。None表示所有可用算法，空列表表示不压缩
+            compress_threshold : 请求体超过此字节数时以gzip压缩，None表示不压缩请求体
+            hedger : 如果提供，GET请求将以[Hedger][traderclient.transport.Hedger]进行对冲
+            instrument : 请求统计数据的记录者，比如[Instrument][traderclient.instrument.Instrument]。None表示使用`set_instrument`设置的缺省值
+            coalescer : 如果提供，并发的相同GET请求将以[Coalescer][traderclient.transport.Coalescer]合并为一个
+            timeouts : 各类端点的超时设置，参见[Timeouts][traderclient.transport.Timeouts]。None表示使用缺省设置
+            uds : Unix domain socket的路径。如果提供，请求将通过此socket而不是TCP发送，适用于与服务器部署在同一台机器上的情况
+            transport : 自定义的httpx传输层，比如[SyncASGITransport][traderclient.transport.SyncASGITransport]。提供时，连接池参数、`http2`和`uds`将被忽略
+        """
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._compress_threshold = compress_threshold
+        self._hedger = hedger
+        self._instrument = instrument
+        self._coalescer = coalescer
+        self._timeouts = timeouts or Timeouts()
+        if transport is None:
+            transport = httpx.HTTPTransport(limits=limits, http2=http2, uds=uds)
+        self._client = httpx.Client(
+            transport=transport,
+            headers={"Accept-Encoding": _accept_encoding(compression)},
+        )
+
+    @property
+    def closed(self) -> bool:
+        return self._client.is_closed
+
+    def get(self, url, params: Optional[dict] = None, headers=None) -> Any:
+        """通过连接池发送GET请求，参数同模块级的`get`"""
+        if self._coalescer is None:
+            return self._get(url, params, headers)
+
+        key = Coalescer.key(url, params, headers)
+        return self._coalescer.run(key, lambda: self._get(url, params, headers))
+
+    def _get(self, url, params: Optional[dict] = None, headers=None) -> Any:
+        headers = _with_request_id(headers)
+        at = _deadline.get()
+
+        def send(extensions, hedge=False):
+            return self._send(
+                "GET",
+                url,
+                params,
+                at,
+                extensions,
+                params=params,
+                headers=_hedge_headers(headers) if hedge else headers,
+            )
+
+        return _perform(url, send, self._instrument, self._hedger)
+
+    def post_json(self, url, params=None, headers=None) -> Any:
+        """通过连接池以POST发送JSON数据请求，参数同模块级的`post_json`"""
+        headers = _with_request_id(headers)
+        content = _json_body(params, headers, self._compress_threshold)
+        at = _deadline.get()
+
+        def send(extensions):
+            return self._send(
+                "POST", url, params, at, extensions, content=content, headers=headers
+            )
+
+        return _perform(url, send, self._instrument)
+
+    def delete(self, url, params: Optional[Dict] = None, headers=None) -> Any:
+        """通过连接池发送DELETE请求，参数同模块级的`delete`"""
+        headers = _with_request_id(headers)
+        at = _deadline.get()
+
+        def send(extensions):
+            return self._send(
+                "DELETE", url, params, at, extensions, params=params, headers=headers
+            )
+
+        return _perform(url, send, self._instrument)
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        options: Optional[dict],
+        at: Optional[float],
+        extensions: dict,
+        **kwargs,
+    ) -> httpx.Response:
+        """发送请求，超时由`options`（用户参数）和截止时间`at`确定"""
+        t0 = time.perf_counter()
+        rsp = self._client.request(
+            method,
+            url,
+            timeout=self._timeouts.timeout(url, options, at),
+            extensions=extensions,
+            **kwargs,
+        )
+        self._timeouts.record(cmd_name(url), time.perf_counter() - t0)
+        return rsp
+
+    def close(self):
+        """关闭连接池"""
+        if self._hedger is not None:
+            self._hedger.close()
+        self._client.close()
+
+    def __enter__(self) -> "Session":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class AsyncSession:
+    """基于连接池的异步HTTP会话
+
+    与[Session][traderclient.transport.Session]相同，但持有的是`httpx.AsyncClient`，所有请求方法都是协程，因此不会阻塞事件循环。多个协程可以共享同一个`AsyncSession`，同时发出大量请求。
+
+    调用`aclose`时，会先拒绝新的请求，并等待所有已发出的请求完成（排空），然后再关闭连接池:
+
+    ```python
+    async with AsyncSession() as session:
+        await session.get(url)
+    ```
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = 100,
+        max_keepalive_connections: Optional[int] = 20,
+        keepalive_expiry: Optional[float] = 5.0,
+        http2: bool = False,
+        compression: Optional[Sequence[str]] = None,
+        compress_threshold: Optional[int] = None,
+        hedger: Optional[Hedger] = None,
+        instrument=None,
+        coalescer: Optional[Coalescer] = None,
+        timeouts: Optional[Timeouts] = None,
+        uds: Optional[str] = None,
+        transport=None,
+    ):
+        """构建一个异步会话，参数同[Session][traderclient.transport.Session]，其中`transport`应为异步传输层，比如[ASGITransport][traderclient.transport.ASGITransport]"""
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._compress_threshold = compress_threshold
+        self._hedger = hedger
+        self._instrument = instrument
+        self._coalescer = coalescer
+        self._timeouts = timeouts or Timeouts()
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2, uds=uds)
+        self._client = httpx.AsyncClient(
+            transport=transport,
+            headers={"Accept-Encoding": _accept_encoding(compression)},
+        )
+
+        self._inflight = 0
+        self._closing = False
+        # created lazily, so that the event is bound to the running loop
+        self._drained: Optional[asyncio.Event] = None
+
+    @property
+    def closed(self) -> bool:
+        return self._client.is_closed
+
+    @property
+    def inflight(self) -> int:
+        """正在进行中的请求数"""
+        return self._inflight
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        options: Optional[dict] = None,
+        headers=None,
+        hedge: bool = False,
+        **kwargs,
+    ) -> Any:
+        """发送请求。超时由`options`（用户参数）和`deadline`确定，超过截止时间的请求将被取消"""
+        if self._closing:
+            raise RuntimeError("session is closing, no more request is accepted")
+
+        at = _deadline.get()
+        remaining = _remaining(at)
+
+        self._inflight += 1
+        if self._drained is not None:
+            self._drained.clear()
+
+        async def send(extensions, hedge=False):
+            t0 = time.perf_counter()
+            rsp = await self._client.request(
+                method,
+                url,
+                headers=_hedge_headers(headers) if hedge else headers,
+                timeout=self._timeouts.timeout(url, options, at),
+                extensions=extensions,
+                **kwargs,
+            )
+            self._timeouts.record(cmd_name(url), time.perf_counter() - t0)
+            return rsp
+
+        try:
+            hedger = self._hedger if hedge else None
+            perform = _aperform(url, send, self._instrument, hedger)
+            if remaining is None:
+                return await perform
+
+            try:
+                return await asyncio.wait_for(perform, remaining)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("deadline exceeded")
+        finally:
+            self._inflight -= 1
+            if self._inflight == 0 and self._drained is not None:
+                self._drained.set()
+
+    async def get(self, url, params: Optional[dict] = None, headers=None) -> Any:
+        """异步发送GET请求，参数同模块级的`get`"""
+        if self._coalescer is None:
+            return await self._get(url, params, headers)
+
+        key = Coalescer.key(url, params, headers)
+        return await self._coalescer.arun(key, lambda: self._get(url, params, headers))
+
+    async def _get(self, url, params: Optional[dict] = None, headers=None) -> Any:
+        headers = _with_request_id(headers)
+        return await self._request(
+            "GET", url, params, headers=headers, hedge=True, params=params
+        )
+
+    async def post_json(self, url, params=None, headers=None) -> Any:
+        """异步以POST发送JSON数据请求，参数同模块级的`post_json`"""
+        headers = _with_request_id(headers)
+        content = _json_body(params, headers, self._compress_threshold)
+        return await self._request(
+            "POST", url, params, headers=headers, content=content
+        )
+
+    async def delete(self, url, params: Optional[Dict] = None, headers=None) -> Any:
+        """异步发送DELETE请求，参数同模块级的`delete`"""
+        headers = _with_request_id(headers)
+        return await self._request(
+            "DELETE", url, params, headers=headers, params=params
+        )
+
+    async def aclose(self, timeout: Optional[float] = None):
+        """排空进行中的请求后，关闭连接池
+
+        Args:
+            timeout : 等待进行中请求完成的最长时间（秒），None表示一直等待。超时后，未完成的请求将随连接池关闭而失败。
+        """
+        self._closing = True
+
+        if self._inflight > 0:
+            self._drained = self._drained or asyncio.Event()
+            try:
+                await asyncio.wait_for(self._drained.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "%s requests still in flight when closing session", self._inflight
+                )
+
+        await self._client.aclose()
+
+    async def __aenter__(self) -> "AsyncSession":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 # @Author   : henry
 # @Time     : 2022-03-09 15:08
+import datetime
 import logging
+from typing import List, Optional, Sequence
+
+import arrow
+import numpy as np
 
 
 def status_ok(code: int):
@@ -28,12 +33,18 @@ def enable_logging(level: str = "info"):
     logger.setLevel(level)
 
 
+def cmd_name(url: str) -> str:
+    """取url的最后一段作为命令名，比如buy, info, positions"""
+    return url.split("?")[0].rstrip("/").split("/")[-1]
+
+
 def get_cmd(url: str):
-    cmd = url.split("/")[-1]
+    cmd = cmd_name(url)
     return {
         "accounts": "创建/查询/删除账户",
         "info": "获取账户信息",
         "position": "获取持仓信息",
+        "positions": "获取持仓信息",
         "buy": "买入股票",
         "sell": "卖出股票",
         "available_shares": "获取可用持仓",
@@ -50,4 +61,50 @@ def get_cmd(url: str):
         "metrics": "账户评估指标",
         "start_backtest": "启动回测",
         "bills": "交割单",
+        "assets": "获取资产信息",
+        "stop_backtest": "停止回测",
+        "schedule": "批量上传委托计划",
     }.get(cmd, "未知命令")
+
+
+def parse_times(values: Sequence) -> np.ndarray:
+    """批量将时间转换为不带时区的`datetime64[us]`数组
+
+    时间字符串由numpy一次性解析，其耗时几乎不随数量增长。numpy不支持带时区的字符串，此时回退到arrow，保留其本地时间并去掉时区（与`arrow.get(x).naive`相同），且相同的字符串只解析一次。
+
+    Args:
+        values: 时间字符串、`datetime.datetime`或者None（转换为NaT）
+
+    Returns:
+        np.ndarray: dtype为`datetime64[us]`的数组
+    """
+    arr = np.asarray(values)
+    if arr.dtype.kind == "O" and arr.size > 0:
+        # with None present the array is of object dtype, and numpy would
+        # convert aware strings to UTC. Parse the others, then fill in NaT
+        items = arr.reshape(-1).tolist()
+        missing = np.array([v is None for v in items])
+        if missing.any():
+            result = np.full(arr.shape, np.datetime64("NaT"), dtype="datetime64[us]")
+            if not missing.all():
+                present = [v for v in items if v is not None]
+                result.reshape(-1)[~missing] = parse_times(present)
+            return result
+
+    if arr.dtype.kind == "U" and arr.size > 0:
+        aware = (
+            np.char.endswith(arr, "Z")
+            | (np.char.find(arr, "+") >= 0)
+            | (np.char.rfind(arr, "-") > 10)
+        )
+        if aware.any():
+            uniques, inverse = np.unique(arr, return_inverse=True)
+            naive = [arrow.get(s).naive for s in uniques.tolist()]
+            return np.array(naive, dtype="datetime64[us]")[inverse.reshape(-1)]
+
+    return arr.astype("datetime64[us]")
+
+
+def to_datetimes(values: Sequence) -> List[Optional[datetime.datetime]]:
+    """同`parse_times`，但返回`datetime.datetime`的列表，NaT转换为None"""
+    return parse_times(values).tolist()